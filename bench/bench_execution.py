@@ -0,0 +1,81 @@
+"""
+Benchmark: Zeit bis alle Auto-Entries eines Signals gefüllt sind.
+
+    python -m bench.bench_execution --orders 2000 --latency 0.05
+
+Vergleicht gegen die Fake-Börse (bench/fake_exchange.py):
+- sequentiell: eine blockierende Order nach der anderen (bisheriger Ansatz)
+- parallel: Thread-Pool, eine Order pro Request
+- gebündelt: Thread-Pool, bis zu --batch Orders pro Request
+- netto: Omnibus-Account, eine verrechnete Order pro Symbol
+Alle Varianten laufen unter demselben Rate-Limit pro Account.
+"""
+import argparse
+import random
+import time
+
+import execution
+from bench import fake_exchange
+
+MODES = [
+    # name, workers, max_batch, aggregate
+    ("sequentiell", 1, 1, False),
+    ("parallel", 16, 1, False),
+    ("gebündelt", 16, None, False),
+    ("netto", 16, None, True),
+]
+
+
+def make_orders(n, accounts, rnd):
+    return [execution.Order(i + 1, f"acc{i % accounts}", "BTCUSDT", execution.BUY if rnd.random() < 0.8 else execution.SELL,
+                            round(rnd.uniform(5, 500), 2), "20x")
+            for i in range(n)]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--accounts", type=int, default=1, help="Börsen-Accounts, auf die die Orders verteilt sind")
+    parser.add_argument("--latency", type=float, default=0.05, help="Latenz der Fake-Börse pro Request")
+    parser.add_argument("--account-rate", type=float, default=50.0, help="Requests/s pro Account an der Börse")
+    parser.add_argument("--batch", type=int, default=20)
+    parser.add_argument("--sequential-limit", type=int, default=200,
+                        help="sequentiell nur so viele Orders messen und hochrechnen")
+    args = parser.parse_args()
+
+    print(f"{args.orders} Orders, {args.accounts} Account(s), Latenz {args.latency * 1000:.0f} ms, "
+          f"Limit {args.account_rate:.0f} Requests/s pro Account\n")
+    print(f"{'Modus':<14}{'alle gefüllt s':>16}{'p50 ms':>10}{'p99 ms':>10}{'Requests':>10}{'429':>6}{'gefüllt':>9}")
+    for name, workers, max_batch, aggregate in MODES:
+        server, url, venue = fake_exchange.start_server()
+        venue.latency = args.latency
+        venue.account_rate = args.account_rate
+        orders = make_orders(args.orders, args.accounts, random.Random(1))
+        scale = 1.0
+        if workers == 1 and len(orders) > args.sequential_limit:
+            scale = len(orders) / args.sequential_limit
+            orders = orders[:args.sequential_limit]
+        adapter = execution.HttpExchange(url, aggregate=aggregate, max_batch=max_batch or args.batch,
+                                         account_rate=args.account_rate, account_burst=1, pool_size=workers)
+        engine = execution.ExecutionEngine(adapter, workers=workers)
+        start = time.perf_counter()
+        fills = engine.execute(orders)
+        elapsed = (time.perf_counter() - start) * scale
+        latencies = [f.latency_ms * scale for f in fills.values()]
+        filled = sum(1 for f in fills.values() if f.status in ("filled", "partial"))
+        stats = engine.stats()
+        label = name + (" *" if scale != 1.0 else "")
+        print(f"{label:<14}{elapsed:>16.2f}{percentile(latencies, 0.5):>10.0f}{percentile(latencies, 0.99):>10.0f}"
+              f"{stats['requests']:>10}{venue.rate_limited:>6}{filled:>5}/{len(orders)}")
+        engine.close()
+        server.shutdown()
+    print("\n* hochgerechnet aus --sequential-limit Orders")
+
+
+if __name__ == "__main__":
+    main()
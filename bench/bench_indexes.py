@@ -0,0 +1,98 @@
+"""
+Benchmark: Hot-Path-Queries vor und nach den Index-Migrationen.
+
+    python -m bench.bench_indexes --users 1000000
+
+Baut eine Wegwerf-DB auf Schema-Version 1 (Basis-Tabellen ohne Indizes),
+füllt sie, misst die Queries, migriert auf die neueste Version und misst erneut.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import migrations
+
+QUERIES = [
+    ("deposit per tx_sig", "SELECT id FROM deposits WHERE tx_sig = ?", lambda n: (f"sig{random.randrange(n)}",)),
+    ("user per sender_wallet", "SELECT id FROM users WHERE sender_wallet = ?", lambda n: (f"wallet{random.randrange(n)}",)),
+    ("trades per user", "SELECT * FROM trades WHERE user_id = ? ORDER BY id DESC LIMIT 20",
+     lambda n: (random.randrange(1, n),)),
+    ("trades per signal+user", "SELECT id FROM trades WHERE signal_id = ? AND user_id = ?",
+     lambda n: (random.randrange(1, 50), random.randrange(1, n))),
+    ("pending withdrawals", "SELECT * FROM withdrawals WHERE status = 'pending' ORDER BY id LIMIT 50", lambda n: ()),
+    ("auto_entry users (count)", "SELECT COUNT(*) FROM users WHERE auto_entry = 1", lambda n: ()),
+    ("unnotified deposits per user", "SELECT id FROM deposits WHERE user_id = ? AND notified = 0",
+     lambda n: (random.randrange(1, n),)),
+]
+
+
+def populate(conn, n):
+    rnd = random.Random(1)
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO users (telegram_id, username, sender_wallet, balance_usd, auto_entry, risk_percent, created_at) "
+        "VALUES (?,?,?,?,?,?,?)",
+        ((100000 + i, f"user{i}", f"wallet{i}", rnd.random() * 1000, 1 if rnd.random() < 0.05 else 0, 10, "2024-01-01")
+         for i in range(n)))
+    conn.executemany(
+        "INSERT INTO deposits (user_id, from_wallet, tx_sig, amount_usd, status, created_at, notified) "
+        "VALUES (?,?,?,?,?,?,?)",
+        ((rnd.randrange(1, n), f"wallet{i}", f"sig{i}", 10.0, "confirmed", "2024-01-01", 1 if i % 100 else 0)
+         for i in range(n)))
+    conn.executemany(
+        "INSERT INTO trades (user_id, signal_id, amount_usd, risk_percent, created_at) VALUES (?,?,?,?,?)",
+        ((i % n + 1, i // n + 1, 5.0, 10, "2024-01-01") for i in range(n)))
+    conn.executemany(
+        "INSERT INTO withdrawals (user_id, amount_usd, target_wallet, status, created_at) VALUES (?,?,?,?,?)",
+        ((rnd.randrange(1, n), 5.0, "w", "pending" if rnd.random() < 0.001 else "done", "2024-01-01")
+         for _ in range(n // 5)))
+    conn.execute("COMMIT")
+
+
+def measure(conn, n, repeat):
+    out = {}
+    for name, sql, params in QUERIES:
+        random.seed(2)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(sql, params(n)).fetchall()
+        out[name] = (time.perf_counter() - start) / repeat * 1000
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1_000_000, help="Zeilen pro Tabelle")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--db", help="Pfad für die Test-DB (Default: temporär)")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench.db")
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    migrations.migrate(conn, target=1)
+    # Spalte aus Migration 3 vorab anlegen, damit alle Queries schon "vorher" laufen
+    conn.execute("ALTER TABLE deposits ADD COLUMN notified INTEGER DEFAULT 1")
+
+    t = time.perf_counter()
+    populate(conn, args.users)
+    print(f"{args.users} Zeilen angelegt in {time.perf_counter() - t:.1f}s ({path})")
+
+    before = measure(conn, args.users, args.repeat)
+    t = time.perf_counter()
+    migrations.migrate(conn)
+    print(f"Migration auf Version {migrations.LATEST} in {time.perf_counter() - t:.1f}s\n")
+    after = measure(conn, args.users, args.repeat * 20)
+
+    print(f"{'Query':<32}{'vorher ms':>12}{'nachher ms':>12}{'Faktor':>10}")
+    for name, _, _ in QUERIES:
+        factor = before[name] / after[name] if after[name] else float("inf")
+        print(f"{name:<32}{before[name]:>12.3f}{after[name]:>12.3f}{factor:>9.0f}x")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Microbenchmark: Deposit-Parsing pro Transaktion (SOL + SPL-Token).
+
+    python -m bench.bench_parse --txs 20000
+    python -m bench.bench_parse --save fixtures.json            # Mix aufzeichnen
+    python -m bench.bench_parse --fixtures fixtures.json        # aufgezeichnete Tx messen
+
+Fixtures haben das Format von bench.fake_solana_rpc --fixtures:
+{address: [[sig, tx], ...]}, tx = getTransaction (jsonParsed), address = Einzahlungs-Wallet.
+Ohne --fixtures wird ein Mix erzeugt: SOL-Einzahlungen, USDC-Einzahlungen,
+Swaps mit vielen Accounts und fremden Mints, fehlgeschlagene Transaktionen.
+
+Verglichen werden:
+- zwei Durchläufe: SOL-Parser und separater Token-Parser, der Keys und
+  Token-Salden pro Mint erneut durchsucht (naive Erweiterung)
+- ein Durchlauf: deposit_indexer.parse_transfers
+jeweils auf der vollen RPC-Antwort und auf der kompakten Cache-Form.
+"""
+import argparse
+import json
+import random
+import time
+
+import deposit_indexer
+import tx_cache
+
+WALLET = "CBboaHRCZARdxRBUWpWtPdiFLjP7kgQvDdWq7pLbcHn3"
+OTHER_MINTS = ["So11111111111111111111111111111111111111112", "Es9vMFrzaCERmJfrF4H2FYD4KCoNkY11McCe8BenwNYB"]
+
+
+# ---------- Referenz: zwei getrennte Durchläufe ----------
+
+def _keys(tx):
+    account_keys = tx.get("transaction", {}).get("message", {}).get("accountKeys", [])
+    return [acc["pubkey"] if isinstance(acc, dict) else acc for acc in account_keys]
+
+
+def parse_sol(tx, to_wallet):
+    meta = tx.get("meta") or {}
+    if meta.get("err") is not None or not meta.get("preBalances"):
+        return None
+    keys = _keys(tx)
+    if to_wallet not in keys:
+        return None
+    i_to = keys.index(to_wallet)
+    received = meta["postBalances"][i_to] - meta["preBalances"][i_to]
+    if received <= 0:
+        return None
+    outflows = sorted((meta["postBalances"][i] - meta["preBalances"][i], key) for i, key in enumerate(keys)
+                      if i != i_to and meta["postBalances"][i] < meta["preBalances"][i])
+    if not outflows:
+        return None
+    return deposit_indexer.Transfer(deposit_indexer.SOL, [k for _, k in outflows], received, deposit_indexer.SOL_DECIMALS)
+
+
+def parse_tokens(tx, to_wallet, mints):
+    meta = tx.get("meta") or {}
+    if meta.get("err") is not None:
+        return []
+    _keys(tx)  # Keys werden erneut aufgebaut
+    pre, post = meta.get("preTokenBalances") or [], meta.get("postTokenBalances") or []
+    result = []
+    for mint, asset in mints.items():
+        deltas = {}
+        for b in post:
+            if b["mint"] == mint:
+                before = next((p for p in pre if p["accountIndex"] == b["accountIndex"]), None)
+                before = int(before["uiTokenAmount"]["amount"]) if before else 0
+                deltas[b["accountIndex"]] = (b["owner"], int(b["uiTokenAmount"]["amount"]) - before,
+                                             b["uiTokenAmount"]["decimals"])
+        for b in pre:
+            if b["mint"] == mint and b["accountIndex"] not in deltas:
+                deltas[b["accountIndex"]] = (b["owner"], -int(b["uiTokenAmount"]["amount"]),
+                                             b["uiTokenAmount"]["decimals"])
+        received = sum(d for owner, d, _ in deltas.values() if owner == to_wallet)
+        outflows = sorted((d, owner) for owner, d, _ in deltas.values() if owner != to_wallet and d < 0)
+        if received > 0 and outflows:
+            decimals = next(dec for _, _, dec in deltas.values())
+            result.append(deposit_indexer.Transfer(asset, [o for _, o in outflows], received, decimals))
+    return result
+
+
+def parse_two_pass(tx, to_wallet, mints):
+    sol = parse_sol(tx, to_wallet)
+    return ([sol] if sol else []) + parse_tokens(tx, to_wallet, mints)
+
+
+# ---------- Fixtures ----------
+
+def _pubkey(rnd):
+    return "".join(rnd.choice("123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz") for _ in range(44))
+
+
+def _account(key, signer=False):
+    return {"pubkey": key, "signer": signer, "writable": True, "source": "transaction"}
+
+
+def _token_balance(index, mint, owner, amount, decimals):
+    return {"accountIndex": index, "mint": mint, "owner": owner, "programId": "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA",
+            "uiTokenAmount": {"amount": str(amount), "decimals": decimals, "uiAmount": amount / 10 ** decimals,
+                              "uiAmountString": str(amount / 10 ** decimals)}}
+
+
+def make_tx(rnd, kind):
+    sender = _pubkey(rnd)
+    fee = 5000
+    logs = [f"Program {_pubkey(rnd)} invoke [1]", "Program log: Instruction: Transfer",
+            f"Program {_pubkey(rnd)} consumed 4645 of 200000 compute units", "Program success"]
+    tx = {"slot": rnd.randrange(10 ** 8), "blockTime": 1700000000 + rnd.randrange(10 ** 7), "version": 0}
+    if kind == "sol":
+        keys = [_account(sender, True), _account(WALLET), _account("11111111111111111111111111111111")]
+        amount = rnd.randrange(10 ** 6, 10 ** 10)
+        meta = {"preBalances": [10 ** 12, 10 ** 9, 1], "postBalances": [10 ** 12 - amount - fee, 10 ** 9 + amount, 1],
+                "preTokenBalances": [], "postTokenBalances": []}
+    elif kind == "usdc":
+        keys = [_account(sender, True), _account(_pubkey(rnd)), _account(_pubkey(rnd)),
+                _account(deposit_indexer.USDC_MINT), _account("TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA")]
+        amount = rnd.randrange(10 ** 5, 10 ** 10)
+        meta = {"preBalances": [10 ** 12, 2039280, 2039280, 1, 1], "postBalances": [10 ** 12 - fee, 2039280, 2039280, 1, 1],
+                "preTokenBalances": [_token_balance(1, deposit_indexer.USDC_MINT, sender, 10 ** 11, 6),
+                                     _token_balance(2, deposit_indexer.USDC_MINT, WALLET, 10 ** 8, 6)],
+                "postTokenBalances": [_token_balance(1, deposit_indexer.USDC_MINT, sender, 10 ** 11 - amount, 6),
+                                      _token_balance(2, deposit_indexer.USDC_MINT, WALLET, 10 ** 8 + amount, 6)]}
+    else:
+        # Swap/DeFi: viele Accounts, fremde Mints, Wallet taucht als Owner eines Token-Accounts auf
+        n = rnd.randrange(12, 40)
+        keys = [_account(sender, True)] + [_account(_pubkey(rnd)) for _ in range(n - 2)] + [_account(WALLET)]
+        balances = [rnd.randrange(10 ** 9) for _ in range(n)]
+        meta = {"preBalances": balances, "postBalances": [b - (fee if i == 0 else 0) for i, b in enumerate(balances)],
+                "preTokenBalances": [], "postTokenBalances": []}
+        for j in range(rnd.randrange(4, 12)):
+            mint = rnd.choice(OTHER_MINTS + [deposit_indexer.USDC_MINT])
+            owner = WALLET if j == 0 else _pubkey(rnd)
+            before = rnd.randrange(10 ** 9)
+            meta["preTokenBalances"].append(_token_balance(j + 1, mint, owner, before, 6))
+            meta["postTokenBalances"].append(_token_balance(j + 1, mint, owner, before - (j % 3) * 1000, 6))
+        logs = logs * rnd.randrange(3, 10)
+    meta.update({"err": {"InstructionError": [0, "Custom"]} if kind == "failed" else None, "fee": fee,
+                 "logMessages": logs, "innerInstructions": [], "rewards": [], "computeUnitsConsumed": 4645})
+    tx["meta"] = meta
+    tx["transaction"] = {"signatures": [_pubkey(rnd) + _pubkey(rnd)],
+                         "message": {"accountKeys": keys, "recentBlockhash": _pubkey(rnd),
+                                     "instructions": [{"programId": keys[-1]["pubkey"], "accounts": [], "data": "3Bxs4h24hBtQy9rw"}]}}
+    return tx
+
+
+def generate(n, seed):
+    rnd = random.Random(seed)
+    kinds = ["sol"] * 3 + ["usdc"] * 3 + ["swap"] * 3 + ["failed"]
+    return [(f"sig{i}", make_tx(rnd, rnd.choice(kinds))) for i in range(n)]
+
+
+# ---------- Messung ----------
+
+def measure(fn, txs, wallet, mints, rounds):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for tx in txs:
+            fn(tx, wallet, mints)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--txs", type=int, default=20000, help="Anzahl erzeugter Transaktionen (ohne --fixtures)")
+    parser.add_argument("--fixtures", help="aufgezeichnete Transaktionen (JSON, Format wie fake_solana_rpc)")
+    parser.add_argument("--save", help="erzeugten Mix als Fixture-Datei schreiben")
+    parser.add_argument("--rounds", type=int, default=5, help="bester von N Läufen")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.fixtures:
+        with open(args.fixtures) as f:
+            wallet, items = next(iter(json.load(f).items()))
+    else:
+        wallet, items = WALLET, generate(args.txs, args.seed)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({wallet: items}, f)
+        print(f"{len(items)} Transaktionen nach {args.save} geschrieben")
+
+    mints = deposit_indexer.TOKEN_MINTS
+    full = [tx for _, tx in items]
+    compact = [tx_cache.compact_transaction(tx) for tx in full]
+
+    # beide Varianten müssen dasselbe finden
+    for tx in full + compact:
+        a = sorted(parse_two_pass(tx, wallet, mints))
+        b = sorted(deposit_indexer.parse_transfers(tx, wallet, mints))
+        assert a == b, (a, b)
+    found = sum(len(deposit_indexer.parse_transfers(tx, wallet, mints)) for tx in full)
+
+    print(f"{len(full)} Transaktionen, {found} Einzahlungen, Mints: {', '.join(mints.values())}\n")
+    print(f"{'Variante':<26}{'µs/Tx':>10}{'Tx/s':>12}")
+    for label, txs in (("voll", full), ("kompakt", compact)):
+        for name, fn in (("zwei Durchläufe", parse_two_pass), ("ein Durchlauf", deposit_indexer.parse_transfers)):
+            seconds = measure(fn, txs, wallet, mints, args.rounds)
+            print(f"{name + ' (' + label + ')':<26}{seconds / len(txs) * 1e6:>10.2f}{len(txs) / seconds:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark/Probe: Auszahlungen in Batches gegen den Fake-Solana-RPC.
+
+    python -m bench.bench_payouts --withdrawals 1000
+    python -m bench.bench_payouts --withdrawals 200 --reject-every 37   # Preflight-Ablehnungen
+    python -m bench.bench_payouts --withdrawals 50 --drop              # erst landet nichts → Ablauf
+
+Legt eine Wegwerf-DB mit offenen Auszahlungen an, lässt den PayoutProcessor
+laufen, bis nichts mehr offen ist, und vergleicht Transaktionen/Fees mit
+einer Überweisung pro Auszahlung. Zum Schluss wird geprüft, dass jede
+Auszahlung genau einmal on-chain angekommen oder zurückgebucht ist.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from solders.keypair import Keypair
+
+import db as database
+import ledger
+import migrations
+import payouts
+import price_oracle
+import solana_rpc
+from bench import fake_solana_rpc
+
+SOL_USD = 150.0
+
+
+def populate(db, n, users):
+    rnd = random.Random(1)
+    wallets = [str(Keypair().pubkey()) for _ in range(users)]
+
+    def fill(conn):
+        conn.executemany("INSERT INTO users (telegram_id, username, created_at) VALUES (?,?,?)",
+                         ((100000 + i, f"user{i}", payouts.now()) for i in range(users)))
+        for i in range(n):
+            uid = rnd.randrange(users) + 1
+            amount = round(rnd.uniform(5, 200), 2)
+            ledger.post(conn, uid, ledger.to_micro(amount), "deposit", f"seed{i}")
+            wid = conn.execute("""
+                INSERT INTO withdrawals (user_id, amount_usd, target_wallet, status, created_at)
+                VALUES (?,?,?,'pending',?)
+            """, (uid, amount, wallets[uid - 1], payouts.now())).lastrowid
+            ledger.post(conn, uid, -ledger.to_micro(amount), "withdrawal", str(wid))
+
+    db.transaction(fill)
+    return wallets
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--withdrawals", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--reject-every", type=int, default=0, help="jede n-te Ziel-Wallet lehnt der Preflight ab")
+    parser.add_argument("--drop", action="store_true", help="Transaktionen landen erst nach dem ersten Ablauf")
+    parser.add_argument("--latency", type=float, default=0.02, help="RPC-Latenz in Sekunden")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "payouts.db")
+    db = database.Database(path)
+    conn = db.connect()
+    migrations.migrate(conn)
+    conn.close()
+    wallets = populate(db, args.withdrawals, args.users)
+
+    server, url, chain = fake_solana_rpc.start_server()
+    chain.latency = args.latency
+    chain.drop = args.drop
+    chain.slot_time = 0.01 if args.drop else 0.4  # beim Ablauf-Test schnell über lastValidBlockHeight
+    if args.reject_every:
+        bad = set(wallets[::args.reject_every])
+        chain.reject = lambda to, lamports: "account rejected" if to in bad else None
+    hot = Keypair()
+    chain.balances[str(hot.pubkey())] = 10 ** 15
+
+    prices = price_oracle.PriceOracle([price_oracle.StaticPriceSource({"SOL": SOL_USD})])
+    rpc = solana_rpc.SolanaRpcClient(url)
+    processor = payouts.PayoutProcessor(db, rpc, hot, prices)
+
+    start = time.perf_counter()
+    rounds = 0
+    while True:
+        rounds += 1
+        processor.run_once()
+        if not db.query_one("SELECT 1 FROM withdrawals WHERE status IN ('pending', 'processing', 'sent') LIMIT 1"):
+            break
+        if chain.drop and processor.stats()["expired"]:
+            chain.drop = False  # nach dem ersten Ablauf landen die neu eingeplanten Auszahlungen
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+
+    counts = {r["status"]: r["n"] for r in db.query("SELECT status, COUNT(*) AS n FROM withdrawals GROUP BY status")}
+    stats = processor.stats()
+    calls = rpc.stats()
+    print(f"{args.withdrawals} Auszahlungen in {elapsed:.2f}s, {rounds} Läufe ({path})")
+    print(f"Status: {counts}")
+    print(f"Transaktionen gesendet: {stats['transactions']}, Überweisungen: {stats['transfers']}, "
+          f"Ø {stats['transfers'] / max(1, stats['transactions']):.1f} pro Tx")
+    print(f"Fees: {stats['transactions'] * payouts.FEE_LAMPORTS} statt {stats['transfers'] * payouts.FEE_LAMPORTS} Lamports "
+          "(eine Tx pro Auszahlung)")
+    print(f"RPC-Requests: {sum(s['requests'] for s in calls.values())} "
+          "(" + ", ".join(f"{m}={s['requests']}" for m, s in sorted(calls.items())) + ")")
+    print(f"Abgelehnt: {stats['rejected']}, geteilt: {stats['splits']}, endgültig fehlgeschlagen: {stats['failed']}, "
+          f"abgelaufen: {stats['expired']}, erneut gesendet: {stats['resent']}")
+
+    # jede bestätigte Auszahlung genau einmal on-chain, jede gescheiterte zurückgebucht
+    landed = {}
+    for _, transfers in chain.sent:
+        for to, lamports in transfers:
+            landed[(to, lamports)] = landed.get((to, lamports), 0) + 1
+    expected = {}
+    for r in db.query("SELECT target_wallet, lamports FROM withdrawals WHERE status = 'confirmed'"):
+        key = (r["target_wallet"], r["lamports"])
+        expected[key] = expected.get(key, 0) + 1
+    refunds = db.query_one("SELECT COUNT(*) AS n FROM ledger_entries WHERE kind = 'withdrawal_refund'")["n"]
+    ok = landed == expected and refunds == counts.get("failed", 0)
+    print("Konsistenz:", "ok" if ok else f"FEHLER (on-chain {len(landed)}, erwartet {len(expected)}, "
+                                        f"Rückbuchungen {refunds})")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
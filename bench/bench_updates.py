@@ -0,0 +1,124 @@
+"""
+Benchmark: Update-Durchsatz Polling vs. Webhook gegen eine lokale Fake-Telegram-API.
+
+    python -m bench.bench_updates --updates 5000 --threads 8 --api-latency 0.005
+
+Pro Update antwortet ein Handler mit einer sendMessage (geht an die Fake-API).
+- polling: alle Updates liegen in getUpdates bereit, der Bot holt sie per Long-Polling
+- webhook: Client-Prozesse POSTen die Updates parallel an den WebhookServer
+Gemessen wird die Zeit bis alle Handler durch sind (Updates/s) und beim
+Webhook zusätzlich die Ack-Latenz der POSTs.
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import requests
+import telebot
+from telebot import apihelper
+
+import webhook
+from bench.fake_telegram import message_update, start_server
+
+TOKEN = "123456:BENCH"
+SECRET = "bench-secret"
+
+
+def make_bot(threads):
+    bot = telebot.TeleBot(TOKEN, threaded=True, num_threads=threads)
+    done = {"n": 0, "event": threading.Event(), "target": 0}
+    lock = threading.Lock()
+
+    @bot.message_handler(func=lambda m: True)
+    def echo(message):
+        bot.send_message(message.chat.id, "ok")
+        with lock:
+            done["n"] += 1
+            if done["n"] >= done["target"]:
+                done["event"].set()
+
+    return bot, done
+
+
+def bench_polling(api, n, threads):
+    bot, done = make_bot(threads)
+    done["target"] = n
+    api.push_updates([message_update(i + 1, 1000 + i % 500, "hi") for i in range(n)])
+    thread = threading.Thread(target=bot.infinity_polling,
+                              kwargs={"timeout": 5, "long_polling_timeout": 1}, daemon=True)
+    start = time.monotonic()
+    thread.start()
+    done["event"].wait()
+    elapsed = time.monotonic() - start
+    bot.stop_polling()
+    return {"mode": "polling", "updates": n, "seconds": elapsed, "per_s": n / elapsed}
+
+
+def _post_chunk(url, bodies):
+    """Läuft in einem eigenen Prozess, damit die Clients nicht den GIL des Bots teilen."""
+    session = requests.Session()
+    acks = []
+    for body in bodies:
+        t = time.monotonic()
+        resp = session.post(url, data=body, headers={
+            webhook.SECRET_HEADER: SECRET, "Content-Type": "application/json"})
+        resp.raise_for_status()
+        acks.append(time.monotonic() - t)
+    return acks
+
+
+def bench_webhook(n, threads, concurrency):
+    bot, done = make_bot(threads)
+    done["target"] = n
+    server = webhook.WebhookServer(bot, SECRET, port=0)
+    url = server.start()
+    bodies = [json.dumps(message_update(i + 1, 1000 + i % 500, "hi")).encode() for i in range(n)]
+    chunks = [bodies[i::concurrency] for i in range(concurrency)]
+
+    with ProcessPoolExecutor(max_workers=concurrency) as pool:
+        # Prozesse vorab starten, damit der Fork nicht in die Messung fällt
+        list(pool.map(time.sleep, [0] * concurrency))
+        start = time.monotonic()
+        acks = [a for part in pool.map(_post_chunk, [url] * concurrency, chunks) for a in part]
+    done["event"].wait()
+    elapsed = time.monotonic() - start
+    server.stop()
+    acks.sort()
+    return {
+        "mode": "webhook", "updates": n, "seconds": elapsed, "per_s": n / elapsed,
+        "ack_p50_ms": acks[len(acks) // 2] * 1000,
+        "ack_p99_ms": acks[int(len(acks) * 0.99) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Polling vs. Webhook Durchsatz")
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=8, help="TeleBot-Worker (num_threads)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Client-Prozesse für Webhook-POSTs")
+    parser.add_argument("--api-latency", type=float, default=0.005, help="Latenz pro sendMessage")
+    parser.add_argument("--mode", choices=["both", "polling", "webhook"], default="both")
+    args = parser.parse_args()
+
+    server, url, api = start_server()
+    api.latency = args.api_latency
+    apihelper.API_URL = url + "/bot{0}/{1}"
+
+    results = []
+    if args.mode in ("both", "polling"):
+        results.append(bench_polling(api, args.updates, args.threads))
+    if args.mode in ("both", "webhook"):
+        results.append(bench_webhook(args.updates, args.threads, args.concurrency))
+
+    for r in results:
+        extra = ""
+        if "ack_p50_ms" in r:
+            extra = f"  Ack p50 {r['ack_p50_ms']:.2f} ms · p99 {r['ack_p99_ms']:.2f} ms"
+        print(f"{r['mode']:<8} {r['updates']} Updates in {r['seconds']:.2f}s → {r['per_s']:.0f}/s{extra}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
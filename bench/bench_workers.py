@@ -0,0 +1,103 @@
+"""
+Benchmark: Durchsatz des Worker-Modus in Abhängigkeit von der Worker-Anzahl.
+
+    python -m bench.bench_workers --updates 2000 --workers 1,2,4,8 --threads 1
+
+Ein Cluster (workers.Cluster) verteilt Updates von 1000 Usern auf N Worker-Prozesse.
+Jeder Handler verbrennt --cpu-ms CPU-Zeit und schickt eine sendMessage an die
+lokale Fake-Telegram-API (--api-latency). CPU-Anteile skalieren nur mit echten
+Kernen, die API-Wartezeit überlappt auch auf einem Kern. Im Worker laufen die
+Updates wie im Bot über einen ChatExecutor mit --threads Threads.
+"""
+import argparse
+import json
+import multiprocessing
+import time
+
+import telebot
+from telebot import apihelper
+
+import executor
+import workers
+from bench.fake_telegram import message_update, start_server
+
+TOKEN = "123456:BENCH"
+
+
+def burn(ms):
+    end = time.perf_counter() + ms / 1000
+    x = 0
+    while time.perf_counter() < end:
+        x += 1
+    return x
+
+
+def run_worker(index, inboxes, control, threads, api_url, done, cpu_ms):
+    apihelper.API_URL = api_url
+    bot = telebot.TeleBot(TOKEN)
+    executor.attach(bot, executor.ChatExecutor(threads))
+
+    @bot.message_handler(func=lambda m: True)
+    def echo(message):
+        burn(cpu_ms)
+        bot.send_message(message.chat.id, "ok")
+        with done.get_lock():
+            done.value += 1
+
+    workers.serve(bot, index, inboxes)
+
+
+def wait_for(done, target, timeout=300):
+    deadline = time.monotonic() + timeout
+    while done.value < target:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"nur {done.value}/{target} Updates verarbeitet")
+        time.sleep(0.005)
+
+
+def bench(n_workers, threads, n, api_url, cpu_ms):
+    done = multiprocessing.get_context("spawn").Value("i", 0)
+    cluster = workers.Cluster(run_worker, n_workers, args=(threads, api_url, done, cpu_ms))
+    cluster.start()
+    try:
+        # Aufwärmen: jeder Worker einmal (Import nach spawn dauert)
+        warm = n_workers
+        for i in range(warm):
+            cluster.dispatch(message_update(i + 1, i + 1, "warmup"))
+        wait_for(done, warm)
+
+        updates = [json.dumps(message_update(warm + i + 1, 1 + i % 1000, "hi")) for i in range(n)]
+        start = time.monotonic()
+        for raw in updates:
+            cluster.dispatch(raw)
+        wait_for(done, warm + n)
+        elapsed = time.monotonic() - start
+    finally:
+        cluster.stop()
+    return {"workers": n_workers, "threads": threads, "updates": n, "seconds": elapsed, "per_s": n / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker-Modus: Durchsatz vs. Worker-Anzahl")
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--workers", default="1,2,4,8", help="kommagetrennte Worker-Anzahlen")
+    parser.add_argument("--threads", type=int, default=1, help="Executor-Threads pro Worker")
+    parser.add_argument("--api-latency", type=float, default=0.01, help="Latenz pro sendMessage")
+    parser.add_argument("--cpu-ms", type=float, default=0.5, help="CPU-Zeit pro Handler")
+    args = parser.parse_args()
+
+    server, url, api = start_server()
+    api.latency = args.api_latency
+    api_url = url + "/bot{0}/{1}"
+
+    base = None
+    for n_workers in [int(w) for w in args.workers.split(",")]:
+        r = bench(n_workers, args.threads, args.updates, api_url, args.cpu_ms)
+        base = base or r["per_s"]
+        print(f"{r['workers']:>2} Worker × {r['threads']} Threads: {r['updates']} Updates in "
+              f"{r['seconds']:.2f}s → {r['per_s']:.0f}/s (×{r['per_s'] / base:.1f})")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
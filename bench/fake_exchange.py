@@ -0,0 +1,194 @@
+"""
+Lokale Fake-Börse für Tests und Benchmarks der Order-Ausführung.
+
+    python -m bench.fake_exchange --port 8897 --latency 0.05 --account-rate 20
+
+POST /v1/orders nimmt bis zu max_batch Orders eines Accounts entgegen und
+füllt sie sofort zum aktuellen Preis (plus Slippage je nach Größe).
+GET /v1/ticker?symbol=... liefert den aktuellen Preis,
+GET /v1/orders?account=...&client_id=... bereits platzierte Orders. Pro
+Account gilt ein Rate-Limit (429 mit Retry-After), Latenz, Ablehnungen
+und verlorene Antworten (Order ausgeführt, Verbindung ohne Antwort
+geschlossen) sind einstellbar.
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeExchange:
+
+    def __init__(self, prices=None):
+        self.prices = dict(prices or {})   # symbol -> Preis, unbekannte Symbole starten bei 100
+        self.latency = 0.0                 # Sekunden pro Request
+        self.account_rate = 0.0            # Requests/s pro Account, 0 = unbegrenzt
+        self.max_batch = 100
+        self.slippage = 0.0001             # relativer Preisaufschlag pro 1000 USD
+        self.reject_every = 0              # jede n-te Order wird abgelehnt
+        self.drop_every = 0                # jede n-te Antwort auf /v1/orders geht verloren
+        self.dropped = 0
+        self.requests = 0
+        self.orders = 0
+        self.rate_limited = 0
+        self.volume = {}                   # (symbol, side) -> USD
+        self.placed = {}                   # (account, client_id) -> Fill
+        self._ids = itertools.count(1)
+        self._next = {}                    # account -> frühester Zeitpunkt des nächsten Requests
+        self._rnd = random.Random(1)
+        self._lock = threading.Lock()
+
+    def price(self, symbol):
+        with self._lock:
+            return self.prices.setdefault(symbol, 100.0)
+
+    def admit(self, account):
+        """Rate-Limit pro Account. Gibt None oder retry_after zurück."""
+        if not self.account_rate:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            ready = self._next.get(account, now)
+            # halbes Intervall Toleranz für Jitter (GCRA wie bei echten Venues)
+            if ready > now + 0.5 / self.account_rate:
+                self.rate_limited += 1
+                return ready - now
+            self._next[account] = max(ready, now) + 1.0 / self.account_rate
+        return None
+
+    def place(self, account, orders):
+        fills = []
+        with self._lock:
+            for o in orders:
+                self.orders += 1
+                order_id = f"x{next(self._ids)}"
+                if self.reject_every and self.orders % self.reject_every == 0:
+                    fill = {"client_id": o["client_id"], "status": "rejected", "price": None,
+                            "filled_quote": 0.0, "order_id": order_id, "error": "insufficient margin"}
+                    self.placed[(account, o["client_id"])] = fill
+                    fills.append(fill)
+                    continue
+                symbol, side, qty = o["symbol"], o["side"], float(o["quote_qty"])
+                base = self.prices.setdefault(symbol, 100.0)
+                impact = base * self.slippage * qty / 1000
+                price = base + impact if side == "buy" else base - impact
+                # kleiner Random-Walk, damit Fills nicht alle exakt gleich sind
+                self.prices[symbol] = base * (1 + self._rnd.uniform(-1e-5, 1e-5))
+                key = (symbol, side)
+                self.volume[key] = self.volume.get(key, 0.0) + qty
+                fill = {"client_id": o["client_id"], "status": "filled", "price": round(price, 6),
+                        "filled_quote": qty, "order_id": order_id, "error": None}
+                self.placed[(account, o["client_id"])] = fill
+                fills.append(fill)
+        return fills
+
+    def lookup(self, account, client_ids):
+        with self._lock:
+            return [self.placed[(account, c)] for c in client_ids if (account, c) in self.placed]
+
+    def drop(self):
+        """True, wenn die Antwort auf diesen Request verloren gehen soll."""
+        if not self.drop_every:
+            return False
+        with self._lock:
+            if self.requests % self.drop_every:
+                return False
+            self.dropped += 1
+            return True
+
+
+def make_handler(state):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path == "/v1/orders":
+                account = query.get("account", [""])[0]
+                return self._send(200, {"fills": state.lookup(account, query.get("client_id", []))})
+            if url.path != "/v1/ticker":
+                return self._send(404, {"error": "not found"})
+            symbol = query.get("symbol", [""])[0]
+            self._send(200, {"symbol": symbol, "price": state.price(symbol)})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            with state._lock:
+                state.requests += 1
+            if self.path != "/v1/orders":
+                return self._send(404, {"error": "not found"})
+            account = body.get("account", "")
+            orders = body.get("orders") or []
+            retry_after = state.admit(account)
+            if retry_after is not None:
+                return self._send(429, {"error": "rate limit"}, {"Retry-After": f"{retry_after:.3f}"})
+            if len(orders) > state.max_batch:
+                return self._send(400, {"error": f"max {state.max_batch} orders per request"})
+            if state.latency:
+                time.sleep(state.latency)
+            fills = state.place(account, orders)
+            if state.drop():
+                # ausgeführt, aber der Client sieht nur einen Verbindungsabbruch
+                self.close_connection = True
+                return
+            self._send(200, {"fills": fills})
+
+        def _send(self, code, obj, headers=None):
+            data = json.dumps(obj).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def start_server(state=None, host="127.0.0.1", port=0):
+    """Startet den Server im Hintergrund. Gibt (server, url, state) zurück."""
+    state = state or FakeExchange()
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}", state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake-Börse")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8897)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--account-rate", type=float, default=0.0)
+    parser.add_argument("--max-batch", type=int, default=100)
+    parser.add_argument("--reject-every", type=int, default=0)
+    parser.add_argument("--drop-every", type=int, default=0, help="jede n-te Order-Antwort verwerfen")
+    args = parser.parse_args()
+
+    state = FakeExchange()
+    state.latency = args.latency
+    state.account_rate = args.account_rate
+    state.max_batch = args.max_batch
+    state.reject_every = args.reject_every
+    state.drop_every = args.drop_every
+    server, url, _ = start_server(state, args.host, args.port)
+    print(f"Fake-Börse auf {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
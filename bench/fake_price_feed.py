@@ -0,0 +1,91 @@
+"""
+Lokaler Fake-Kursfeed im CoinGecko-Format für Tests und Benchmarks.
+
+    python -m bench.fake_price_feed --port 8898 --sol 187.5
+
+GET / liefert {"solana": {"usd": ...}, "usd-coin": {"usd": ...}}.
+Latenz und Fehler (jeder n-te Request → 500) sind einstellbar, um
+Stale-While-Revalidate und Single-Flight des Oracles zu prüfen.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakePriceFeed:
+
+    def __init__(self, prices=None):
+        self.prices = dict(prices or {"solana": 200.0, "usd-coin": 1.0})
+        self.latency = 0.0
+        self.fail_every = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def set_price(self, coin, usd):
+        with self._lock:
+            self.prices[coin] = usd
+
+
+def make_handler(state):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with state._lock:
+                state.requests += 1
+                n = state.requests
+                body = {coin: {"usd": usd} for coin, usd in state.prices.items()}
+            if state.latency:
+                time.sleep(state.latency)
+            if state.fail_every and n % state.fail_every == 0:
+                return self._send(500, {"error": "internal"})
+            self._send(200, body)
+
+        def _send(self, code, obj):
+            data = json.dumps(obj).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def start_server(state=None, host="127.0.0.1", port=0):
+    """Startet den Server im Hintergrund. Gibt (server, url, state) zurück."""
+    state = state or FakePriceFeed()
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/", state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake SOL/USD-Kursfeed")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8898)
+    parser.add_argument("--sol", type=float, default=200.0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--fail-every", type=int, default=0)
+    args = parser.parse_args()
+
+    state = FakePriceFeed({"solana": args.sol, "usd-coin": 1.0})
+    state.latency = args.latency
+    state.fail_every = args.fail_every
+    server, url, _ = start_server(state, args.host, args.port)
+    print(f"Fake-Kursfeed auf {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Lokaler Fake-Solana-JSON-RPC-Server für Tests und Benchmarks.
+
+    python -m bench.fake_solana_rpc --port 8899 --fixtures txs.json
+
+Unterstützt Einzel- und Batch-Requests für getSignaturesForAddress und
+getTransaction (SOL- und SPL-Token-Überweisungen, siehe transfer_tx /
+token_transfer_tx). Optional werden 429er (mit Retry-After) oder 500er
+eingestreut, um Retry und Failover des Clients zu prüfen.
+
+Für Auszahlungen gibt es außerdem getBalance, getLatestBlockhash,
+getBlockHeight, sendTransaction und getSignatureStatuses: gesendete
+System-Transfers werden dekodiert, gebucht und sofort als "confirmed"
+gemeldet. Die Blockhöhe steigt mit der Zeit (slot_time), Blockhashes
+laufen nach BLOCKHASH_VALIDITY Blöcken ab.
+"""
+import argparse
+import base64
+import json
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from solders.hash import Hash
+from solders.transaction import Transaction
+
+BLOCKHASH_VALIDITY = 150
+SYSTEM_PROGRAM = "11111111111111111111111111111111"
+TOKEN_PROGRAM = "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"
+
+
+def transfer_tx(sender, receiver, lamports, slot=1, fee=5000):
+    """Minimale SOL-Überweisung im getTransaction-Format (sender zahlt Betrag + Fee)."""
+    return {
+        "slot": slot,
+        "blockTime": int(time.time()),
+        "meta": {"err": None, "fee": fee,
+                 "preBalances": [10 ** 12, 0], "postBalances": [10 ** 12 - lamports - fee, lamports]},
+        "transaction": {"message": {"accountKeys": [sender, receiver]}},
+    }
+
+
+def token_transfer_tx(sender, receiver, mint, amount, decimals=6, slot=1, fee=5000):
+    """SPL-Token-Überweisung (TransferChecked) im getTransaction-Format: Salden stehen an den Token-Accounts."""
+    src, dst = f"{sender}-ata", f"{receiver}-ata"
+
+    def balance(index, owner, value):
+        return {"accountIndex": index, "mint": mint, "owner": owner,
+                "uiTokenAmount": {"amount": str(value), "decimals": decimals,
+                                  "uiAmount": value / 10 ** decimals, "uiAmountString": str(value / 10 ** decimals)}}
+
+    return {
+        "slot": slot,
+        "blockTime": int(time.time()),
+        "meta": {"err": None, "fee": fee,
+                 "preBalances": [10 ** 12, 2039280, 2039280, 1461600, 929280],
+                 "postBalances": [10 ** 12 - fee, 2039280, 2039280, 1461600, 929280],
+                 "preTokenBalances": [balance(1, sender, 10 ** 12), balance(2, receiver, 0)],
+                 "postTokenBalances": [balance(1, sender, 10 ** 12 - amount), balance(2, receiver, amount)]},
+        "transaction": {"message": {"accountKeys": [sender, src, dst, mint, TOKEN_PROGRAM]}},
+    }
+
+
+class FakeSolana:
+    """Zustand des Fake-Servers: Signaturen pro Adresse und Transaktionen."""
+
+    def __init__(self):
+        self.signatures = {}   # address -> [sig, ...] (neueste zuerst)
+        self.transactions = {}  # sig -> tx
+        self.latency = 0.0      # künstliche Latenz pro HTTP-Request
+        self.rate_limit_every = 0   # jeder n-te Request → 429
+        self.fail_every = 0         # jeder n-te Request → 500
+        self.retry_after = 0
+        self.requests = 0
+        self.calls = {}
+        self.balances = {}      # address -> lamports
+        self.statuses = {}      # sig -> {"slot", "err", "confirmationStatus"}
+        self.sent = []          # angenommene Transaktionen (sig, [(to, lamports), ...])
+        self.slot_time = 0.4    # Sekunden pro Block
+        self.drop = False       # True: sendTransaction nimmt an, aber nichts landet
+        self.reject = None      # reject(to, lamports) -> Fehlertext: Preflight lehnt die ganze Tx ab
+        self._start = time.monotonic()
+        self._blockhashes = {}  # blockhash -> lastValidBlockHeight
+        self._lock = threading.Lock()
+
+    def add_transaction(self, address, sig, tx):
+        """Hängt eine neue (neueste) Transaktion für address an."""
+        with self._lock:
+            self.signatures.setdefault(address, []).insert(0, sig)
+            self.transactions[sig] = tx
+
+    def handle(self, req):
+        method = req.get("method")
+        params = req.get("params") or []
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        handler = getattr(self, "rpc_" + (method or ""), None)
+        if handler is None:
+            return {"jsonrpc": "2.0", "id": req.get("id"),
+                    "error": {"code": -32601, "message": f"Method not found: {method}"}}
+        try:
+            return {"jsonrpc": "2.0", "id": req.get("id"), "result": handler(*params)}
+        except RpcFault as e:
+            return {"jsonrpc": "2.0", "id": req.get("id"), "error": {"code": e.code, "message": e.message}}
+
+    def rpc_getSignaturesForAddress(self, address, opts=None):
+        opts = opts or {}
+        with self._lock:
+            sigs = list(self.signatures.get(address, []))
+        if opts.get("before") in sigs:
+            sigs = sigs[sigs.index(opts["before"]) + 1:]
+        if opts.get("until") in sigs:
+            sigs = sigs[:sigs.index(opts["until"])]
+        sigs = sigs[:opts.get("limit", 1000)]
+        return [{"signature": s, "slot": self.transactions.get(s, {}).get("slot"), "err": None} for s in sigs]
+
+    def rpc_getTransaction(self, sig, opts=None):
+        return self.transactions.get(sig)
+
+    def rpc_getHealth(self):
+        return "ok"
+
+    # ---------- Auszahlungen ----------
+
+    def block_height(self):
+        return int((time.monotonic() - self._start) / self.slot_time) + 1000
+
+    def rpc_getBalance(self, address, opts=None):
+        with self._lock:
+            return {"context": {"slot": self.block_height()}, "value": self.balances.get(address, 0)}
+
+    def rpc_getBlockHeight(self, opts=None):
+        return self.block_height()
+
+    def rpc_getLatestBlockhash(self, opts=None):
+        height = self.block_height()
+        blockhash = str(Hash.new_unique())
+        with self._lock:
+            self._blockhashes[blockhash] = height + BLOCKHASH_VALIDITY
+        return {"context": {"slot": height},
+                "value": {"blockhash": blockhash, "lastValidBlockHeight": height + BLOCKHASH_VALIDITY}}
+
+    def rpc_sendTransaction(self, raw, opts=None):
+        tx = Transaction.from_bytes(base64.b64decode(raw))
+        sig = str(tx.signatures[0])
+        msg = tx.message
+        keys = [str(k) for k in msg.account_keys]
+        transfers = []
+        for ix in msg.instructions:
+            data = bytes(ix.data)
+            if keys[ix.program_id_index] == SYSTEM_PROGRAM and len(data) == 12 and data[:4] == b"\x02\x00\x00\x00":
+                transfers.append((keys[ix.accounts[1]], struct.unpack("<Q", data[4:])[0]))
+        payer = keys[0]
+        with self._lock:
+            if sig in self.statuses:
+                return sig  # erneutes Senden derselben Transaktion
+            valid_until = self._blockhashes.get(str(msg.recent_blockhash))
+            if valid_until is None or valid_until < self.block_height():
+                raise RpcFault(-32002, "Transaction simulation failed: Blockhash not found")
+            needed = sum(lamports for _, lamports in transfers) + 5000
+            if self.balances.get(payer, 0) < needed:
+                raise RpcFault(-32002, "Transaction simulation failed: insufficient funds")
+            for to, lamports in transfers:
+                error = self.reject(to, lamports) if self.reject else None
+                if error:
+                    raise RpcFault(-32002, f"Transaction simulation failed: {error}")
+            if self.drop:
+                return sig
+            self.balances[payer] -= needed
+            for to, lamports in transfers:
+                self.balances[to] = self.balances.get(to, 0) + lamports
+            self.statuses[sig] = {"slot": self.block_height(), "confirmations": 1, "err": None,
+                                  "confirmationStatus": "confirmed"}
+            self.sent.append((sig, transfers))
+        return sig
+
+    def rpc_getSignatureStatuses(self, sigs, opts=None):
+        with self._lock:
+            return {"context": {"slot": self.block_height()}, "value": [self.statuses.get(s) for s in sigs]}
+
+
+class RpcFault(Exception):
+    """Wird als JSON-RPC-Fehler (code, message) beantwortet."""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def make_handler(state):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"null")
+            with state._lock:
+                state.requests += 1
+                n = state.requests
+            if state.latency:
+                time.sleep(state.latency)
+            if state.rate_limit_every and n % state.rate_limit_every == 0:
+                return self._send(429, {"error": "Too many requests"},
+                                  {"Retry-After": str(state.retry_after)})
+            if state.fail_every and n % state.fail_every == 0:
+                return self._send(500, {"error": "internal"})
+            if isinstance(body, list):
+                out = [state.handle(req) for req in body]
+            else:
+                out = state.handle(body)
+            self._send(200, out)
+
+        def _send(self, code, obj, headers=None):
+            data = json.dumps(obj).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def start_server(state=None, host="127.0.0.1", port=0):
+    """Startet den Server im Hintergrund. Gibt (server, url, state) zurück."""
+    state = state or FakeSolana()
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}", state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Solana JSON-RPC")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8899)
+    parser.add_argument("--fixtures", help="JSON: {address: [[sig, tx], ...]} (älteste zuerst)")
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    state = FakeSolana()
+    state.latency = args.latency
+    if args.fixtures:
+        with open(args.fixtures) as f:
+            for address, items in json.load(f).items():
+                for sig, tx in items:
+                    state.add_transaction(address, sig, tx)
+    server, url, _ = start_server(state, args.host, args.port)
+    print(f"Fake Solana RPC auf {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Lokaler Websocket-Ersatz für die Solana-Subscriptions (logsSubscribe,
+accountSubscribe). Wird zusammen mit bench.fake_solana_rpc benutzt:
+
+    rpc_server, rpc_url, chain = fake_solana_rpc.start_server()
+    ws = FakeSolanaWs(chain).start()
+    ws.push_transaction(address, sig, tx)   # Tx anlegen + Notification senden
+    ws.drop_connections()                   # Reconnect provozieren
+"""
+import itertools
+import json
+import threading
+import time
+
+from websockets.sync.server import serve
+
+from bench.fake_solana_rpc import FakeSolana
+
+
+class FakeSolanaWs:
+
+    def __init__(self, chain=None, host="127.0.0.1", port=0):
+        self.chain = chain or FakeSolana()
+        self.host = host
+        self.port = port
+        self.url = None
+        self.subscriptions = {}  # connection -> [(sub_id, kind, address)]
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self):
+        self._server = serve(self._handler, self.host, self.port)
+        self.url = f"ws://{self.host}:{self._server.socket.getsockname()[1]}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+
+    def _handler(self, ws):
+        with self._lock:
+            self.subscriptions[ws] = []
+        try:
+            for raw in ws:
+                req = json.loads(raw)
+                method = req.get("method")
+                params = req.get("params") or []
+                if method == "logsSubscribe":
+                    address = params[0]["mentions"][0]
+                    kind = "logs"
+                elif method == "accountSubscribe":
+                    address = params[0]
+                    kind = "account"
+                else:
+                    ws.send(json.dumps({"jsonrpc": "2.0", "id": req.get("id"),
+                                        "error": {"code": -32601, "message": "Method not found"}}))
+                    continue
+                sub_id = next(self._ids)
+                with self._lock:
+                    self.subscriptions[ws].append((sub_id, kind, address))
+                ws.send(json.dumps({"jsonrpc": "2.0", "id": req.get("id"), "result": sub_id}))
+        finally:
+            with self._lock:
+                self.subscriptions.pop(ws, None)
+
+    def wait_for_subscribers(self, count=1, timeout=5.0):
+        """Wartet bis mindestens count Verbindungen beide Subscriptions haben."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                ready = sum(1 for subs in self.subscriptions.values() if len(subs) >= 2)
+            if ready >= count:
+                return True
+            time.sleep(0.02)
+        return False
+
+    def push_transaction(self, address, sig, tx, notify=True):
+        self.chain.add_transaction(address, sig, tx)
+        if notify:
+            self.notify(address, sig)
+
+    def notify(self, address, sig):
+        with self._lock:
+            targets = [(ws, subs) for ws, subs in self.subscriptions.items()]
+        for ws, subs in targets:
+            for sub_id, kind, addr in subs:
+                if addr != address:
+                    continue
+                if kind == "logs":
+                    msg = {"jsonrpc": "2.0", "method": "logsNotification", "params": {
+                        "subscription": sub_id,
+                        "result": {"context": {"slot": 0}, "value": {"signature": sig, "err": None, "logs": []}},
+                    }}
+                else:
+                    msg = {"jsonrpc": "2.0", "method": "accountNotification", "params": {
+                        "subscription": sub_id,
+                        "result": {"context": {"slot": 0}, "value": {"lamports": 0}},
+                    }}
+                try:
+                    ws.send(json.dumps(msg))
+                except Exception:
+                    pass
+
+    def drop_connections(self):
+        with self._lock:
+            conns = list(self.subscriptions)
+        for ws in conns:
+            ws.close()
@@ -0,0 +1,195 @@
+"""
+Lokaler Fake-Telegram-Bot-API-Server für Tests und Benchmarks.
+
+    python -m bench.fake_telegram --port 8081
+
+TeleBot wird per telebot.apihelper.API_URL = url + "/bot{0}/{1}" umgebogen.
+getUpdates unterstützt Long-Polling (offset/limit/timeout), alle anderen
+Methoden werden gezählt und mit einem plausiblen Ergebnis beantwortet.
+Optional werden 429er mit retry_after eingestreut.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+
+def message_update(update_id, chat_id, text, user_id=None):
+    """Baut ein Update mit einer privaten Textnachricht."""
+    user_id = user_id or chat_id
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"u{user_id}"},
+            "text": text,
+        },
+    }
+
+
+def callback_update(update_id, chat_id, data, message_id=1, user_id=None):
+    """Baut ein Update mit einem Inline-Button-Klick."""
+    user_id = user_id or chat_id
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": f"u{user_id}"},
+            "chat_instance": str(chat_id),
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": BOT_USER,
+                "text": "menu",
+            },
+        },
+    }
+
+
+class FakeTelegram:
+    """Zustand des Fake-Servers: wartende Updates und gezählte API-Calls."""
+
+    def __init__(self):
+        self.updates = []        # noch nicht abgeholte Updates (aufsteigende update_id)
+        self.latency = 0.0       # künstliche Latenz pro Request (außer getUpdates)
+        self.rate_limit_every = 0
+        self.retry_after = 1
+        self.requests = 0
+        self.calls = {}
+        self.sent = []           # (method, params) der letzten Calls, begrenzt
+        self.keep_sent = 1000
+        self.track = False       # True: Zeitpunkt jedes Calls pro (Methode, chat_id) merken
+        self.tracked = {}        # (method, chat_id) -> [time.monotonic(), ...]
+        self._next_message_id = 1
+        self._cond = threading.Condition()
+
+    def push_updates(self, updates):
+        with self._cond:
+            self.updates.extend(updates)
+            self._cond.notify_all()
+
+    def get_updates(self, offset=0, limit=100, timeout=0):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if offset:
+                    self.updates = [u for u in self.updates if u["update_id"] >= offset]
+                if self.updates:
+                    return self.updates[:limit]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._cond.wait(remaining)
+
+    def handle(self, method, params):
+        with self._cond:
+            self.requests += 1
+            n = self.requests
+            self.calls[method] = self.calls.get(method, 0) + 1
+            if method not in ("getUpdates", "getMe"):
+                self.sent.append((method, params))
+                del self.sent[:-self.keep_sent]
+                if self.track:
+                    key = (method, int(params.get("chat_id") or 0))
+                    self.tracked.setdefault(key, []).append(time.monotonic())
+        if method == "getUpdates":
+            result = self.get_updates(int(params.get("offset") or 0), int(params.get("limit") or 100),
+                                      float(params.get("timeout") or 0))
+            return 200, {"ok": True, "result": result}
+        if self.latency:
+            time.sleep(self.latency)
+        if self.rate_limit_every and n % self.rate_limit_every == 0:
+            return 429, {"ok": False, "error_code": 429,
+                         "description": f"Too Many Requests: retry after {self.retry_after}",
+                         "parameters": {"retry_after": self.retry_after}}
+        if method == "getMe":
+            return 200, {"ok": True, "result": BOT_USER}
+        if method in ("sendMessage", "editMessageText", "sendDocument"):
+            with self._cond:
+                message_id = self._next_message_id
+                self._next_message_id += 1
+            chat_id = int(params.get("chat_id") or 0)
+            return 200, {"ok": True, "result": {
+                "message_id": int(params.get("message_id") or message_id),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": BOT_USER,
+                "text": params.get("text", ""),
+            }}
+        return 200, {"ok": True, "result": True}
+
+
+def make_handler(state):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            self._dispatch()
+
+        def do_POST(self):
+            self._dispatch()
+
+        def _dispatch(self):
+            url = urlparse(self.path)
+            method = url.path.rsplit("/", 1)[-1]
+            params = dict(parse_qsl(url.query))
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                body = self.rfile.read(length)
+                ctype = self.headers.get("Content-Type") or ""
+                if ctype.startswith("application/json"):
+                    params.update(json.loads(body))
+                elif ctype.startswith("application/x-www-form-urlencoded"):
+                    params.update(parse_qsl(body.decode()))
+            code, obj = state.handle(method, params)
+            data = json.dumps(obj).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def start_server(state=None, host="127.0.0.1", port=0):
+    """Startet den Server im Hintergrund. Gibt (server, url, state) zurück."""
+    state = state or FakeTelegram()
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}", state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    state = FakeTelegram()
+    state.latency = args.latency
+    server, url, _ = start_server(state, args.host, args.port)
+    print(f"Fake Telegram API auf {url} (API_URL = {url}/bot{{0}}/{{1}})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
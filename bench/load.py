@@ -0,0 +1,397 @@
+"""
+Lasttest: der echte Bot (bot.py) gegen lokale Fake-Telegram- und Fake-Solana-Server.
+
+    python -m bench.load --users 100000                       # alle Workloads
+    python -m bench.load callbacks deposits --updates 20000 --save run.jsonl
+    python -m bench.load --replay run.jsonl --users 1000 --json result.json
+
+Workloads:
+- callbacks:  Menü-Klicks zufälliger User (--updates Stück, optional mit --rate/s)
+- deposits:   Burst von "🔍 Deposit prüfen" (--checks User, die Hälfte hat eine
+              noch nicht zugeordnete SOL- oder USDC-Einzahlung auf der Fake-Chain), jeder User
+              tippt --taps mal; gezählt werden auch die RPC-Requests
+- signal:     Admin schickt ein Signal an alle --users User
+- broadcast:  Admin-Broadcast an alle User über die Outbox (--broadcast-rate/s)
+- replay:     Update-Log (JSONL, ein Update pro Zeile, optional "_t" = Sekunden
+              seit Start) erneut einspielen, bis auch alle ausgelösten Jobs
+              fertig sind; --save schreibt genau dieses Format
+
+Gemessen werden Durchsatz, p50/p99-Latenz und Speicher (RSS). Latenz ist bei
+Updates die Zeit von der Bereitstellung in getUpdates bis der Handler fertig
+ist, beim Deposit-Check bis zur Antwort, bei Signal/Broadcast pro Empfänger
+bis zur Zustellung. Bot und Fake-Server laufen im selben Prozess (RSS und
+CPU enthalten also beide), DB und Caches liegen in einem Temp-Verzeichnis.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+from telebot import apihelper
+
+import deposit_indexer
+from bench import fake_solana_rpc, fake_telegram
+
+TOKEN = "123456:BENCH"
+USER_BASE = 10_000_000  # telegram_id der synthetischen User
+SOL_PRICE = 150.0
+MAX_DEPOSITS = 1000  # deposit_indexer.INITIAL_BACKFILL: mehr holt der erste Scan nicht
+CALLBACKS = ["menu_risk", "menu_control", "back_main", "risk_20", "risk_50", "menu_withdraw"]
+WORKLOADS = ["callbacks", "deposits", "signal", "broadcast"]
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def wait_until(check, timeout, what):
+    deadline = time.monotonic() + timeout
+    while not check():
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{what}: Timeout nach {timeout:.0f}s")
+        time.sleep(0.01)
+
+
+class Harness:
+    """Startet Fake-Server und Bot, liefert Updates ein und misst."""
+
+    def __init__(self, args):
+        self.args = args
+        self.rnd = random.Random(args.seed)
+        self.telegram_server, telegram_url, self.api = fake_telegram.start_server()
+        self.api.latency = args.api_latency
+        self.solana_server, self.solana_url, self.chain = fake_solana_rpc.start_server()
+        self.chain.latency = args.rpc_latency
+        apihelper.API_URL = telegram_url + "/bot{0}/{1}"
+
+        # bot.py legt DB und tx_cache relativ zum Arbeitsverzeichnis an
+        sys.path.insert(0, os.getcwd())
+        self.tmp = tempfile.TemporaryDirectory(prefix="bench-load-")
+        os.chdir(self.tmp.name)
+        import bot
+        import outbox
+        import price_oracle
+        self.bot = bot
+        bot.bot.token = TOKEN
+        bot.solana.endpoints = [self.solana_url]
+        bot.prices = price_oracle.PriceOracle([price_oracle.StaticPriceSource({"SOL": SOL_PRICE, "USDC": 1.0})])
+        bot.indexer.prices = bot.prices
+        bot.indexer.poll_interval = 3600  # nur per wake() (Deposit-Check) oder explizit
+        bot.dispatcher.pacer = outbox.Pacer(args.broadcast_rate)
+        if args.telegram_rate:
+            bot.transport.set_rate(args.telegram_rate)
+        else:
+            # ohne Telegram-Limits, sonst misst der Lauf nur die Token-Buckets
+            bot.transport.set_rate(1e9)
+            bot.transport.burst = 1e9
+            bot.transport.chat_limits = {False: (1e9, 1), True: (1e9, 1)}
+        self.admin = next(iter(bot.ADMIN_IDS))
+
+        self.next_update_id = 1
+        self.pushed = {}  # update_id -> Zeitpunkt der Bereitstellung
+        self.done = {}    # update_id -> Handler fertig
+        self.recorded = []
+        self.started = None
+        self._wrap_executor()
+
+    def _wrap_executor(self):
+        chats = self.bot.chats
+        submit = chats.submit
+        done = self.done
+
+        def timed_submit(chat_id, fn, *args):
+            def run(updates):
+                try:
+                    fn(updates)
+                finally:
+                    done[updates[0].update_id] = time.monotonic()
+            return submit(chat_id, run, *args)
+
+        chats.submit = timed_submit
+
+    # ---------- Setup ----------
+
+    def seed_users(self, n):
+        now = self.bot.now()
+        rows = [(USER_BASE + i, f"user{i}", f"Wallet{i}", 100.0, 100_000_000, i % 2, 10, now) for i in range(n)]
+        rows.append((self.admin, "admin", None, 0.0, 0, 0, 10, now))
+
+        def seed(conn):
+            conn.executemany("""
+                INSERT INTO users (telegram_id, username, sender_wallet, balance_usd, balance_micro,
+                                   auto_entry, risk_percent, created_at)
+                VALUES (?,?,?,?,?,?,?,?)
+            """, rows)
+
+        self.bot.db.transaction(seed)
+        return n
+
+    def start(self):
+        thread = threading.Thread(target=self.bot.bot.infinity_polling, name="bench-polling", daemon=True,
+                                  kwargs={"timeout": 10, "long_polling_timeout": 1})
+        thread.start()
+
+    def stop(self):
+        self.bot.bot.stop_polling()
+        self.bot.stop_background_jobs()
+        self.telegram_server.shutdown()
+        self.solana_server.shutdown()
+
+    # ---------- Updates ----------
+
+    def push(self, updates):
+        now = time.monotonic()
+        if self.started is None:
+            self.started = now
+        for update in updates:
+            update["update_id"] = self.next_update_id
+            self.next_update_id += 1
+            self.pushed[update["update_id"]] = now
+            if self.args.save:
+                self.recorded.append(dict(update, _t=round(now - self.started, 4)))
+        self.api.push_updates(updates)
+        return [u["update_id"] for u in updates]
+
+    def push_paced(self, updates, rate):
+        """Alle auf einmal (rate=0) oder gleichmäßig mit rate Updates/s."""
+        if not rate:
+            return self.push(updates)
+        ids = []
+        start = time.monotonic()
+        for i, update in enumerate(updates):
+            delay = start + i / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            ids += self.push([update])
+        return ids
+
+    def wait_handled(self, ids, timeout):
+        remaining = set(ids)
+
+        def check():
+            remaining.difference_update([i for i in remaining if i in self.done])
+            return not remaining
+
+        wait_until(check, timeout, "Updates")
+
+    def latencies(self, ids):
+        return [self.done[i] - self.pushed[i] for i in ids]
+
+    def deliveries(self, chat_ids, t0, method="sendMessage"):
+        tracked = self.api.tracked
+        return [tracked[(method, c)][0] - t0 for c in chat_ids if (method, c) in tracked]
+
+    def wait_delivered(self, chat_ids, timeout, method="sendMessage"):
+        remaining = set(chat_ids)
+
+        def check():
+            tracked = self.api.tracked
+            remaining.difference_update([c for c in remaining if (method, c) in tracked])
+            return not remaining
+
+        wait_until(check, timeout, "Zustellung")
+
+    def wait_idle(self, timeout):
+        """Heavy- und Deposit-Pool leer und keine offenen Broadcast-Nachrichten mehr."""
+        def check():
+            for pool in (self.bot.heavy, self.bot.deposit_pool):
+                stats = pool.stats()
+                if stats["queued"] or stats["busy"]:
+                    return False
+            row = self.bot.db.query_one("SELECT COUNT(*) AS n FROM outbox WHERE status IN ('pending', 'sending')")
+            return row["n"] == 0
+
+        wait_until(check, timeout, "Hintergrund-Jobs")
+
+    def admin_click(self, data):
+        """Admin-Button, setzt den State für die folgende Textnachricht."""
+        ids = self.push([fake_telegram.callback_update(0, self.admin, data)])
+        self.wait_handled(ids, 30)
+
+    # ---------- Workloads ----------
+
+    def run_callbacks(self):
+        n, users = self.args.updates, self.args.users
+        updates = [fake_telegram.callback_update(0, USER_BASE + self.rnd.randrange(users),
+                                                 self.rnd.choice(CALLBACKS), message_id=i + 1)
+                   for i in range(n)]
+        start = time.monotonic()
+        ids = self.push_paced(updates, self.args.rate)
+        self.wait_handled(ids, self.args.timeout)
+        return n, time.monotonic() - start, self.latencies(ids)
+
+    def run_deposits(self):
+        n = min(self.args.checks, self.args.users, MAX_DEPOSITS * 2)
+        depositors = list(range(0, n, 2))
+        # Einzahlungen von noch unbekannten Wallets → Indexer kann sie keinem User zuordnen
+        # (abwechselnd SOL und USDC)
+        for i in depositors:
+            if i % 4:
+                tx = fake_solana_rpc.token_transfer_tx(f"Dep{i}", self.bot.MAIN_WALLET,
+                                                       deposit_indexer.USDC_MINT, 7_500_000, slot=i)
+            else:
+                tx = fake_solana_rpc.transfer_tx(f"Dep{i}", self.bot.MAIN_WALLET, 50_000_000, slot=i)
+            self.chain.add_transaction(self.bot.MAIN_WALLET, f"sig{i}", tx)
+        self.bot.indexer.sync()
+        self.bot.indexer.start()
+        # ... erst danach hinterlegen die User ihre Absender-Wallet und prüfen selbst
+        self.bot.db.transaction(lambda conn: conn.executemany(
+            "UPDATE users SET sender_wallet = ? WHERE telegram_id = ?",
+            [(f"Dep{i}", USER_BASE + i) for i in depositors]))
+        self.bot.users_cache.clear()
+
+        chat_ids = [USER_BASE + i for i in range(n)]
+        taps = [fake_telegram.callback_update(0, c, "check_deposit") for _ in range(self.args.taps) for c in chat_ids]
+        rpc_before = self.chain.requests
+        self.api.tracked = {}
+        self.api.track = True
+        start = time.monotonic()
+        self.push_paced(taps, self.args.rate)
+        self.wait_delivered(chat_ids, self.args.timeout)
+        elapsed = time.monotonic() - start
+        self.api.track = False
+        # Scans, die die Checks noch ausgelöst haben, mitzählen
+        time.sleep(self.bot.indexer.wake_min_interval + 0.5)
+        credited = self.bot.db.query_one("SELECT COUNT(*) AS n FROM deposits")["n"]
+        indexer, checks, throttled = (self.bot.indexer.stats(), self.bot.deposit_checks.stats(),
+                                      self.bot.deposit_throttle.stats())
+        print(f"   {credited}/{len(depositors)} Einzahlungen zugeordnet, "
+              f"{self.bot.deposit_pool.stats()['rejected']} Checks wegen vollem Pool abgelehnt")
+        print(f"   {len(taps)} Taps: {throttled['throttled']} gedrosselt, {checks['calls']} Checks ausgeführt, "
+              f"{checks['saved']} zusammengefasst · {indexer['syncs']} Scans, {self.chain.requests - rpc_before} "
+              f"RPC-Requests (mindestens {indexer['rpc_saved']} eingespart)")
+        return len(taps), elapsed, self.deliveries(chat_ids, start)
+
+    def run_signal(self):
+        return self._fan_out("admin_signal", "BTCUSDT LONG 20x")
+
+    def run_broadcast(self):
+        self.bot.dispatcher.start()
+        return self._fan_out("admin_broadcast", "Bench-Broadcast")
+
+    def _fan_out(self, button, text):
+        chat_ids = [USER_BASE + i for i in range(self.args.users)]
+        self.admin_click(button)
+        self.api.tracked = {}
+        self.api.track = True
+        start = time.monotonic()
+        self.push([fake_telegram.message_update(0, self.admin, text)])
+        self.wait_delivered(chat_ids, self.args.timeout)
+        elapsed = time.monotonic() - start
+        self.api.track = False
+        return len(chat_ids), elapsed, self.deliveries(chat_ids, start)
+
+    def run_replay(self):
+        with open(self.args.replay) as f:
+            updates = [json.loads(line) for line in f if line.strip()]
+        self.bot.dispatcher.start()
+        self.bot.indexer.start()
+        start = time.monotonic()
+        ids = []
+        for update in updates:
+            t = update.pop("_t", None)
+            if t is not None and self.args.speed:
+                delay = start + t / self.args.speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            ids += self.push([update])
+        self.wait_handled(ids, self.args.timeout)
+        self.wait_idle(self.args.timeout)  # Fan-outs aus dem Log zählen mit
+        return len(ids), time.monotonic() - start, self.latencies(ids)
+
+    def run(self, name):
+        rss_before = rss_mb()
+        calls_before = self.api.requests
+        ops, seconds, latencies = getattr(self, "run_" + name)()
+        return {
+            "workload": name,
+            "ops": ops,
+            "seconds": round(seconds, 3),
+            "per_s": round(ops / seconds, 1) if seconds else 0.0,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "max_ms": round(max(latencies, default=0.0) * 1000, 2),
+            "api_calls": self.api.requests - calls_before,
+            "rss_mb": round(rss_mb(), 1),
+            "rss_delta_mb": round(rss_mb() - rss_before, 1),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lasttest des Bots gegen Fake-Telegram/-Solana")
+    parser.add_argument("workloads", nargs="*", help=f"{', '.join(WORKLOADS)} (Standard: alle, ohne --replay)")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--updates", type=int, default=20_000, help="Callbacks im callbacks-Workload")
+    parser.add_argument("--checks", type=int, default=1000, help="User im deposits-Burst")
+    parser.add_argument("--taps", type=int, default=1, help="so oft tippt jeder User im deposits-Burst")
+    parser.add_argument("--rate", type=float, default=0, help="Callbacks/Deposit-Checks pro s (0 = alle auf einmal)")
+    parser.add_argument("--broadcast-rate", type=float, default=1000.0)
+    parser.add_argument("--telegram-rate", type=float, default=0,
+                        help="globales Telegram-Limit des Transports (0 = Limits aus)")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="Latenz der Fake-Telegram-API")
+    parser.add_argument("--rpc-latency", type=float, default=0.0, help="Latenz des Fake-Solana-RPC")
+    parser.add_argument("--replay", help="Update-Log (JSONL) einspielen")
+    parser.add_argument("--speed", type=float, default=0, help="Replay-Tempo relativ zu _t (0 = so schnell wie möglich)")
+    parser.add_argument("--save", help="eingespielte Updates als JSONL speichern (für --replay)")
+    parser.add_argument("--json", help="Ergebnisse als JSON schreiben (Vergleich zwischen Läufen)")
+    parser.add_argument("--timeout", type=float, default=900)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    unknown = set(args.workloads) - set(WORKLOADS)
+    if unknown:
+        parser.error(f"unbekannte Workloads: {', '.join(sorted(unknown))}")
+    workloads = args.workloads or ([] if args.replay else WORKLOADS)
+    if args.replay:
+        workloads = workloads + ["replay"]
+    save = args.save and os.path.abspath(args.save)
+    out = args.json and os.path.abspath(args.json)
+    if args.replay:
+        args.replay = os.path.abspath(args.replay)
+
+    harness = Harness(args)
+    start = time.monotonic()
+    harness.seed_users(args.users)
+    print(f"{args.users} User angelegt ({time.monotonic() - start:.1f}s, RSS {rss_mb():.0f} MB)")
+    harness.start()
+
+    results = []
+    try:
+        for name in workloads:
+            r = harness.run(name)
+            results.append(r)
+            print(f"{r['workload']:>10}: {r['ops']} in {r['seconds']:.2f}s → {r['per_s']:.0f}/s · "
+                  f"p50 {r['p50_ms']:.1f} ms · p99 {r['p99_ms']:.1f} ms · max {r['max_ms']:.1f} ms · "
+                  f"RSS {r['rss_mb']:.0f} MB (+{r['rss_delta_mb']:.0f}, Peak {r['peak_rss_mb']:.0f})")
+    finally:
+        harness.stop()
+
+    if save:
+        with open(save, "w") as f:
+            for update in harness.recorded:
+                f.write(json.dumps(update) + "\n")
+        print(f"{len(harness.recorded)} Updates nach {save} geschrieben")
+    if out:
+        with open(out, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,41 @@
+import _thread
+import argparse
+import logging
+import math
 import os
-import sqlite3
-import time
-import requests
-from datetime import datetime
+import secrets
+import threading
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
 
 import telebot
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+import db as database
+import deposit_indexer
+import deposit_listener
+import execution
+import executor
+import exports
+import ledger
+import leases
+import metrics
+import migrations
+import outbox
+import payouts
+import price_oracle
+import render
+import signal_engine
+import solana_rpc
+import state_store
+import telegram_transport
+import throttle
+import tx_cache
+import user_browser
+import user_cache
+import webhook
+import workers
+
 # =======================
 # CONFIG
 # =======================
@@ -14,87 +43,96 @@ from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
 BOT_TOKEN = "8535037912:AAHfAPVG7ugqWmdacCMDi15hFiukA_5TX00"
 ADMIN_IDS = {7919108078}  # deine Admin IDs hier
 MAIN_WALLET = "CBboaHRCZARdxRBUWpWtPdiFLjP7kgQvDdWq7pLbcHn3"  # Wallet, auf die eingezahlt wird
-SOLANA_RPC_URL = "https://api.mainnet-beta.solana.com"  # kostenloser RPC
+SOLANA_RPC_URLS = [
+    "https://api.mainnet-beta.solana.com",  # kostenloser RPC
+    # weitere RPCs als Fallback hier eintragen, werden der Reihe nach probiert
+]
+SOLANA_RPC_BATCH_SIZE = 25  # getTransaction pro Batch-Request
+SOLANA_WS_URL = "wss://api.mainnet-beta.solana.com"  # None = nur Polling
+DEPOSIT_POLL_INTERVAL = 15  # Sekunden zwischen Signatur-Scans
+DEPOSIT_POLL_INTERVAL_PUSH = 120  # mit Websocket ist der Scan nur Sicherheitsnetz
+DEPOSIT_WAKE_MIN_INTERVAL = 3  # Sekunden Mindestabstand zwischen Scans, die ein Deposit-Check auslöst
+DEPOSIT_CHECK_RATE = 1 / 20  # "🔍 Deposit prüfen" pro Sekunde und User (Token-Bucket) ...
+DEPOSIT_CHECK_BURST = 3  # ... mit so vielen Checks am Stück
+DEPOSIT_CHECK_CACHE_TTL = 5  # Sekunden, die ein Check-Ergebnis pro User wiederverwendet wird
+DEPOSIT_CHECK_WORKERS = 8  # eigener kleiner Pool, konkurriert nicht mit Fan-outs und Exporten
+DEPOSIT_CHECK_QUEUE = 1024  # wartende Checks, darüber wird abgelehnt (Token geht zurück)
+DEPOSIT_TOKENS = {deposit_indexer.USDC_MINT: "USDC"}  # SPL-Mints, die neben SOL als Einzahlung zählen (Mint -> Asset)
+PRICE_FEED_URL = "https://api.coingecko.com/api/v3/simple/price?ids=solana,usd-coin&vs_currencies=usd"
+PRICE_FILE = None  # optional: lokale JSON-Datei {"SOL": 187.4} als zweite Quelle
+PRICE_TTL = 30  # Sekunden, danach wird der Kurs im Hintergrund erneuert
+PRICE_MAX_AGE = 600  # älter als das → Gutschrift wartet auf einen neuen Kurs
+PAYOUT_KEYPAIR = None  # solana-keygen-Datei der Hot-Wallet, None = Auszahlungen manuell durch den Admin
+PAYOUT_INTERVAL = 10  # Sekunden zwischen zwei Auszahlungs-Läufen
+TX_CACHE_PATH = "tx_cache.db"  # finalisierte Transaktionen, komprimiert
+TX_CACHE_MEMORY_MB = 32
+SIGNAL_SEND_WORKERS = 16  # parallele Sender beim Signal-Fan-out
+SIGNAL_USER_CHUNK = 1000  # User pro DB-Chunk beim Signal
+EXCHANGE_URL = None  # REST-Endpoint der Börse (siehe execution.HttpExchange), None = Trades nur erfassen
+EXCHANGE_API_KEY = os.environ.get("EXCHANGE_API_KEY")
+EXCHANGE_ACCOUNT = "main"  # Omnibus-Account, über den alle Auto-Entries laufen
+EXCHANGE_AGGREGATE = True  # Orders pro Symbol verrechnen und als eine Netto-Order senden
+EXCHANGE_MAX_BATCH = 20  # Orders pro Request, wenn nicht verrechnet wird
+EXCHANGE_ACCOUNT_RATE = 10.0  # Requests/s pro Börsen-Account
+EXCHANGE_WORKERS = 16  # parallele Order-Requests
+BROADCAST_RATE = 25.0  # Nachrichten/Sekunde für Broadcasts (Telegram: ~30/s)
+TELEGRAM_RATE = 30.0  # Nachrichten/Sekunde insgesamt, im Worker-Modus auf die Prozesse verteilt
+TELEGRAM_CHAT_RATE = 1.0  # Nachrichten/Sekunde pro privatem Chat
+RENDER_CACHE_SIZE = 50_000  # Nachrichten, deren zuletzt gerenderter Inhalt gemerkt wird
+RUN_MODE = "polling"  # "polling" oder "webhook", per --mode überschreibbar
+WEBHOOK_URL = None  # öffentliche HTTPS-URL, z.B. "https://bot.example.com/telegram"
+WEBHOOK_LISTEN = "127.0.0.1"  # lokaler Server hinter dem Reverse-Proxy
+WEBHOOK_PORT = 8443
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+HANDLER_WORKERS = 16  # Threads für Updates (pro Chat seriell, Chats parallel)
+HANDLER_MAX_PENDING_PER_CHAT = 20  # mehr offene Updates pro Chat werden verworfen
+HEAVY_WORKERS = 4  # Threads für lange Jobs (Signal-Fan-out, Broadcast, Export)
+HEAVY_QUEUE = 32  # wartende lange Jobs, darüber wird abgelehnt
+WORKERS = 0  # >0: Intake-Prozess + so viele Worker-Prozesse (per --workers überschreibbar)
+METRICS_PORT = 9108  # Prometheus /metrics auf 127.0.0.1, Worker i auf METRICS_PORT+1+i, None = aus
+METRICS_PROFILER = False  # /profile?seconds=N (Sampling-Profiler, collapsed stacks)
+
+log = logging.getLogger(__name__)
 
 bot = telebot.TeleBot(BOT_TOKEN)
 
+# Alle Bot-API-Calls: gemeinsame Session, Rate-Limits, 429-Retry, Bulk hinter interaktiven Antworten
+transport = telegram_transport.Transport(rate=TELEGRAM_RATE, chat_rate=TELEGRAM_CHAT_RATE).install()
+
+# Latenz pro Handler/Zweig, Bot-API-Calls nach Methode und Ergebnis
+registry = metrics.Registry()
+transport.request = metrics.instrument_telegram(registry, transport.request)
+
+# Edits mit unverändertem Inhalt werden nicht verschickt
+screens = render.RenderCache(bot, maxsize=RENDER_CACHE_SIZE)
+timed = metrics.HandlerTimer(registry)
+notify_failures = registry.counter("bot_notify_failures_total", "Fehlgeschlagene Nebenbei-Nachrichten", ("kind",))
+
+# Updates laufen pro Chat in Reihenfolge, lange Jobs in einem eigenen, begrenzten Pool
+chats = executor.ChatExecutor(HANDLER_WORKERS, max_pending_per_chat=HANDLER_MAX_PENDING_PER_CHAT)
+heavy = executor.BoundedPool(HEAVY_WORKERS, max_queue=HEAVY_QUEUE)
+executor.attach(bot, chats)
+
 DB_PATH = "auto_entry_bot.db"
+DB_COMMIT_INTERVAL = 0.02  # Sekunden, die der Writer Writes sammelt, bevor er committet
+USER_CACHE_SIZE = 10000  # User-Zeilen im Speicher (LRU), 0 = aus
+STATE_BACKEND = "sqlite"  # "sqlite" (übersteht Restarts, mehrere Prozesse) oder "memory"
+STATE_TTL = 3600  # Sekunden, nach denen ein abgebrochener Dialog verfällt
+STATE_MEMORY_SIZE = 100_000  # nur "memory": max. offene Dialoge im Speicher
+LEDGER_SNAPSHOT_INTERVAL = 3600  # Sekunden zwischen Ledger-Snapshots + Abgleich
+EXPORT_QUICK_DAYS = 30  # Schnell-Export im Admin-Menü: letzte N Tage als CSV.gz
+EXPORT_UPLOAD_TIMEOUT = 300  # Sekunden pro hochgeladener Teil-Datei
 
 # =======================
 # DATABASE
 # =======================
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-conn = get_db()
-cur = conn.cursor()
-
-cur.execute("""
-CREATE TABLE IF NOT EXISTS users (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    telegram_id INTEGER UNIQUE,
-    username TEXT,
-    sender_wallet TEXT,
-    balance_usd REAL DEFAULT 0,
-    auto_entry INTEGER DEFAULT 0,
-    risk_percent INTEGER DEFAULT 10,
-    created_at TEXT
-)
-""")
-
-cur.execute("""
-CREATE TABLE IF NOT EXISTS deposits (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER,
-    from_wallet TEXT,
-    tx_sig TEXT,
-    amount_usd REAL,
-    status TEXT,
-    created_at TEXT,
-    FOREIGN KEY(user_id) REFERENCES users(id)
-)
-""")
-
-cur.execute("""
-CREATE TABLE IF NOT EXISTS withdrawals (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER,
-    amount_usd REAL,
-    target_wallet TEXT,
-    status TEXT,
-    created_at TEXT,
-    FOREIGN KEY(user_id) REFERENCES users(id)
-)
-""")
-
-cur.execute("""
-CREATE TABLE IF NOT EXISTS signals (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    symbol TEXT,
-    direction TEXT,
-    leverage TEXT,
-    raw_text TEXT,
-    created_at TEXT
-)
-""")
-
-cur.execute("""
-CREATE TABLE IF NOT EXISTS trades (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER,
-    signal_id INTEGER,
-    amount_usd REAL,
-    risk_percent INTEGER,
-    created_at TEXT,
-    FOREIGN KEY(user_id) REFERENCES users(id),
-    FOREIGN KEY(signal_id) REFERENCES signals(id)
-)
-""")
+db = database.Database(DB_PATH, commit_interval=DB_COMMIT_INTERVAL)
 
-conn.commit()
+# Schema wird über nummerierte Migrationen aufgebaut/aktualisiert (migrations.py)
+conn = db.connect()
+migrations.migrate(conn)
+conn.close()
 
 # =======================
 # HELPERS
@@ -103,59 +141,70 @@ conn.commit()
 def now():
     return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
 
+# User-Zeilen im Speicher, alle Helper unten schreiben durch
+users_cache = user_cache.UserCache(USER_CACHE_SIZE)
+
 def get_or_create_user(message):
     tg_id = message.from_user.id
     username = message.from_user.username or ""
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM users WHERE telegram_id = ?", (tg_id,))
-    row = cur.fetchone()
+    row = get_user_by_telegram_id(tg_id)
     if row:
         return row
-    cur.execute("""
-        INSERT INTO users (telegram_id, username, created_at)
+    db.write("""
+        INSERT OR IGNORE INTO users (telegram_id, username, created_at)
         VALUES (?,?,?)
     """, (tg_id, username, now()))
-    conn.commit()
-    cur.execute("SELECT * FROM users WHERE telegram_id = ?", (tg_id,))
-    return cur.fetchone()
+    return get_user_by_telegram_id(tg_id)
 
 def get_user_by_telegram_id(tg_id: int):
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM users WHERE telegram_id = ?", (tg_id,))
-    return cur.fetchone()
+    row = users_cache.get(tg_id)
+    if row is not None:
+        return row
+    generation = users_cache.generation()
+    row = db.query_one("SELECT * FROM users WHERE telegram_id = ?", (tg_id,))
+    return users_cache.put(row, generation) if row else None
+
+def cache_balance(user_id, balance_micro):
+    users_cache.update(user_id, balance_micro=balance_micro, balance_usd=ledger.to_usd(balance_micro))
 
 def update_balance(user_id, new_balance):
-    cur = conn.cursor()
-    cur.execute("UPDATE users SET balance_usd = ? WHERE id = ?", (new_balance, user_id))
-    conn.commit()
+    """Admin-Korrektur: gebucht wird die Differenz zum aktuellen Saldo (Ledger)."""
+    balance_micro = db.transaction(
+        lambda conn: ledger.set_balance(conn, user_id, ledger.to_micro(new_balance)))
+    cache_balance(user_id, balance_micro)
+    if cluster:
+        # der Ziel-User wird evtl. in einem anderen Worker-Prozess bedient
+        cluster.invalidate(user_id)
 
 def set_auto_entry(user_id, enabled: bool):
-    cur = conn.cursor()
-    cur.execute("UPDATE users SET auto_entry = ? WHERE id = ?", (1 if enabled else 0, user_id))
-    conn.commit()
+    db.write("UPDATE users SET auto_entry = ? WHERE id = ?", (1 if enabled else 0, user_id))
+    users_cache.update(user_id, auto_entry=1 if enabled else 0)
 
 def set_risk_percent(user_id, percent: int):
-    cur = conn.cursor()
-    cur.execute("UPDATE users SET risk_percent = ? WHERE id = ?", (percent, user_id))
-    conn.commit()
+    db.write("UPDATE users SET risk_percent = ? WHERE id = ?", (percent, user_id))
+    users_cache.update(user_id, risk_percent=percent)
 
 def set_sender_wallet(user_id, wallet: str):
-    cur = conn.cursor()
-    cur.execute("UPDATE users SET sender_wallet = ? WHERE id = ?", (wallet, user_id))
-    conn.commit()
+    db.write("UPDATE users SET sender_wallet = ? WHERE id = ?", (wallet, user_id))
+    users_cache.update(user_id, sender_wallet=wallet)
 
 # =======================
 # INLINE KEYBOARDS
 # =======================
 
+# Keyboards werden pro Variante einmal gebaut und fertig serialisiert gecacht (render.py)
 def main_menu_kb(user_row):
+    return _main_menu_kb(bool(user_row["auto_entry"]), user_row["telegram_id"] in ADMIN_IDS)
+
+@render.keyboard
+def _main_menu_kb(auto_entry, is_admin):
     kb = InlineKeyboardMarkup(row_width=2)
     kb.add(
         InlineKeyboardButton("💸 Deposit", callback_data="menu_deposit"),
         InlineKeyboardButton("💵 Withdraw", callback_data="menu_withdraw"),
     )
     kb.add(
-        InlineKeyboardButton("📢 Signals ON" if not user_row["auto_entry"] else "📢 Signals OFF",
+        InlineKeyboardButton("📢 Signals ON" if not auto_entry else "📢 Signals OFF",
                              callback_data="toggle_auto_entry"),
         InlineKeyboardButton("📊 Risk %", callback_data="menu_risk"),
     )
@@ -165,10 +214,11 @@ def main_menu_kb(user_row):
     kb.add(
         InlineKeyboardButton("ℹ️ Help", callback_data="menu_help")
     )
-    if user_row["telegram_id"] in ADMIN_IDS:
+    if is_admin:
         kb.add(InlineKeyboardButton("👑 Admin Panel", callback_data="menu_admin"))
     return kb
 
+@render.keyboard
 def risk_menu_kb(current_percent):
     kb = InlineKeyboardMarkup(row_width=5)
     buttons = []
@@ -181,6 +231,7 @@ def risk_menu_kb(current_percent):
     kb.add(InlineKeyboardButton("⬅️ Back", callback_data="back_main"))
     return kb
 
+@render.keyboard
 def control_center_kb():
     kb = InlineKeyboardMarkup(row_width=1)
     kb.add(
@@ -191,6 +242,7 @@ def control_center_kb():
     )
     return kb
 
+@render.keyboard
 def admin_menu_kb():
     kb = InlineKeyboardMarkup(row_width=2)
     kb.add(
@@ -201,89 +253,307 @@ def admin_menu_kb():
         InlineKeyboardButton("📣 Broadcast", callback_data="admin_broadcast"),
         InlineKeyboardButton("🚀 Signal senden", callback_data="admin_signal"),
     )
+    kb.add(
+        InlineKeyboardButton("📊 Übersicht", callback_data="admin_summary"),
+        InlineKeyboardButton("📤 Export", callback_data="admin_export"),
+    )
     kb.add(InlineKeyboardButton("⬅️ Zurück", callback_data="back_main"))
     return kb
 
+@render.keyboard
+def admin_export_kb():
+    kb = InlineKeyboardMarkup(row_width=2)
+    kb.add(*[InlineKeyboardButton(f"📄 {table}", callback_data=f"ex:{table}") for table in exports.TABLES])
+    kb.add(InlineKeyboardButton("⬅️ Zurück", callback_data="menu_admin"))
+    return kb
+
+@render.keyboard
+def admin_summary_kb():
+    kb = InlineKeyboardMarkup(row_width=2)
+    kb.add(
+        InlineKeyboardButton("👥 Users", callback_data="admin_users"),
+        InlineKeyboardButton("⬅️ Zurück", callback_data="menu_admin"),
+    )
+    return kb
+
+def user_page_kb(rows, has_prev, has_next, page_data):
+    """Blättern per Keyset: page_data(richtung, users.id) -> callback_data."""
+    kb = InlineKeyboardMarkup(row_width=2)
+    nav = []
+    if rows and has_prev:
+        nav.append(InlineKeyboardButton("⬅️", callback_data=page_data("<", rows[0]["id"])))
+    if rows and has_next:
+        nav.append(InlineKeyboardButton("➡️", callback_data=page_data(">", rows[-1]["id"])))
+    if nav:
+        kb.row(*nav)
+    kb.row(
+        InlineKeyboardButton("🆕 Neueste", callback_data="au:n"),
+        InlineKeyboardButton("💰 Nach Balance", callback_data="au:b"),
+    )
+    kb.row(
+        InlineKeyboardButton("🔎 Suche", callback_data="admin_user_search"),
+        InlineKeyboardButton("📊 Übersicht", callback_data="admin_summary"),
+    )
+    kb.row(InlineKeyboardButton("⬅️ Zurück", callback_data="menu_admin"))
+    return kb
+
 # =======================
 # SIMPLE STATE HANDLING
 # =======================
 
-user_states = {}  # {telegram_id: {"state": str, "data": {...}}}
+# {"state": str, "data": {...}} pro telegram_id, läuft nach STATE_TTL ab
+if STATE_BACKEND == "sqlite":
+    user_states = state_store.SqliteStateStore(db, ttl=STATE_TTL)
+else:
+    user_states = state_store.MemoryStateStore(ttl=STATE_TTL, maxsize=STATE_MEMORY_SIZE)
+
+def get_state(tg_id):
+    return user_states.get(tg_id)
 
 def set_state(tg_id, state, data=None):
-    user_states[tg_id] = {"state": state, "data": data or {}}
+    user_states.set(tg_id, state, data)
 
 def clear_state(tg_id):
-    user_states.pop(tg_id, None)
+    user_states.clear(tg_id)
 
 # =======================
-# SOLANA DEPOSIT CHECK (BEISPIEL)
+# SOLANA DEPOSIT INDEXER
 # =======================
 
-def check_solana_deposit(from_wallet: str, to_wallet: str, min_amount_sol: float = 0.0):
-    """
-    Sehr vereinfachtes Beispiel:
-    - Holt letzten Signaturen für die to_wallet
-    - Lädt jede Tx und schaut, ob from_wallet -> to_wallet SOL gesendet hat.
-    - Gibt beim ersten Treffer (bool, amount_sol, tx_sig) zurück.
-    ACHTUNG: Für Produktion solltest du saubere Fehlerbehandlung & Caching einbauen.
-    """
-    headers = {"Content-Type": "application/json"}
-    # 1) Signaturen zur Zieladresse holen
-    payload = {
-        "jsonrpc": "2.0",
-        "id": 1,
-        "method": "getSignaturesForAddress",
-        "params": [to_wallet, {"limit": 30}]
-    }
-    r = requests.post(SOLANA_RPC_URL, json=payload, headers=headers, timeout=10)
-    r.raise_for_status()
-    sigs = r.json().get("result", [])
-
-    for entry in sigs:
-        sig = entry["signature"]
-        # 2) Transaktionsdetails
-        tx_payload = {
-            "jsonrpc": "2.0",
-            "id": 1,
-            "method": "getTransaction",
-            "params": [sig, {"encoding": "jsonParsed"}]
-        }
-        tr = requests.post(SOLANA_RPC_URL, json=tx_payload, headers=headers, timeout=10)
-        tr.raise_for_status()
-        tx = tr.json().get("result")
-        if not tx:
-            continue
-
-        meta = tx.get("meta")
-        message = tx.get("transaction", {}).get("message", {})
-        account_keys = message.get("accountKeys", [])
-
-        # Wir suchen einfache SOL-Transfer von from_wallet -> to_wallet
+solana = solana_rpc.SolanaRpcClient(SOLANA_RPC_URLS, batch_size=SOLANA_RPC_BATCH_SIZE)
+
+tx_store = tx_cache.TransactionCache(TX_CACHE_PATH, max_bytes=TX_CACHE_MEMORY_MB * 1024 * 1024)
+
+price_sources = [
+    price_oracle.HttpPriceSource(PRICE_FEED_URL, {"SOL": ("solana", "usd"), "USDC": ("usd-coin", "usd")}),
+]
+if PRICE_FILE:
+    price_sources.append(price_oracle.FilePriceSource(PRICE_FILE))
+price_sources.append(price_oracle.StaticPriceSource({"USDC": 1.0}))
+prices = price_oracle.PriceOracle(price_sources, ttl=PRICE_TTL, max_age=PRICE_MAX_AGE)
+
+def deposit_line(amount_usd, asset, amount):
+    """amount in ganzen Einheiten des Assets, None bei manuellen Gutschriften."""
+    if not amount:
+        return f"+{amount_usd:.2f} USD"
+    digits = 4 if asset == deposit_indexer.SOL else 2
+    return f"+{amount_usd:.2f} USD (≈ {amount:.{digits}f} {asset})"
+
+def notify_deposit(user_id, tx_sig, asset, amount):
+    """Push-Benachrichtigung direkt nach der Gutschrift durch den Indexer."""
+    # balance_usd wurde in der DB erhöht → gecachte Zeile verwerfen (auch in Workern)
+    user_changed(user_id)
+    row = db.query_one("""
+        SELECT u.telegram_id, u.balance_usd, d.amount_usd FROM deposits d
+        JOIN users u ON u.id = d.user_id
+        WHERE d.tx_sig = ? AND d.asset = ? AND d.user_id = ?
+    """, (tx_sig, asset, user_id))
+    if not row:
+        return
+    bot.send_message(
+        row["telegram_id"],
+        f"✅ Einzahlung erkannt!\n\n{deposit_line(row['amount_usd'], asset, amount)}\n"
+        f"Neue Balance: *{row['balance_usd']:.2f} USD*",
+        parse_mode="Markdown"
+    )
+    db.write("UPDATE deposits SET notified = 1 WHERE tx_sig = ? AND asset = ?", (tx_sig, asset), wait=False)
+
+indexer = deposit_indexer.DepositIndexer(
+    db=db,
+    address=MAIN_WALLET,
+    rpc=solana,
+    cache=tx_store,
+    poll_interval=DEPOSIT_POLL_INTERVAL_PUSH if SOLANA_WS_URL else DEPOSIT_POLL_INTERVAL,
+    on_credit=notify_deposit,
+    prices=prices,
+    wake_min_interval=DEPOSIT_WAKE_MIN_INTERVAL,
+    tokens=DEPOSIT_TOKENS,
+)
+
+# Ungeduldiges Tippen: Token-Bucket pro User, parallele Checks teilen sich einen Lauf
+deposit_throttle = throttle.Throttle(DEPOSIT_CHECK_RATE, burst=DEPOSIT_CHECK_BURST)
+deposit_checks = throttle.SingleFlight(ttl=DEPOSIT_CHECK_CACHE_TTL)
+# Checks sind nur ein lokaler DB-Claim → eigener Pool statt der Heavy-Pool der langen Jobs
+deposit_pool = executor.BoundedPool(DEPOSIT_CHECK_WORKERS, max_queue=DEPOSIT_CHECK_QUEUE, name="deposit-check")
+
+listener = deposit_listener.DepositListener(SOLANA_WS_URL, indexer) if SOLANA_WS_URL else None
+
+snapshotter = ledger.Snapshotter(db, interval=LEDGER_SNAPSHOT_INTERVAL)
+
+# Auto-Entries an der Börse: parallel, pro Account rate-limitiert, optional netto verrechnet
+exchange = execution.ExecutionEngine(
+    execution.HttpExchange(EXCHANGE_URL, EXCHANGE_API_KEY, aggregate=EXCHANGE_AGGREGATE,
+                           max_batch=EXCHANGE_MAX_BATCH, account_rate=EXCHANGE_ACCOUNT_RATE,
+                           pool_size=EXCHANGE_WORKERS),
+    workers=EXCHANGE_WORKERS,
+) if EXCHANGE_URL else None
+# Orders mit offenem Ausgang (Timeout nach dem Senden) per client_id nachträglich klären
+order_reconciler = execution.Reconciler(db, exchange) if exchange else None
+
+# =======================
+# AUSZAHLUNGEN
+# =======================
+
+def notify_paid(rows):
+    for r in rows:
+        user_changed(r["user_id"])
+        try:
+            bot.send_message(
+                r["telegram_id"],
+                f"✅ Auszahlung über *{r['amount_usd']:.2f} USD* (≈ {r['lamports'] / 1e9:.4f} SOL) ist angekommen.\n"
+                f"Tx: `{r['tx_sig']}`",
+                parse_mode="Markdown"
+            )
+        except Exception:
+            notify_failures.inc("payout_user")
+            log.warning("User %s nicht erreichbar", r["telegram_id"], exc_info=True)
+
+def notify_payout_failed(row, error):
+    # Betrag wurde zurückgebucht → gecachte Balance verwerfen
+    user_changed(row["user_id"])
+    if row["telegram_id"]:
         try:
-            pre_balances = meta["preBalances"]
-            post_balances = meta["postBalances"]
+            bot.send_message(
+                row["telegram_id"],
+                f"❌ Deine Auszahlung über {row['amount_usd']:.2f} USD konnte nicht ausgeführt werden. "
+                "Der Betrag wurde deinem Guthaben wieder gutgeschrieben."
+            )
         except Exception:
-            continue
+            notify_failures.inc("payout_user")
+            log.warning("User %s nicht erreichbar", row["telegram_id"], exc_info=True)
+    for admin_id in ADMIN_IDS:
+        try:
+            bot.send_message(admin_id, f"❌ Auszahlung #{row['id']} an {row['target_wallet']} fehlgeschlagen: {error}")
+        except Exception:
+            notify_failures.inc("payout_admin")
+            log.warning("Admin %s nicht erreichbar", admin_id, exc_info=True)
+
+payout_processor = payouts.PayoutProcessor(
+    db=db,
+    rpc=solana,
+    keypair=payouts.load_keypair(PAYOUT_KEYPAIR),
+    prices=prices,
+    on_paid=notify_paid,
+    on_failed=notify_payout_failed,
+    interval=PAYOUT_INTERVAL,
+) if PAYOUT_KEYPAIR else None
+
+# =======================
+# BROADCAST OUTBOX
+# =======================
 
-        # Adresse -> Index map
-        addr_index = {acc["pubkey"]: i for i, acc in enumerate(account_keys)}
+def edit_text(chat_id, message_id, text):
+    screens.edit_text(chat_id, message_id, text)
 
-        if from_wallet not in addr_index or to_wallet not in addr_index:
-            continue
+dispatcher = outbox.OutboxDispatcher(
+    db=db,
+    send=transport.bulk_sender(bot.send_message),
+    notify=bot.send_message,
+    edit=transport.bulk_sender(edit_text),
+    rate=BROADCAST_RATE,
+)
 
-        i_from = addr_index[from_wallet]
-        i_to = addr_index[to_wallet]
+# =======================
+# METRICS
+# =======================
 
-        diff_from = (post_balances[i_from] - pre_balances[i_from]) / 1e9
-        diff_to = (post_balances[i_to] - pre_balances[i_to]) / 1e9
+@registry.collector
+def collect_stats():
+    """Beim Scrape: vorhandene stats() der Komponenten auslesen (kein Aufwand im Hot-Path)."""
+    samples = []
+    for sql, s in db.stats().items():
+        q = {"query_id": database.query_id(sql)}
+        samples.append(("db_queries_total", "counter", "DB-Queries", q, s["count"]))
+        samples.append(("db_query_seconds_total", "counter", "DB-Zeit pro Query", q, s["total_ms"] / 1000))
+        samples.append(("db_query_max_seconds", "gauge", "Langsamste Ausführung pro Query", q, s["max_ms"] / 1000))
+    for method, s in solana.stats().items():
+        m = {"method": method}
+        samples.append(("solana_rpc_requests_total", "counter", "Solana-RPC-Requests", m, s["requests"]))
+        samples.append(("solana_rpc_errors_total", "counter", "Fehlgeschlagene Solana-RPC-Requests", m, s["errors"]))
+        samples.append(("solana_rpc_retries_total", "counter", "Solana-RPC-Retries", m, s["retries"]))
+        samples.append(("solana_rpc_seconds_total", "counter", "Solana-RPC-Zeit", m, s["total_ms"] / 1000))
+        samples.append(("solana_rpc_max_seconds", "gauge", "Langsamster Solana-RPC-Request", m, s["max_ms"] / 1000))
+    samples += metrics.gauges("user_cache", users_cache.stats(), "User-Cache")
+    samples += metrics.gauges("tx_cache", tx_store.stats(), "Transaktions-Cache")
+    samples += metrics.gauges("price_oracle", prices.stats(), "Kurs-Cache")
+    samples += metrics.gauges("deposit_indexer", indexer.stats(), "Deposit-Scans und eingesparte RPC-Calls (mindestens)")
+    samples += metrics.gauges("deposit_throttle", deposit_throttle.stats(), "Gedrosselte Deposit-Checks")
+    samples += metrics.gauges("deposit_checks", deposit_checks.stats(), "Zusammengefasste Deposit-Checks")
+    samples += metrics.gauges("chat_executor", chats.stats(), "Update-Executor")
+    samples += metrics.gauges("heavy_pool", heavy.stats(), "Pool für lange Jobs")
+    samples += metrics.gauges("deposit_pool", deposit_pool.stats(), "Pool für Deposit-Checks")
+    samples += metrics.gauges("telegram_transport", transport.stats(), "Bot-API-Transport")
+    samples += metrics.gauges("render_cache", screens.stats(), "Edits und übersprungene No-op-Edits")
+    samples += metrics.gauges("conversation_states", user_states.stats(), "Offene Dialoge")
+    samples += metrics.gauges("outbox", dispatcher.stats(), "Broadcast-Dispatcher: Fehler und Sende-Tempo")
+    if payout_processor:
+        samples += metrics.gauges("payouts", payout_processor.stats(), "Auszahlungen on-chain")
+    if exchange:
+        samples += metrics.gauges("exchange", exchange.stats(), "Order-Ausführung")
+    row = db.query_one("SELECT COUNT(*) AS n FROM outbox WHERE status = 'pending'")
+    samples.append(("outbox_pending", "gauge", "Wartende Broadcast-Nachrichten", {}, row["n"]))
+    return samples
+
+def start_metrics(port):
+    if port is None:
+        return None
+    server = metrics.serve(registry, port=port, profiler=METRICS_PROFILER)
+    log.info("Metrics auf http://127.0.0.1:%d/metrics", port)
+    return server
 
-        amount = round(diff_to, 6)
-        # Von from_wallet muss SOL abgegangen sein, zu to_wallet dazugekommen
-        if diff_from < 0 and diff_to > 0 and amount >= min_amount_sol:
-            return True, amount, sig
+# =======================
+# HINTERGRUND-JOBS
+# =======================
 
-    return False, 0.0, None
+# workers.Cluster im Intake-Prozess, workers.WorkerLink in Worker-Prozessen, sonst None
+cluster = None
+
+def start_background_jobs():
+    dispatcher.start()  # setzt unterbrochene Broadcasts fort
+    indexer.start()  # Deposit-Scan ab gespeichertem Cursor
+    if listener:
+        listener.start()  # Push-Erkennung per Websocket
+    snapshotter.start()  # Ledger-Snapshots + Abgleich
+    if payout_processor:
+        payout_processor.start()  # offene Batches prüfen, neue Auszahlungen bündeln
+    if order_reconciler:
+        order_reconciler.start()  # Trades mit Status "unknown" an der Börse nachschlagen
+
+def stop_background_jobs():
+    for job in (dispatcher, indexer, listener, snapshotter, payout_processor, order_reconciler):
+        if job:
+            job.stop()
+
+def on_lease_lost():
+    # ein anderer Prozess führt die Jobs jetzt aus → sauber beenden, Supervisor startet neu
+    stop_background_jobs()
+    _thread.interrupt_main()
+
+def wake_local(name):
+    job = {"dispatcher": dispatcher, "indexer": indexer, "payouts": payout_processor}[name]
+    if job:
+        job.wake()
+
+def wake_job(name):
+    """Im Worker-Modus laufen die Jobs im Intake-Prozess → über die Control-Queue wecken."""
+    if cluster:
+        cluster.wake(name)
+    else:
+        wake_local(name)
+
+def run_heavy(chat_id, fn, *args, pool=None):
+    """Langer Job in den begrenzten Pool (Default: heavy); ist er voll, bekommt der User sofort Bescheid."""
+    try:
+        return (pool or heavy).submit(fn, *args)
+    except executor.Overloaded:
+        bot.send_message(chat_id, "⏳ Gerade ist viel los. Bitte versuche es in einer Minute erneut.")
+        return None
+
+def user_changed(user_id):
+    """User-Zeile wurde an den Helpern vorbei geändert → Caches aller Prozesse verwerfen."""
+    users_cache.invalidate(user_id)
+    if cluster:
+        cluster.invalidate(user_id)
 
 # =======================
 # COMMANDS
@@ -299,30 +569,132 @@ def cmd_start(message):
         f"Dein Guthaben: *{user['balance_usd']:.2f} USD*"
     )
 
-    bot.send_message(
+    kb = main_menu_kb(user)
+    sent = bot.send_message(
         message.chat.id,
         text,
         parse_mode="Markdown",  # bleibt okay, weil kein Username mit Unterstrich mehr drin ist
-        reply_markup=main_menu_kb(user)
+        reply_markup=kb
     )
+    screens.remember(message.chat.id, sent.message_id, text, "Markdown", kb)
 
 @bot.message_handler(commands=["admin"])
 def cmd_admin(message):
     if message.from_user.id not in ADMIN_IDS:
         return
     user = get_or_create_user(message)
-    bot.send_message(
+    sent = bot.send_message(
         message.chat.id,
         "👑 Admin Panel",
         reply_markup=admin_menu_kb()
     )
+    screens.remember(message.chat.id, sent.message_id, "👑 Admin Panel", None, admin_menu_kb())
+
+@bot.message_handler(commands=["dbstats"])
+def cmd_dbstats(message):
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    top = sorted(db.stats().items(), key=lambda item: item[1]["total_ms"], reverse=True)[:10]
+    if not top:
+        bot.send_message(message.chat.id, "Noch keine Queries gemessen.")
+        return
+    lines = [
+        f"{s['total_ms']:.1f} ms gesamt · {s['count']}x · Ø {s['avg_ms']:.2f} ms · max {s['max_ms']:.1f} ms\n"
+        f"[{database.query_id(sql)}] {sql[:120]}"
+        for sql, s in top
+    ]
+    c = users_cache.stats()
+    header = (f"👤 User-Cache: {c['hits']} Hits · {c['misses']} Misses "
+              f"({c['hit_rate']:.0%}) · {c['size']} Einträge")
+    bot.send_message(message.chat.id, header + "\n\n🗄 DB-Zeit pro Query (Top 10)\n\n" + "\n\n".join(lines))
 
 # =======================
 # CALLBACKS
 # =======================
 
+USER_SORTS = {"n": ("new", "neueste zuerst"), "b": ("balance", "nach Balance")}
+USER_SEARCH_MAX = 30  # Zeichen, die Suche steht mit in callback_data (max. 64 Bytes)
+
+def user_page_text(title, rows):
+    # ohne Markdown: Usernames enthalten oft Unterstriche
+    if not rows:
+        return f"{title}\n\nKeine User gefunden."
+    lines = [
+        f"@{r['username'] or '-'} ({r['telegram_id']}): {r['balance_usd']:.2f} USD"
+        + (" · Auto-Entry" if r["auto_entry"] else "")
+        for r in rows
+    ]
+    return f"{title}\n\n" + "\n".join(lines)
+
+def user_search_page(query, after=None, before=None):
+    """Text + Keyboard einer Seite der User-Suche."""
+    rows, has_prev, has_next = user_browser.search(db, query, after, before)
+    text = user_page_text(f"🔎 User-Suche „{query}“", rows)
+    return text, user_page_kb(rows, has_prev, has_next, lambda d, uid: f"as:{d}:{uid}:{query}")
+
+def summary_text():
+    s = user_browser.summary(db)
+    return (
+        "📊 Übersicht\n\n"
+        f"User: {s['users']} (+{s['users_today']} heute)\n"
+        f"Auto-Entry aktiv: {s['auto_entry_users']}\n"
+        f"Guthaben gesamt: {s['balance_usd']:.2f} USD\n"
+        f"Offene Auszahlungen: {s['withdrawals_pending']} ({s['withdrawals_pending_usd']:.2f} USD)\n"
+        f"Einzahlungen: {s['deposits']} ({s['deposits_usd']:.2f} USD)\n"
+        f"Einzahlungen heute: {s['deposits_today']} ({s['deposits_today_usd']:.2f} USD)"
+    )
+
+def send_export(chat_id, table, fmt, compress, filters):
+    """Export als Dokument(e) an den Admin, läuft im Heavy-Pool (Speicher bleibt flach)."""
+    total = files = 0
+    try:
+        for name, file, rows in exports.parts(db, table, fmt, compress, **filters):
+            bot.send_document(chat_id, file, visible_file_name=name, caption=f"{name}: {rows} Zeilen",
+                              timeout=EXPORT_UPLOAD_TIMEOUT)
+            total += rows
+            files += 1
+    except Exception:
+        log.exception("Export %s an %s fehlgeschlagen", table, chat_id)
+        bot.send_message(chat_id, f"❌ Export {table} abgebrochen nach {total} Zeilen in {files} Datei(en).")
+        return
+    bot.send_message(chat_id, f"📤 Export {table}: {total} Zeilen in {files} Datei(en).")
+
+def claim_and_wake(user_id, sender_wallet):
+    deposits = deposit_indexer.claim_deposits(db, user_id, sender_wallet, prices)
+    wake_job("indexer")
+    return deposits
+
+def check_deposit(chat_id, tg_id, user):
+    """Lokaler Deposit-Check (läuft im deposit_pool), der Indexer scannt die Chain im Hintergrund."""
+    try:
+        deposits, shared = deposit_checks.do(user["id"], claim_and_wake, user["id"], user["sender_wallet"])
+    except price_oracle.PriceUnavailable:
+        bot.send_message(chat_id, "Der SOL-Kurs ist gerade nicht abrufbar. Bitte versuche es gleich noch einmal.")
+        return
+    if shared:
+        # Ergebnis eines parallelen/gerade erst gelaufenen Checks, den hat der User schon bekommen
+        return
+
+    if not deposits:
+        bot.send_message(chat_id, "Keine neue Einzahlung gefunden. Versuche es in ein paar Minuten erneut.")
+        return
+    users_cache.invalidate(user["id"])
+    user = get_user_by_telegram_id(tg_id)
+    lines = []
+    for d in deposits:
+        amount = d["amount"] / 10 ** d["decimals"] if d["amount"] is not None else None
+        lines.append(deposit_line(d["amount_usd"], d["asset"], amount))
+    bot.send_message(
+        chat_id,
+        "✅ Einzahlung erkannt!\n\n" + "\n".join(lines) + "\n"
+        f"Neue Balance: *{user['balance_usd']:.2f} USD*",
+        parse_mode="Markdown"
+    )
+
 @bot.callback_query_handler(func=lambda c: True)
+@timed
 def callbacks(call):
+    timed.branch(call.data.split(":", 1)[0])
     tg_id = call.from_user.id
     user = get_user_by_telegram_id(tg_id)
     if not user:
@@ -342,10 +714,10 @@ def callbacks(call):
 
     # MAIN MENU
     if data == "back_main":
-        bot.edit_message_text(
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            text=f"Dein Guthaben: *{user['balance_usd']:.2f} USD*",
+        screens.edit_text(
+            call.message.chat.id,
+            call.message.message_id,
+            f"Dein Guthaben: *{user['balance_usd']:.2f} USD*",
             parse_mode="Markdown",
             reply_markup=main_menu_kb(user)
         )
@@ -361,42 +733,41 @@ def callbacks(call):
             "Wenn deine Adresse schon gespeichert ist, kannst du direkt im Control Center "
             "auf „🔍 Deposit prüfen“ klicken."
         )
-        bot.edit_message_text(
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            text=txt,
+        screens.edit_text(
+            call.message.chat.id,
+            call.message.message_id,
+            txt,
             parse_mode="Markdown"
         )
         bot.send_message(call.message.chat.id, "Bitte sende jetzt deine *Absender-Wallet* als Nachricht.", parse_mode="Markdown")
         set_state(tg_id, "await_sender_wallet")
 
     elif data == "menu_withdraw":
-        bot.edit_message_text(
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            text="💵 *Withdraw*\n\nSende mir zuerst die *Ziel-Wallet-Adresse* für deine Auszahlung.",
+        screens.edit_text(
+            call.message.chat.id,
+            call.message.message_id,
+            "💵 *Withdraw*\n\nSende mir zuerst die *Ziel-Wallet-Adresse* für deine Auszahlung.",
             parse_mode="Markdown"
         )
         set_state(tg_id, "await_withdraw_wallet")
 
     elif data == "menu_risk":
         kb = risk_menu_kb(user["risk_percent"])
-        bot.edit_message_text(
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            text=f"📊 Wähle dein Risiko pro Trade (aktueller Wert: {user['risk_percent']}%).",
+        screens.edit_text(
+            call.message.chat.id,
+            call.message.message_id,
+            f"📊 Wähle dein Risiko pro Trade (aktueller Wert: {user['risk_percent']}%).",
             reply_markup=kb
         )
 
     elif data.startswith("risk_"):
         percent = int(data.split("_")[1])
         set_risk_percent(user["id"], percent)
-        user = get_user_by_telegram_id(tg_id)
-        kb = risk_menu_kb(user["risk_percent"])
-        bot.edit_message_text(
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            text=f"✅ Risiko auf *{percent}%* gesetzt.",
+        kb = risk_menu_kb(percent)
+        screens.edit_text(
+            call.message.chat.id,
+            call.message.message_id,
+            f"✅ Risiko auf *{percent}%* gesetzt.",
             parse_mode="Markdown",
             reply_markup=kb
         )
@@ -404,14 +775,10 @@ def callbacks(call):
     elif data == "toggle_auto_entry":
         new_state = not bool(user["auto_entry"])
         set_auto_entry(user["id"], new_state)
-        user = get_user_by_telegram_id(tg_id)
+        user = dict(user, auto_entry=1 if new_state else 0)
         status = "aktiviert" if new_state else "deaktiviert"
         bot.answer_callback_query(call.id, f"Auto-Entry {status}.")
-        bot.edit_message_reply_markup(
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            reply_markup=main_menu_kb(user)
-        )
+        screens.edit_markup(call.message.chat.id, call.message.message_id, reply_markup=main_menu_kb(user))
 
     elif data == "menu_control":
         info = (
@@ -420,10 +787,10 @@ def callbacks(call):
             f"Risk: {user['risk_percent']}%\n"
             f"Sender-Wallet: `{user['sender_wallet'] or 'noch keine hinterlegt'}`"
         )
-        bot.edit_message_text(
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            text=info,
+        screens.edit_text(
+            call.message.chat.id,
+            call.message.message_id,
+            info,
             parse_mode="Markdown",
             reply_markup=control_center_kb()
         )
@@ -436,65 +803,93 @@ def callbacks(call):
         if not user["sender_wallet"]:
             bot.answer_callback_query(call.id, "Bitte zuerst eine Absender-Wallet hinterlegen.")
         else:
-            bot.answer_callback_query(call.id, "Deposit wird geprüft...")
-            try:
-                ok, amount_sol, tx_sig = check_solana_deposit(
-                    from_wallet=user["sender_wallet"],
-                    to_wallet=MAIN_WALLET,
-                    min_amount_sol=0.0001  # Mindestbetrag
-                )
-            except Exception as e:
-                bot.send_message(call.message.chat.id, f"Fehler bei der RPC-Abfrage: {e}")
+            if deposit_checks.covered(user["id"]):
+                # läuft schon oder lief gerade → keinen weiteren Job in den Heavy-Pool stellen, kein Token verbrauchen
+                bot.answer_callback_query(call.id, "Deposit wird bereits geprüft...")
                 return
-
-            if not ok:
-                bot.send_message(call.message.chat.id, "Keine neue Einzahlung gefunden. Versuche es in ein paar Minuten erneut.")
-            else:
-                # hier kannst du Umrechnung SOL -> USD einbauen, momentan Dummy 1 SOL = 200 USD
-                amount_usd = amount_sol * 200
-                new_balance = user["balance_usd"] + amount_usd
-                update_balance(user["id"], new_balance)
-
-                cur = conn.cursor()
-                cur.execute("""
-                    INSERT INTO deposits (user_id, from_wallet, tx_sig, amount_usd, status, created_at)
-                    VALUES (?,?,?,?,?,?)
-                """, (user["id"], user["sender_wallet"], tx_sig, amount_usd, "confirmed", now()))
-                conn.commit()
-
-                bot.send_message(
-                    call.message.chat.id,
-                    f"✅ Einzahlung erkannt!\n\n+{amount_usd:.2f} USD (≈ {amount_sol:.4f} SOL)\n"
-                    f"Neue Balance: *{new_balance:.2f} USD*",
-                    parse_mode="Markdown"
-                )
+            wait = deposit_throttle.take(tg_id)
+            if wait > 0:
+                bot.answer_callback_query(call.id, f"Bitte warte noch {math.ceil(wait)}s bis zur nächsten Prüfung.")
+                return
+            bot.answer_callback_query(call.id, "Deposit wird geprüft...")
+            if run_heavy(call.message.chat.id, check_deposit, call.message.chat.id, tg_id, user,
+                         pool=deposit_pool) is None:
+                # nicht angenommen → Token zurück, der nächste Versuch soll nicht gedrosselt werden
+                deposit_throttle.refund(tg_id)
 
     # ADMIN
     elif data == "menu_admin":
         if tg_id not in ADMIN_IDS:
             bot.answer_callback_query(call.id, "Keine Berechtigung.")
             return
-        bot.edit_message_text(
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            text="👑 Admin Panel",
+        screens.edit_text(
+            call.message.chat.id,
+            call.message.message_id,
+            "👑 Admin Panel",
             reply_markup=admin_menu_kb()
         )
 
-    elif data == "admin_users":
+    elif data == "admin_users" or data.startswith("au:"):
         if tg_id not in ADMIN_IDS:
             return
-        cur = conn.cursor()
-        cur.execute("SELECT username, telegram_id, balance_usd FROM users ORDER BY id DESC LIMIT 30")
-        rows = cur.fetchall()
-        if not rows:
-            txt = "Noch keine User."
-        else:
-            lines = []
-            for r in rows:
-                lines.append(f"@{r['username'] or '-'} ({r['telegram_id']}): {r['balance_usd']:.2f} USD")
-            txt = "👥 *User Übersicht (Top 30)*\n\n" + "\n".join(lines)
-        bot.send_message(call.message.chat.id, txt, parse_mode="Markdown")
+        # au:<sort>[:<richtung>:<users.id>]
+        parts = data.split(":")
+        key = parts[1] if len(parts) > 1 and parts[1] in USER_SORTS else "n"
+        sort, label = USER_SORTS[key]
+        after = int(parts[3]) if len(parts) == 4 and parts[2] == ">" else None
+        before = int(parts[3]) if len(parts) == 4 and parts[2] == "<" else None
+        rows, has_prev, has_next = user_browser.browse(db, sort, after, before)
+        screens.edit_text(
+            call.message.chat.id,
+            call.message.message_id,
+            user_page_text(f"👥 User ({label})", rows),
+            reply_markup=user_page_kb(rows, has_prev, has_next, lambda d, uid: f"au:{key}:{d}:{uid}")
+        )
+
+    elif data.startswith("as:"):
+        if tg_id not in ADMIN_IDS:
+            return
+        # as:<richtung>:<users.id>:<suchbegriff>
+        _, direction, cursor, query = data.split(":", 3)
+        text, kb = user_search_page(query, after=int(cursor) if direction == ">" else None,
+                                    before=int(cursor) if direction == "<" else None)
+        screens.edit_text(call.message.chat.id, call.message.message_id, text, reply_markup=kb)
+
+    elif data == "admin_user_search":
+        if tg_id not in ADMIN_IDS:
+            return
+        bot.send_message(call.message.chat.id, "Sende bitte den Anfang eines Usernamens oder einer Telegram-ID.")
+        set_state(tg_id, "await_admin_user_search")
+
+    elif data == "admin_export":
+        if tg_id not in ADMIN_IDS:
+            return
+        bot.send_message(
+            call.message.chat.id,
+            f"📤 Schnell-Export: letzte {EXPORT_QUICK_DAYS} Tage als CSV (gzip).\n\n"
+            "Oder eigenen Export als Nachricht senden:\n"
+            "TABELLE [VON] [BIS] [user=TELEGRAM_ID] [csv|jsonl] [gz]\n"
+            "z.B. deposits 2026-01-01 2026-01-31 gz",
+            reply_markup=admin_export_kb()
+        )
+        set_state(tg_id, "await_admin_export")
+
+    elif data.startswith("ex:"):
+        if tg_id not in ADMIN_IDS:
+            return
+        table = data[3:]
+        if table not in exports.TABLES:
+            return
+        since = (datetime.utcnow() - timedelta(days=EXPORT_QUICK_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+        clear_state(tg_id)
+        if run_heavy(call.message.chat.id, send_export, call.message.chat.id, table, "csv", True, {"since": since}):
+            bot.answer_callback_query(call.id, "Export läuft...")
+
+    elif data == "admin_summary":
+        if tg_id not in ADMIN_IDS:
+            return
+        screens.edit_text(call.message.chat.id, call.message.message_id, summary_text(),
+                          reply_markup=admin_summary_kb())
 
     elif data == "admin_edit_balance":
         if tg_id not in ADMIN_IDS:
@@ -519,9 +914,12 @@ def callbacks(call):
 # =======================
 
 @bot.message_handler(func=lambda m: True)
+@timed
 def all_messages(message):
     tg_id = message.from_user.id
-    state = user_states.get(tg_id, {}).get("state")
+    entry = get_state(tg_id)
+    state = entry["state"] if entry else None
+    timed.branch(state or "none")
 
     # Kein aktiver State → ignorieren oder Help
     if not state:
@@ -531,19 +929,22 @@ def all_messages(message):
         user = get_or_create_user(message)
         wallet = message.text.strip()
         set_sender_wallet(user["id"], wallet)
+        deposit_checks.forget(user["id"])  # gecachtes Ergebnis gehört noch zur alten Wallet
         clear_state(tg_id)
         bot.reply_to(message, f"✅ Absender-Wallet gespeichert:\n`{wallet}`", parse_mode="Markdown")
 
     elif state == "await_withdraw_wallet":
         user = get_or_create_user(message)
         wallet = message.text.strip()
-        user_states[tg_id]["data"]["withdraw_wallet"] = wallet
-        set_state(tg_id, "await_withdraw_amount", user_states[tg_id]["data"])
+        if payouts.parse_wallet(wallet) is None:
+            bot.reply_to(message, "Das ist keine gültige Solana-Adresse. Bitte nochmal senden.")
+            return
+        set_state(tg_id, "await_withdraw_amount", dict(entry["data"], withdraw_wallet=wallet))
         bot.reply_to(message, "Gib jetzt bitte den *Betrag in USD* ein, den du auszahlen möchtest.", parse_mode="Markdown")
 
     elif state == "await_withdraw_amount":
         user = get_or_create_user(message)
-        data = user_states[tg_id]["data"]
+        data = entry["data"]
         wallet = data["withdraw_wallet"]
         try:
             amount = float(message.text.replace(",", "."))
@@ -555,25 +956,33 @@ def all_messages(message):
             bot.reply_to(message, "Ungültiger Betrag oder zu wenig Guthaben.")
             return
 
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO withdrawals (user_id, amount_usd, target_wallet, status, created_at)
-            VALUES (?,?,?,?,?)
-        """, (user["id"], amount, wallet, "pending", now()))
-        conn.commit()
+        # Anfrage + Belastung atomar, der Saldo wird in SQL geprüft (kein Read-Modify-Write)
+        def request_withdrawal(conn):
+            wid = conn.execute("""
+                INSERT INTO withdrawals (user_id, amount_usd, target_wallet, status, created_at)
+                VALUES (?,?,?,?,?)
+            """, (user["id"], amount, wallet, "pending", now())).lastrowid
+            return ledger.post(conn, user["id"], -ledger.to_micro(amount), "withdrawal", str(wid))
 
-        # Balance direkt reduzieren, Admin zahlt manuell aus
-        new_balance = user["balance_usd"] - amount
-        update_balance(user["id"], new_balance)
+        try:
+            balance_micro = db.transaction(request_withdrawal)
+        except ledger.InsufficientFunds:
+            users_cache.invalidate(user["id"])
+            bot.reply_to(message, "Ungültiger Betrag oder zu wenig Guthaben.")
+            return
+        cache_balance(user["id"], balance_micro)
 
         clear_state(tg_id)
         bot.reply_to(
             message,
             f"✅ Auszahlungsanfrage über *{amount:.2f} USD* aufgenommen.\n"
             f"Ziel-Wallet: `{wallet}`\n\n"
-            "Der Admin bearbeitet deine Anfrage in Kürze.",
+            + ("Die Auszahlung wird automatisch gesendet, du bekommst eine Nachricht, sobald sie angekommen ist."
+               if PAYOUT_KEYPAIR else "Der Admin bearbeitet deine Anfrage in Kürze."),
             parse_mode="Markdown"
         )
+        if PAYOUT_KEYPAIR:
+            wake_job("payouts")
 
         # Admin informieren
         for admin_id in ADMIN_IDS:
@@ -587,7 +996,8 @@ def all_messages(message):
                     parse_mode="Markdown"
                 )
             except Exception:
-                pass
+                notify_failures.inc("withdrawal_admin")
+                log.warning("Admin %s nicht erreichbar", admin_id, exc_info=True)
 
     elif state == "await_admin_edit_balance":
         if tg_id not in ADMIN_IDS:
@@ -620,26 +1030,46 @@ def all_messages(message):
                 parse_mode="Markdown"
             )
         except Exception:
-            pass
+            notify_failures.inc("balance_user")
+            log.warning("User %s nicht erreichbar", target_tg_id, exc_info=True)
+
+    elif state == "await_admin_user_search":
+        if tg_id not in ADMIN_IDS:
+            clear_state(tg_id)
+            return
+        clear_state(tg_id)
+        text, kb = user_search_page(message.text.strip().lstrip("@")[:USER_SEARCH_MAX])
+        bot.send_message(message.chat.id, text, reply_markup=kb)
+
+    elif state == "await_admin_export":
+        if tg_id not in ADMIN_IDS:
+            clear_state(tg_id)
+            return
+        try:
+            table, fmt, compress, filters = exports.parse_request(message.text)
+        except exports.ExportError as e:
+            bot.reply_to(message, f"{e}\nFormat: TABELLE [VON] [BIS] [user=TELEGRAM_ID] [csv|jsonl] [gz]")
+            return
+        clear_state(tg_id)
+        if run_heavy(message.chat.id, send_export, message.chat.id, table, fmt, compress, filters):
+            bot.reply_to(message, "📤 Export läuft, die Datei(en) kommen gleich.")
 
     elif state == "await_admin_broadcast":
         if tg_id not in ADMIN_IDS:
             clear_state(tg_id)
             return
         text = message.text
-        cur = conn.cursor()
-        cur.execute("SELECT telegram_id FROM users")
-        rows = cur.fetchall()
-        sent = 0
-        for r in rows:
-            try:
-                bot.send_message(r["telegram_id"], f"📣 *Broadcast*\n\n{text}", parse_mode="Markdown")
-                sent += 1
-                time.sleep(0.05)
-            except Exception:
-                continue
         clear_state(tg_id)
-        bot.reply_to(message, f"Broadcast an {sent} User gesendet.")
+
+        def enqueue():
+            # Broadcast landet in der Outbox, der Dispatcher verschickt im Hintergrund
+            broadcast_id, total = outbox.enqueue_broadcast(db, message.chat.id, f"📣 *Broadcast*\n\n{text}")
+            progress = bot.reply_to(message, f"📣 Broadcast #{broadcast_id} an {total} User eingereiht...")
+            outbox.set_progress_message(db, broadcast_id, progress.message_id)
+            wake_job("dispatcher")
+
+        # INSERT ... SELECT über alle User kann dauern → nicht im Chat-Thread
+        run_heavy(message.chat.id, enqueue)
 
     elif state == "await_admin_signal":
         if tg_id not in ADMIN_IDS:
@@ -652,58 +1082,115 @@ def all_messages(message):
         direction = parts[1].upper() if len(parts) > 1 else "LONG"
         leverage = parts[2] if len(parts) > 2 else ""
 
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO signals (symbol, direction, leverage, raw_text, created_at)
-            VALUES (?,?,?,?,?)
-        """, (symbol, direction, leverage, raw, now()))
-        conn.commit()
-        signal_id = cur.lastrowid
+        created_at = now()
 
-        # Alle User holen
-        cur.execute("SELECT * FROM users")
-        users = cur.fetchall()
-
-        for u in users:
-            msg_text = (
+        def render(auto_entry, risk_percent, amount, fill):
+            text = (
                 f"🚨 *Neues Signal*\n\n"
                 f"{raw}\n\n"
-                f"Dein Auto-Entry: {'ON' if u['auto_entry'] else 'OFF'}\n"
-                f"Risk: {u['risk_percent']}%\n"
+                f"Dein Auto-Entry: {'ON' if auto_entry else 'OFF'}\n"
+                f"Risk: {risk_percent}%\n"
+            )
+            if amount <= 0:
+                return text
+            if fill is None and exchange is None:
+                text += f"\n🤖 Auto-Entry ausgeführt: *{amount:.2f} USD* auf {symbol} {direction} {leverage}"
+            elif fill is None or fill.status == "rejected":
+                text += f"\n⚠️ Auto-Entry über {amount:.2f} USD auf {symbol} konnte nicht ausgeführt werden."
+            elif fill.status == "unknown":
+                text += f"\n⏳ Auto-Entry über {amount:.2f} USD auf {symbol} wird noch von der Börse bestätigt."
+            else:
+                text += f"\n🤖 Auto-Entry ausgeführt: *{fill.filled_usd:.2f} USD* auf {symbol} {direction} {leverage}"
+                if fill.price is not None:
+                    text += f" @ {fill.price:g}"
+            return text
+
+        def run():
+            signal_id = db.write("""
+                INSERT INTO signals (symbol, direction, leverage, raw_text, created_at)
+                VALUES (?,?,?,?,?)
+            """, (symbol, direction, leverage, raw, created_at)).lastrowid
+            report = signal_engine.run_signal(
+                db, signal_id, render, transport.bulk_sender(bot.send_message), created_at,
+                max_workers=SIGNAL_SEND_WORKERS, chunk_size=SIGNAL_USER_CHUNK,
+                engine=exchange, symbol=symbol, direction=direction, leverage=leverage, account=EXCHANGE_ACCOUNT
             )
             try:
-                bot.send_message(u["telegram_id"], msg_text, parse_mode="Markdown")
+                bot.send_message(message.chat.id, signal_engine.format_report(report), parse_mode="Markdown")
             except Exception:
-                continue
-
-            # Auto-Einstieg simulieren
-            if u["auto_entry"]:
-                amount = round(u["balance_usd"] * (u["risk_percent"] / 100.0), 2)
-                if amount > 0:
-                    # Trade loggen
-                    cur.execute("""
-                        INSERT INTO trades (user_id, signal_id, amount_usd, risk_percent, created_at)
-                        VALUES (?,?,?,?,?)
-                    """, (u["id"], signal_id, amount, u["risk_percent"], now()))
-                    conn.commit()
-
-                    # hier würdest du deinen echten Exchange-API-Call machen
-                    try:
-                        bot.send_message(
-                            u["telegram_id"],
-                            f"🤖 Auto-Entry ausgeführt: *{amount:.2f} USD* auf {symbol} {direction} {leverage}",
-                            parse_mode="Markdown"
-                        )
-                    except Exception:
-                        pass
+                notify_failures.inc("signal_report")
+                log.warning("Signal-Report an %s fehlgeschlagen", message.chat.id, exc_info=True)
 
         clear_state(tg_id)
-        bot.reply_to(message, "Signal gesendet & Auto-Entries verarbeitet.")
+        # Fan-out läuft im Heavy-Pool, der Chat-Thread bleibt frei
+        if run_heavy(message.chat.id, run):
+            bot.reply_to(message, "Signal wird verteilt & Auto-Entries verarbeitet. Report folgt.")
 
 # =======================
 # START BOT
 # =======================
 
+def run_worker(index, inboxes, control, metrics_port=None):
+    """Einstieg der Worker-Prozesse (spawn lädt dieses Modul neu, ohne main())."""
+    global cluster
+    cluster = workers.WorkerLink(control)
+    transport.set_rate(TELEGRAM_RATE / (len(inboxes) + 1))  # Intake + Worker teilen sich das Limit
+    start_metrics(metrics_port + 1 + index if metrics_port else None)
+    workers.serve(bot, index, inboxes, on_invalidate=users_cache.invalidate)  # Updates laufen über chats
+
+
+def main():
+    global cluster
+    parser = argparse.ArgumentParser(description="Auto-Entry-Bot")
+    parser.add_argument("--mode", choices=["polling", "webhook"], default=RUN_MODE)
+    parser.add_argument("--webhook-url", default=WEBHOOK_URL, help="öffentliche URL für setWebhook")
+    parser.add_argument("--listen", default=WEBHOOK_LISTEN)
+    parser.add_argument("--port", type=int, default=WEBHOOK_PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Worker-Prozesse (0 = alles in einem Prozess)")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, help="Port für /metrics (0 = aus)")
+    args = parser.parse_args()
+    if args.mode == "webhook" and not args.webhook_url:
+        parser.error("--webhook-url fehlt (oder WEBHOOK_URL setzen)")
+
+    print(f"Bot läuft ({args.mode}, {args.workers or 'keine'} Worker)...")
+    start_metrics(args.metrics_port or None)
+
+    # Hintergrund-Jobs nur im Prozess mit der Lease (auch bei mehreren Instanzen)
+    elector = leases.LeaderElector(db, "background-jobs", on_elected=start_background_jobs,
+                                   on_lost=on_lease_lost)
+    elector.start()
+
+    if args.workers:
+        transport.set_rate(TELEGRAM_RATE / (args.workers + 1))
+        cluster = workers.Cluster(run_worker, args.workers, on_wake=wake_local,
+                                  args=(args.metrics_port,))
+        cluster.start()
+
+    try:
+        if args.mode == "webhook":
+            sink = (lambda body: cluster.dispatch(body, block=False)) if args.workers else None
+            server = webhook.WebhookServer(bot, WEBHOOK_SECRET, host=args.listen, port=args.port,
+                                           path=urlparse(args.webhook_url).path or "/", sink=sink)
+            print(f"Webhook lauscht auf {server.start()}")
+            registry.collector(lambda: metrics.gauges("webhook", server.stats(), "Webhook-Intake"))
+            server.register(args.webhook_url)
+            server.serve_forever()
+        elif args.workers:
+            bot.remove_webhook()
+            cluster.poll(BOT_TOKEN, threading.Event())
+        else:
+            bot.remove_webhook()  # Polling geht nur ohne gesetzten Webhook
+            bot.infinity_polling(skip_pending=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.workers:
+            cluster.stop()
+        stop_background_jobs()
+        elector.stop()
+    if elector.lost.is_set():
+        raise SystemExit(1)
+
+
 if __name__ == "__main__":
-    print("Bot läuft...")
-    bot.infinity_polling(skip_pending=True)
\ No newline at end of file
+    main()
@@ -0,0 +1,232 @@
+import hashlib
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+
+# =======================
+# DATABASE LAYER
+# =======================
+#
+# - WAL-Journal + busy_timeout, damit Leser nie auf den Schreiber warten
+# - Lesen: eine Connection pro Thread (inkl. Statement-Cache von sqlite3)
+# - Schreiben: ein einzelner Writer-Thread sammelt alle Writes aus der Queue
+#   und schreibt sie gebündelt in einer Transaktion (commit_interval)
+# - jede Query wird getimed → stats() für Profiling; Schlüssel ist das
+#   normalisierte SQL (IN-Listen zusammengefasst, sonst wächst stats() mit
+#   jeder Listenlänge), query_id() liefert dazu ein kurzes, stabiles Label
+
+COMMIT_INTERVAL = 0.02   # Sekunden, die der Writer weitere Writes sammelt
+MAX_BATCH = 500          # max. Writes pro Commit
+BUSY_TIMEOUT_MS = 5000
+CACHED_STATEMENTS = 256
+
+WriteResult = namedtuple("WriteResult", "lastrowid rowcount")
+
+
+_IN_LIST = re.compile(r"\bIN \(\?(?: ?, ?\?)*\)", re.IGNORECASE)
+
+
+def normalize(sql):
+    return _IN_LIST.sub("IN (…)", " ".join(sql.split()))
+
+
+def query_id(sql):
+    """Kurzer Hash des normalisierten SQL, z.B. als Metrik-Label."""
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:12]
+
+
+class _TimedConnection:
+    """Dünner Wrapper um eine sqlite3-Connection, der jede Query misst."""
+
+    def __init__(self, conn, db):
+        self._conn = conn
+        self._db = db
+
+    def execute(self, sql, params=()):
+        start = time.perf_counter()
+        try:
+            return self._conn.execute(sql, params)
+        finally:
+            self._db._record(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq):
+        start = time.perf_counter()
+        try:
+            return self._conn.executemany(sql, seq)
+        finally:
+            self._db._record(sql, time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class Database:
+
+    def __init__(self, path, commit_interval=COMMIT_INTERVAL, max_batch=MAX_BATCH,
+                 busy_timeout_ms=BUSY_TIMEOUT_MS, cached_statements=CACHED_STATEMENTS):
+        self.path = path
+        self.commit_interval = commit_interval
+        self.max_batch = max_batch
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        self._writer = threading.Thread(target=self._write_loop, name="db-writer", daemon=True)
+        self._writer.start()
+
+    # ---------- Connections ----------
+
+    def connect(self):
+        """Neue, fertig konfigurierte Connection (autocommit, Transaktionen explizit)."""
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=self.cached_statements,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def reader(self):
+        """Lese-Connection des aktuellen Threads."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = _TimedConnection(self.connect(), self)
+            self._local.conn = conn
+        return conn
+
+    # ---------- Lesen ----------
+
+    def query(self, sql, params=()):
+        return self.reader().execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=()):
+        return self.reader().execute(sql, params).fetchone()
+
+    def iter_query(self, sql, params=(), size=1000):
+        """Streamt ein Ergebnis per fetchmany, ohne alles in den Speicher zu laden."""
+        cur = self.connect().execute(sql, params)
+        try:
+            while True:
+                rows = cur.fetchmany(size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cur.connection.close()
+
+    # ---------- Schreiben ----------
+
+    def write(self, sql, params=(), wait=True):
+        """Einzelnes Statement über den Writer. Gibt WriteResult zurück (bzw. Future)."""
+        return self._submit(("one", sql, params), wait)
+
+    def write_many(self, sql, seq, wait=True):
+        return self._submit(("many", sql, list(seq)), wait)
+
+    def transaction(self, fn, wait=True):
+        """
+        Führt fn(conn) atomar im Writer-Thread aus (eigener Savepoint innerhalb
+        des Batches). Der Rückgabewert von fn wird durchgereicht.
+        """
+        return self._submit(("fn", fn, None), wait)
+
+    def _submit(self, job, wait):
+        future = Future()
+        self._queue.put((job, future))
+        return future.result() if wait else future
+
+    def _write_loop(self):
+        conn = _TimedConnection(self.connect(), self)
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.commit_interval
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            results = []
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for job, future in batch:
+                    results.append((future, *self._run_job(conn, job)))
+                conn.execute("COMMIT")
+            except Exception as e:
+                # Commit selbst ist fehlgeschlagen → alle Jobs des Batches schlagen fehl
+                try:
+                    conn.execute("ROLLBACK")
+                except Exception:
+                    pass
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            # Futures erst nach dem Commit auflösen → wait=True heißt "dauerhaft gespeichert"
+            for future, ok, value in results:
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    def _run_job(self, conn, job):
+        kind, a, b = job
+        conn.execute("SAVEPOINT job")
+        try:
+            if kind == "one":
+                cur = conn.execute(a, b)
+                value = WriteResult(cur.lastrowid, cur.rowcount)
+            elif kind == "many":
+                cur = conn.executemany(a, b)
+                value = WriteResult(cur.lastrowid, cur.rowcount)
+            else:
+                value = a(conn)
+            conn.execute("RELEASE job")
+            return True, value
+        except Exception as e:
+            conn.execute("ROLLBACK TO job")
+            conn.execute("RELEASE job")
+            return False, e
+
+    # ---------- Profiling ----------
+
+    def _record(self, sql, elapsed):
+        key = normalize(sql)
+        with self._stats_lock:
+            s = self._stats.get(key)
+            if s is None:
+                s = self._stats[key] = [0, 0.0, 0.0]
+            s[0] += 1
+            s[1] += elapsed
+            if elapsed > s[2]:
+                s[2] = elapsed
+
+    def stats(self):
+        """DB-Zeit pro Query: {sql: {"count", "total_ms", "avg_ms", "max_ms"}}."""
+        with self._stats_lock:
+            return {
+                sql: {
+                    "count": n,
+                    "total_ms": total * 1000,
+                    "avg_ms": total * 1000 / n if n else 0.0,
+                    "max_ms": worst * 1000,
+                }
+                for sql, (n, total, worst) in self._stats.items()
+            }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats.clear()
@@ -0,0 +1,387 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import ledger
+import price_oracle
+import throttle
+
+# =======================
+# DEPOSIT INDEXER
+# =======================
+#
+# Ein Hintergrund-Thread folgt den Signaturen von MAIN_WALLET inkrementell:
+# - Cursor (until/before/head) liegt in indexer_cursors und übersteht Restarts
+# - jede Transaktion wird genau einmal geladen und in EINEM Durchlauf geparst:
+#   natives SOL (pre/postBalances) und SPL-Token der konfigurierten Mints
+#   (pre/postTokenBalances) → chain_transfers, eine Zeile pro (tx_sig, asset)
+# - Absender werden über den Index auf users.sender_wallet einem User
+#   zugeordnet und sofort gutgeschrieben (deposits (tx_sig, asset) ist unique),
+#   alle Transfers einer Seite in einer DB-Transaktion
+# Der "🔍 Deposit prüfen"-Button liest danach nur noch lokal aus der DB.
+# Weckrufe (Button, Websocket) werden zusammengefasst: gleichzeitige sync()-
+# Aufrufe teilen sich einen Lauf, und nach einem Weckruf wird frühestens
+# WAKE_MIN_INTERVAL nach dem letzten Scan erneut gescannt.
+
+log = logging.getLogger(__name__)
+
+PAGE_SIZE = 100           # Signaturen pro getSignaturesForAddress
+INITIAL_BACKFILL = 1000   # beim allerersten Lauf max. so weit zurück
+POLL_INTERVAL = 15        # Sekunden zwischen zwei Scans
+WAKE_MIN_INTERVAL = 3     # Sekunden Mindestabstand zwischen Scans per wake()
+MIN_DEPOSIT_LAMPORTS = 100_000  # 0.0001 SOL
+MIN_TOKEN_AMOUNT = 0.01   # kleinere Token-Einzahlungen (in ganzen Token) werden ignoriert
+SOL_USD = 200.0           # Fallback-Kurs, wenn kein Oracle übergeben wird
+SOL = "SOL"
+SOL_DECIMALS = 9
+USDC_MINT = "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v"
+TOKEN_MINTS = {USDC_MINT: "USDC"}  # Mint -> Asset, das als Einzahlung zählt
+
+# senders = Adressen (Wallets) mit Abgang, größter zuerst; amount in der kleinsten Einheit
+Transfer = namedtuple("Transfer", "asset senders amount decimals")
+
+
+def now():
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def parse_transfers(tx, to_wallet, mints=TOKEN_MINTS):
+    """
+    Liefert alle eingehenden Zahlungen an to_wallet als Liste von Transfers:
+    natives SOL über die Account-Salden, SPL-Token über die Token-Salden
+    (Empfänger ist der Owner des Token-Accounts). Ein Durchlauf pro Feld.
+    """
+    meta = tx.get("meta") or {}
+    if meta.get("err") is not None:
+        return []
+    transfers = []
+
+    pre_balances = meta.get("preBalances")
+    post_balances = meta.get("postBalances")
+    if pre_balances and post_balances:
+        account_keys = tx.get("transaction", {}).get("message", {}).get("accountKeys", [])
+        received = 0
+        outflows = []
+        for i, acc in enumerate(account_keys):
+            key = acc["pubkey"] if isinstance(acc, dict) else acc
+            diff = post_balances[i] - pre_balances[i]
+            if key == to_wallet:
+                received = diff
+            elif diff < 0:
+                outflows.append((diff, key))
+        if received > 0 and outflows:
+            outflows.sort()
+            transfers.append(Transfer(SOL, [key for _, key in outflows], received, SOL_DECIMALS))
+
+    # Token-Salden einmal nach accountIndex zusammenführen: index -> [mint, owner, pre, post, decimals]
+    accounts = {}
+    for slot, field in ((2, "preTokenBalances"), (3, "postTokenBalances")):
+        for b in meta.get(field) or ():
+            mint = b.get("mint")
+            if mint not in mints:
+                continue
+            amount = b.get("uiTokenAmount") or {}
+            acc = accounts.get(b["accountIndex"])
+            if acc is None:
+                acc = accounts[b["accountIndex"]] = [mint, b.get("owner"), 0, 0, amount.get("decimals", 0)]
+            acc[slot] = int(amount.get("amount") or 0)
+    if accounts:
+        by_mint = {}  # mint -> [received, outflows, decimals]
+        for mint, owner, pre, post, decimals in accounts.values():
+            diff = post - pre
+            entry = by_mint.setdefault(mint, [0, [], decimals])
+            if owner == to_wallet:
+                entry[0] += diff
+            elif diff < 0 and owner:
+                entry[1].append((diff, owner))
+        for mint, (received, outflows, decimals) in by_mint.items():
+            if received > 0 and outflows:
+                outflows.sort()
+                transfers.append(Transfer(mints[mint], [owner for _, owner in outflows], received, decimals))
+    return transfers
+
+
+def deposit_ref(tx_sig, asset):
+    """Ledger-Referenz einer Einzahlung; SOL behält die nackte Signatur (Bestand)."""
+    return tx_sig if asset == SOL else f"{tx_sig}:{asset}"
+
+
+def credit_transfer(conn, tx_sig, user_id, from_wallet, asset, amount, decimals, quote):
+    """
+    Schreibt eine Einzahlung gut (muss innerhalb einer Transaktion laufen).
+    Dank UNIQUE auf deposits (tx_sig, asset) wird nichts doppelt gutgeschrieben.
+    quote ist der USD-Kurs des Assets (price_oracle.Quote), er wird am Deposit gespeichert.
+    """
+    amount_usd = amount / 10 ** decimals * quote.price
+    price_at = datetime.utcfromtimestamp(quote.fetched_at).strftime("%Y-%m-%d %H:%M:%S")
+    cur = conn.execute("""
+        INSERT OR IGNORE INTO deposits
+            (user_id, from_wallet, tx_sig, asset, amount, decimals, amount_usd, status, notified,
+             price_usd, price_at, created_at)
+        VALUES (?,?,?,?,?,?,?,?,0,?,?,?)
+    """, (user_id, from_wallet, tx_sig, asset, amount, decimals, amount_usd, "confirmed",
+          quote.price, price_at, now()))
+    if cur.rowcount != 1:
+        return False
+    ledger.post(conn, user_id, ledger.to_micro(amount_usd), "deposit", deposit_ref(tx_sig, asset))
+    conn.execute("UPDATE chain_transfers SET user_id = ? WHERE tx_sig = ? AND asset = ?", (user_id, tx_sig, asset))
+    return True
+
+
+def claim_deposits(db, user_id, sender_wallet, prices):
+    """
+    Lokaler Deposit-Check für einen User:
+    - noch nicht zugeordnete Transfers von seiner Sender-Wallet gutschreiben
+      (z.B. wenn die Wallet erst nach der Zahlung hinterlegt wurde)
+    - alle noch nicht gemeldeten Deposits zurückgeben und als gemeldet markieren
+    """
+    # Kurse nur holen, wenn es überhaupt etwas gutzuschreiben gibt (nie im Writer-Thread)
+    quotes = {}
+    if sender_wallet:
+        for r in db.query("SELECT DISTINCT asset FROM chain_transfers WHERE from_wallet = ? AND user_id IS NULL",
+                          (sender_wallet,)):
+            quotes[r["asset"]] = prices.get(r["asset"])
+
+    def claim(conn):
+        if quotes:
+            rows = conn.execute("""
+                SELECT tx_sig, asset, amount, decimals FROM chain_transfers
+                WHERE from_wallet = ? AND user_id IS NULL
+            """, (sender_wallet,)).fetchall()
+            for r in rows:
+                # Asset erst seit der Kursabfrage dazugekommen → beim nächsten Check
+                if r["asset"] in quotes:
+                    credit_transfer(conn, r["tx_sig"], user_id, sender_wallet, r["asset"], r["amount"],
+                                    r["decimals"], quotes[r["asset"]])
+        deposits = conn.execute("""
+            SELECT id, tx_sig, asset, amount, decimals, amount_usd FROM deposits
+            WHERE user_id = ? AND notified = 0
+            ORDER BY id
+        """, (user_id,)).fetchall()
+        conn.executemany("UPDATE deposits SET notified = 1 WHERE id = ?", [(d["id"],) for d in deposits])
+        return deposits
+
+    return db.transaction(claim)
+
+
+class DepositIndexer:
+    """Folgt den Signaturen einer Adresse und ordnet Einzahlungen Usern zu."""
+
+    def __init__(self, db, address, rpc, cache=None, poll_interval=POLL_INTERVAL, on_credit=None, prices=None,
+                 wake_min_interval=WAKE_MIN_INTERVAL, tokens=None):
+        self.db = db
+        self.address = address
+        self.rpc = rpc  # solana_rpc.SolanaRpcClient
+        self.cache = cache  # tx_cache.TransactionCache (optional)
+        # price_oracle.PriceOracle, ohne Oracle gilt der feste Fallback-Kurs
+        self.prices = prices or price_oracle.PriceOracle([price_oracle.StaticPriceSource({"SOL": SOL_USD})])
+        self.poll_interval = poll_interval
+        self.wake_min_interval = wake_min_interval
+        self.tokens = TOKEN_MINTS if tokens is None else tokens  # Mint -> Asset
+        self.on_credit = on_credit  # on_credit(user_id, tx_sig, asset, amount) nach jeder Gutschrift, amount in ganzen Einheiten
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._flight = throttle.SingleFlight()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_sync = 0.0
+        self.wakes = 0        # wake()-Aufrufe
+        self.wake_syncs = 0   # davon tatsächlich ausgelöste Scans
+        self.syncs = 0
+        self.sync_calls = 0   # sync()-Aufrufe (eigener, angehängter oder Nach-Scan)
+        self.rpc_calls = 0    # HTTP-Requests an den RPC (Signatur-Seiten + getTransaction-Batches)
+
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name="deposit-indexer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self):
+        with self._lock:
+            self.wakes += 1
+        self._wake.set()
+
+    def stats(self):
+        with self._lock:
+            coalesced = max(0, self.wakes - self.wake_syncs)
+            stats = {"syncs": self.syncs, "wakes": self.wakes, "wakes_coalesced": coalesced,
+                     "rpc_calls": self.rpc_calls}
+            calls = self.sync_calls
+        # ohne eigenen Scan ausgekommen = Aufrufe minus tatsächlich gelaufene Scans (inkl. Nach-Scans)
+        stats["syncs_joined"] = max(0, calls - self._flight.stats()["calls"])
+        # Untergrenze gegenüber "ein Scan pro Weckruf": jeder eingesparte Scan hätte
+        # mindestens einen getSignaturesForAddress-Request gekostet
+        stats["rpc_saved"] = coalesced + stats["syncs_joined"]
+        return stats
+
+    def _run(self):
+        woken = False
+        while not self._stop.is_set():
+            if woken:
+                # Weckrufe kurz nach einem Scan sammeln statt sofort erneut zu scannen
+                delay = self._last_sync + self.wake_min_interval - time.monotonic()
+                if delay > 0 and self._stop.wait(delay):
+                    break
+                self._wake.clear()
+                with self._lock:
+                    self.wake_syncs += 1
+            try:
+                self.sync()
+            except Exception:
+                log.exception("Deposit-Scan fehlgeschlagen")
+            woken = self._wake.wait(timeout=self.poll_interval)
+            self._wake.clear()
+
+    # ---------- Cursor ----------
+
+    def _load_cursor(self):
+        row = self.db.query_one("SELECT until_sig, before_sig, head_sig FROM indexer_cursors WHERE address = ?",
+                                (self.address,))
+        if not row:
+            return None, None, None
+        return row["until_sig"], row["before_sig"], row["head_sig"]
+
+    def _save_cursor(self, until_sig, before_sig, head_sig):
+        self.db.write("""
+            INSERT INTO indexer_cursors (address, until_sig, before_sig, head_sig, updated_at)
+            VALUES (?,?,?,?,?)
+            ON CONFLICT(address) DO UPDATE SET
+                until_sig = excluded.until_sig,
+                before_sig = excluded.before_sig,
+                head_sig = excluded.head_sig,
+                updated_at = excluded.updated_at
+        """, (self.address, until_sig, before_sig, head_sig, now()))
+
+    # ---------- Scan ----------
+
+    def sync(self):
+        """
+        Verarbeitet alle Signaturen seit dem letzten Cursor.
+        Läuft seitenweise von neu nach alt (before), bis until erreicht ist.
+        Bricht der Lauf ab, geht es beim nächsten Mal an "before" weiter.
+        Läuft schon ein Scan, hat er evtl. vor diesem Aufruf begonnen und neue
+        Signaturen verpasst → danach einen weiteren Durchlauf (den sich alle
+        angehängten Aufrufer wieder teilen).
+        """
+        with self._lock:
+            self.sync_calls += 1
+        processed, shared = self._flight.do(self.address, self._sync)
+        if shared:
+            more, _ = self._flight.do(self.address, self._sync)
+            processed += more
+        return processed
+
+    def _sync(self):
+        self._last_sync = time.monotonic()
+        with self._lock:
+            self.syncs += 1
+        until_sig, before_sig, head_sig = self._load_cursor()
+        processed = 0
+        while not self._stop.is_set():
+            opts = {"limit": PAGE_SIZE, "until": until_sig, "before": before_sig}
+            self._count_rpc(1)
+            page = self.rpc.get_signatures_for_address(self.address, **opts)
+            if not page:
+                break
+            if head_sig is None:
+                head_sig = page[0]["signature"]
+            self.index_page([e["signature"] for e in page if e.get("err") is None])
+            before_sig = page[-1]["signature"]
+            processed += len(page)
+            self._save_cursor(until_sig, before_sig, head_sig)
+            if len(page) < PAGE_SIZE:
+                break
+            if until_sig is None and processed >= INITIAL_BACKFILL:
+                break
+        if head_sig:
+            self._save_cursor(head_sig, None, None)
+        return processed
+
+    def _count_rpc(self, n):
+        with self._lock:
+            self.rpc_calls += n
+
+    def index_page(self, sigs):
+        """Lädt alle noch unbekannten Transaktionen einer Seite per Batch."""
+        if not sigs:
+            return
+        marks = ",".join("?" * len(sigs))
+        known = {r["tx_sig"] for r in self.db.query(
+            f"SELECT tx_sig FROM chain_transfers WHERE tx_sig IN ({marks})", sigs
+        )}
+        todo = [s for s in sigs if s not in known]
+        txs = self.fetch_transactions(todo)
+        missing = [sig for sig, tx in txs.items() if tx is None]
+        if missing:
+            # Cursor nicht über fehlende Transaktionen hinweg bewegen
+            raise RuntimeError(f"{len(missing)} Transaktionen nicht geladen, z.B. {missing[0]}")
+        self.index_transactions(txs)
+
+    def fetch_transactions(self, sigs):
+        # getTransaction liefert standardmäßig nur finalisierte Tx → dürfen gecacht werden
+        if self.cache is None:
+            return self._load_transactions(sigs)
+        return self.cache.fetch(sigs, self._load_transactions)
+
+    def _load_transactions(self, sigs):
+        if sigs:
+            batch_size = getattr(self.rpc, "batch_size", len(sigs))
+            self._count_rpc(-(-len(sigs) // batch_size))
+        return self.rpc.get_transactions(sigs)
+
+    def index_transactions(self, txs):
+        """
+        Parst {sig: tx} einmalig und schreibt alle gefundenen Transfers samt
+        Gutschriften in EINER DB-Transaktion. Gibt die Anzahl Transfers zurück.
+        """
+        found = []  # (sig, tx, Transfer)
+        for sig, tx in txs.items():
+            for t in parse_transfers(tx, self.address, self.tokens) if tx else ():
+                minimum = MIN_DEPOSIT_LAMPORTS if t.asset == SOL else MIN_TOKEN_AMOUNT * 10 ** t.decimals
+                if t.amount >= minimum:
+                    found.append((sig, tx, t))
+        if not found:
+            return 0
+
+        # Zuordnung über den Index auf users.sender_wallet, eine Query für die ganze Seite
+        senders = list({s for _, _, t in found for s in t.senders})
+        marks = ",".join("?" * len(senders))
+        users = {r["sender_wallet"]: r["id"] for r in self.db.query(
+            f"SELECT id, sender_wallet FROM users WHERE sender_wallet IN ({marks}) ORDER BY id DESC", senders
+        )}
+        rows = []
+        for sig, tx, t in found:
+            from_wallet = next((s for s in t.senders if s in users), t.senders[0])
+            rows.append((sig, t, from_wallet, users.get(from_wallet), tx.get("slot"), tx.get("blockTime")))
+        # Kurse vor der Transaktion holen; ohne Kurs bricht die Seite ab und wird später wiederholt
+        quotes = {asset: self.prices.get(asset) for asset in {t.asset for _, t, _, user_id, _, _ in rows
+                                                               if user_id is not None}}
+
+        def store(conn):
+            conn.executemany("""
+                INSERT OR IGNORE INTO chain_transfers
+                    (tx_sig, asset, from_wallet, to_wallet, amount, decimals, slot, block_time, created_at)
+                VALUES (?,?,?,?,?,?,?,?,?)
+            """, [(sig, t.asset, from_wallet, self.address, t.amount, t.decimals, slot, block_time, now())
+                  for sig, t, from_wallet, _, slot, block_time in rows])
+            credited = []
+            for sig, t, from_wallet, user_id, _, _ in rows:
+                if user_id is not None and credit_transfer(conn, sig, user_id, from_wallet, t.asset, t.amount,
+                                                           t.decimals, quotes[t.asset]):
+                    credited.append((user_id, sig, t))
+            return credited
+
+        for user_id, sig, t in self.db.transaction(store):
+            if self.on_credit:
+                try:
+                    self.on_credit(user_id, sig, t.asset, t.amount / 10 ** t.decimals)
+                except Exception:
+                    log.exception("Benachrichtigung für %s fehlgeschlagen", sig)
+        return len(rows)
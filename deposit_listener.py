@@ -0,0 +1,107 @@
+import json
+import logging
+import threading
+
+from websockets.sync.client import connect as ws_connect
+
+# =======================
+# DEPOSIT LISTENER (WEBSOCKET)
+# =======================
+#
+# Push statt Pull: abonniert logsSubscribe + accountSubscribe für MAIN_WALLET.
+# - logsNotification liefert die Signatur → Tx wird sofort indexiert und
+#   dem User gutgeschrieben (Benachrichtigung über indexer.on_credit)
+# - accountNotification (Saldo geändert) stößt einen Signatur-Scan an
+# - nach jedem (Re-)Connect wird die Lücke per Signatur-Scan nachgeholt,
+#   der Indexer-Cursor sorgt dafür, dass nichts fehlt oder doppelt läuft.
+#   Der Scan läuft im Indexer-Thread (wake), nicht hier: sonst stauen sich
+#   während eines langen Scans die Notifications auf der offenen Verbindung,
+#   und ein RPC-Fehler im Scan würde als Verbindungsabbruch gezählt.
+#   Der Indexer-Job (indexer.start()) muss dafür laufen.
+
+log = logging.getLogger(__name__)
+
+RECONNECT_MIN = 1.0
+RECONNECT_MAX = 60.0
+COMMITMENT = "finalized"
+
+
+class DepositListener:
+
+    def __init__(self, ws_url, indexer, reconnect_min=RECONNECT_MIN, reconnect_max=RECONNECT_MAX):
+        self.ws_url = ws_url
+        self.indexer = indexer
+        self.address = indexer.address
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        self.connects = 0
+        self.notifications = 0
+        self._stop = threading.Event()
+        self._ws = None
+        self._thread = None
+
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name="deposit-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        ws = self._ws
+        if ws is not None:
+            ws.close()
+
+    # ---------- intern ----------
+
+    def _run(self):
+        delay = self.reconnect_min
+        while not self._stop.is_set():
+            try:
+                with ws_connect(self.ws_url, open_timeout=10, ping_interval=20) as ws:
+                    self._ws = ws
+                    self._subscribe(ws)
+                    self.connects += 1
+                    delay = self.reconnect_min
+                    # Lücke seit dem letzten Cursor nachholen (Erststart oder Reconnect)
+                    self.indexer.wake()
+                    for raw in ws:
+                        self._handle(json.loads(raw))
+            except Exception:
+                if self._stop.is_set():
+                    break
+                log.exception("Websocket-Verbindung zu %s verloren", self.ws_url)
+            finally:
+                self._ws = None
+            if self._stop.wait(delay):
+                break
+            delay = min(self.reconnect_max, delay * 2)
+
+    def _subscribe(self, ws):
+        ws.send(json.dumps({
+            "jsonrpc": "2.0", "id": 1, "method": "logsSubscribe",
+            "params": [{"mentions": [self.address]}, {"commitment": COMMITMENT}],
+        }))
+        ws.send(json.dumps({
+            "jsonrpc": "2.0", "id": 2, "method": "accountSubscribe",
+            "params": [self.address, {"commitment": COMMITMENT, "encoding": "jsonParsed"}],
+        }))
+
+    def _handle(self, msg):
+        method = msg.get("method")
+        if method == "logsNotification":
+            self.notifications += 1
+            value = msg["params"]["result"]["value"]
+            if value.get("err") is not None:
+                return
+            try:
+                self.indexer.index_page([value["signature"]])
+            except Exception:
+                # Tx noch nicht abrufbar o.ä. → der reguläre Scan holt sie nach
+                log.exception("Signatur %s nicht indexiert", value.get("signature"))
+                self.indexer.wake()
+        elif method == "accountNotification":
+            self.notifications += 1
+            self.indexer.wake()
+        elif "error" in msg:
+            raise RuntimeError(f"Subscription fehlgeschlagen: {msg['error']}")
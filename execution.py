@@ -0,0 +1,517 @@
+import abc
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+# =======================
+# ORDER EXECUTION
+# =======================
+#
+# Führt die Auto-Entries eines Signals an einer Börse aus:
+# - Börsen hängen hinter einem Adapter (place(orders) → Fills), damit
+#   Venue, Mock und Paper-Trading austauschbar sind
+# - Orders laufen parallel über einen festen Thread-Pool und eine
+#   gemeinsame Keep-Alive-Session, pro Request bis zu max_batch Orders
+# - pro Börsen-Account gilt ein Rate-Limit (Token-Bucket), 429 mit
+#   Retry-After wird abgewartet und wiederholt
+# - Omnibus-Venues (aggregate=True): alle Orders eines Accounts und Symbols
+#   werden gegeneinander verrechnet, nur der Netto-Rest geht als EINE Order
+#   raus; jeder Trade bekommt den Fill-Preis und seinen Anteil zugeteilt
+# Jeder Fill trägt Preis, ausgeführten Betrag und die Latenz seit Start der
+# Ausführung (inkl. Warteschlange und Rate-Limit).
+# Timeout oder Abbruch NACH dem Senden heißt nicht "abgelehnt": die Order
+# kann ausgeführt sein. Die Engine fragt per client_id nach (lookup); bleibt
+# es offen, wird der Trade "unknown" und der Reconciler klärt ihn später.
+
+log = logging.getLogger(__name__)
+
+WORKERS = 16
+TIMEOUT = 10
+MAX_RETRIES = 3
+MAX_RETRY_AFTER = 10
+ACCOUNT_RATE = 10.0   # Requests/s pro Account
+ACCOUNT_BURST = 10
+FULL = 0.9999         # Anteil, ab dem ein Trade als voll ausgeführt gilt
+RECONCILE_INTERVAL = 30
+UNKNOWN_GRACE = 120   # Sekunden, nach denen eine nicht auffindbare Order als nie angekommen gilt
+
+Order = namedtuple("Order", "trade_id account symbol side amount_usd leverage")
+# client_id/account: unter welcher Order der Trade an der Börse liegt (für den Reconciler)
+Fill = namedtuple("Fill", "trade_id status price filled_usd order_id latency_ms error client_id account",
+                  defaults=(None, None))
+
+BUY = "buy"
+SELL = "sell"
+
+
+def now():
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def side_for(direction):
+    """Signal-Richtung (LONG/SHORT/BUY/SELL) → buy/sell."""
+    return SELL if (direction or "").upper() in ("SHORT", "SELL") else BUY
+
+
+class ExchangeError(Exception):
+    pass
+
+
+class OutcomeUnknown(ExchangeError):
+    """Request evtl. angekommen (Timeout/Abbruch nach dem Senden) → nur per lookup klärbar."""
+
+
+class RateLimited(ExchangeError):
+
+    def __init__(self, retry_after):
+        super().__init__(f"rate limited, retry_after={retry_after}s")
+        self.retry_after = retry_after
+
+
+class ExchangeAdapter(abc.ABC):
+    """
+    Schnittstelle zu einer Börse.
+
+    place(orders) bekommt Orders EINES Accounts (höchstens max_batch) und
+    gibt pro Order ein dict {"status", "price", "filled_usd", "order_id", "error"}
+    in gleicher Reihenfolge zurück. RateLimited/ExchangeError bei Fehlern
+    des ganzen Requests, OutcomeUnknown, wenn offen ist, ob er ausgeführt wurde.
+    place ist abstrakt: ein Adapter ohne place lässt sich nicht instanziieren.
+
+    lookup(account, client_ids) sucht bereits platzierte Orders und gibt
+    {client_id: dict wie bei place} für die gefundenen zurück.
+    """
+
+    name = "base"
+    aggregate = False        # Omnibus: Netto-Order pro Account+Symbol zulässig
+    max_batch = 1            # Orders pro Request
+    account_rate = ACCOUNT_RATE
+    account_burst = ACCOUNT_BURST
+
+    @abc.abstractmethod
+    def place(self, orders):
+        raise NotImplementedError
+
+    def lookup(self, account, client_ids):
+        raise ExchangeError(f"{self.name}: lookup nicht unterstützt")
+
+    def mark_price(self, symbol):
+        """Referenzpreis für vollständig verrechnete Orders (None = unbekannt)."""
+        return None
+
+    def close(self):
+        pass
+
+
+class PaperExchange(ExchangeAdapter):
+    """Füllt jede Order sofort zum Preis aus price(symbol), ohne Netzwerk."""
+
+    name = "paper"
+    aggregate = True
+    max_batch = 1000
+
+    def __init__(self, price):
+        self.price = price
+        self._ids = iter(range(1, 1 << 62))
+        self._lock = threading.Lock()
+
+    def place(self, orders):
+        out = []
+        for o in orders:
+            with self._lock:
+                order_id = f"paper-{next(self._ids)}"
+            out.append({"status": "filled", "price": self.price(o.symbol), "filled_usd": o.amount_usd,
+                        "order_id": order_id, "error": None})
+        return out
+
+    def mark_price(self, symbol):
+        return self.price(symbol)
+
+
+class HttpExchange(ExchangeAdapter):
+    """
+    REST-Venue (z.B. bench/fake_exchange.py):
+    POST {url}/v1/orders {"account", "orders": [{"client_id", "symbol", "side", "quote_qty", "leverage"}]}
+    → {"fills": [{"client_id", "status", "price", "filled_quote", "order_id", "error"}]}
+    GET {url}/v1/orders?account=...&client_id=...&client_id=... → {"fills": [wie oben]}
+    GET {url}/v1/ticker?symbol=... → {"price"}
+    """
+
+    name = "http"
+
+    def __init__(self, url, api_key=None, aggregate=False, max_batch=20, account_rate=ACCOUNT_RATE,
+                 account_burst=ACCOUNT_BURST, timeout=TIMEOUT, pool_size=WORKERS):
+        self.url = url.rstrip("/")
+        self.aggregate = aggregate
+        self.max_batch = max(1, max_batch)
+        self.account_rate = account_rate
+        self.account_burst = account_burst
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if api_key:
+            self.session.headers["X-API-KEY"] = api_key
+
+    def place(self, orders):
+        body = {
+            "account": orders[0].account,
+            "orders": [{"client_id": str(o.trade_id), "symbol": o.symbol, "side": o.side,
+                        "quote_qty": o.amount_usd, "leverage": o.leverage} for o in orders],
+        }
+        try:
+            r = self.session.post(self.url + "/v1/orders", json=body, timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if _not_sent(e):
+                raise ExchangeError(str(e))
+            raise OutcomeUnknown(str(e))
+        if r.status_code == 429:
+            raise RateLimited(float(r.headers.get("Retry-After") or 1))
+        if r.status_code >= 400:
+            raise ExchangeError(f"HTTP {r.status_code}: {r.text[:200]}")
+        fills = {f["client_id"]: f for f in r.json().get("fills", [])}
+        out = []
+        for o in orders:
+            f = fills.get(str(o.trade_id))
+            if f is None:
+                out.append({"status": "rejected", "price": None, "filled_usd": 0.0, "order_id": None,
+                            "error": "keine Antwort für diese Order"})
+            else:
+                out.append(self._result(f))
+        return out
+
+    def lookup(self, account, client_ids):
+        try:
+            r = self.session.get(self.url + "/v1/orders", params={"account": account, "client_id": list(client_ids)},
+                                 timeout=self.timeout)
+            r.raise_for_status()
+            return {f["client_id"]: self._result(f) for f in r.json().get("fills", [])}
+        except Exception as e:
+            raise ExchangeError(f"lookup fehlgeschlagen: {e}")
+
+    @staticmethod
+    def _result(f):
+        return {"status": f.get("status", "rejected"), "price": f.get("price"),
+                "filled_usd": f.get("filled_quote") or 0.0, "order_id": f.get("order_id"), "error": f.get("error")}
+
+    def mark_price(self, symbol):
+        try:
+            r = self.session.get(self.url + "/v1/ticker", params={"symbol": symbol}, timeout=self.timeout)
+            r.raise_for_status()
+            return float(r.json()["price"])
+        except Exception:
+            log.warning("Kein Referenzpreis für %s", symbol, exc_info=True)
+            return None
+
+    def close(self):
+        self.session.close()
+
+
+def _not_sent(error):
+    """Verbindung kam gar nicht zustande → Request sicher nicht bei der Börse."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class AccountLimiter:
+    """Token-Bucket (GCRA) pro Account: wait(account) blockiert bis zum nächsten freien Slot."""
+
+    def __init__(self, rate, burst):
+        self.interval = 1.0 / rate
+        self.burst = max(1, burst)
+        self._tat = {}
+        self._lock = threading.Lock()
+        self.waited_s = 0.0
+
+    def wait(self, account):
+        now = time.monotonic()
+        with self._lock:
+            tat = self._tat.get(account, now)
+            start = max(now, tat - (self.burst - 1) * self.interval)
+            self._tat[account] = max(tat, start) + self.interval
+            delay = start - now
+            self.waited_s += delay
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, account, seconds):
+        """Nach einem 429: Account für seconds sperren."""
+        with self._lock:
+            self._tat[account] = max(self._tat.get(account, 0.0), time.monotonic() + seconds)
+
+
+class ExecutionEngine:
+
+    def __init__(self, adapter, workers=WORKERS, max_retries=MAX_RETRIES):
+        self.adapter = adapter
+        self.max_retries = max_retries
+        self.limiter = AccountLimiter(adapter.account_rate, adapter.account_burst)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="exec")
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.orders = 0
+        self.netted = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.unknown = 0      # Requests mit offenem Ausgang
+        self.looked_up = 0    # davon per lookup geklärte Orders
+
+    def execute(self, orders):
+        """Führt alle Orders aus (blockiert bis zum letzten Fill). Gibt {trade_id: Fill} zurück."""
+        start = time.monotonic()
+        jobs = []  # (account, [Order, ...], allocate) – allocate verteilt das Ergebnis auf Trades
+        by_account = {}
+        for o in orders:
+            by_account.setdefault(o.account, []).append(o)
+        for account, items in by_account.items():
+            if self.adapter.aggregate:
+                jobs += self._aggregate(account, items)
+            else:
+                for i in range(0, len(items), self.adapter.max_batch):
+                    jobs.append((account, items[i:i + self.adapter.max_batch], None))
+
+        fills = {}
+        futures = [self._pool.submit(self._run_job, account, batch, allocate, start)
+                   for account, batch, allocate in jobs]
+        for future in as_completed(futures):
+            for fill in future.result():
+                fills[fill.trade_id] = fill
+        with self._lock:
+            self.orders += len(orders)
+        return fills
+
+    def stats(self):
+        with self._lock:
+            return {"requests": self.requests, "orders": self.orders, "netted": self.netted,
+                    "rate_limited": self.rate_limited, "errors": self.errors,
+                    "unknown": self.unknown, "looked_up": self.looked_up,
+                    "limiter_wait_s": self.limiter.waited_s}
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        self.adapter.close()
+
+    # ---------- intern ----------
+
+    def _aggregate(self, account, items):
+        """Eine Netto-Order pro Symbol; die Trades werden anteilig zum selben Preis zugeteilt."""
+        jobs = []
+        by_symbol = {}
+        for o in items:
+            by_symbol.setdefault((o.symbol, o.leverage), []).append(o)
+        for (symbol, leverage), group in by_symbol.items():
+            buys = sum(o.amount_usd for o in group if o.side == BUY)
+            sells = sum(o.amount_usd for o in group if o.side == SELL)
+            net = round(buys - sells, 8)
+            with self._lock:
+                self.netted += len(group) - 1
+            if net == 0:
+                price = self.adapter.mark_price(symbol)
+                if price is None:
+                    # ohne Referenzpreis nicht intern verrechnen → einzeln ausführen
+                    for i in range(0, len(group), self.adapter.max_batch):
+                        jobs.append((account, group[i:i + self.adapter.max_batch], None))
+                    continue
+                jobs.append((account, [], self._allocator(group, buys, sells, price)))
+                continue
+            parent = Order(f"net-{group[0].trade_id}", account, symbol, BUY if net > 0 else SELL, abs(net), leverage)
+            jobs.append((account, [parent], self._allocator(group, buys, sells, client_id=str(parent.trade_id),
+                                                            account=account)))
+        return jobs
+
+    @staticmethod
+    def _allocator(group, buys, sells, price=None, client_id=None, account=None):
+        def allocate(results, latency_ms):
+            result = results[0] if results else {"status": "filled", "price": price, "filled_usd": 0.0,
+                                                 "order_id": None, "error": None}
+            if result["status"] == "unknown":
+                # Netto-Order evtl. ausgeführt → die ganze Gruppe bleibt offen
+                return [Fill(o.trade_id, "unknown", None, 0.0, None, latency_ms, result["error"], client_id, account)
+                        for o in group]
+            fill_price = result["price"] if result["price"] is not None else price
+            if fill_price is None:
+                # ohne Preis kein Fill zuteilen: ausgeführt, aber Preis fehlt → offen (Reconciler),
+                # sonst abgelehnt – auch die intern gekreuzte Seite
+                status = "unknown" if result["status"] in ("filled", "partial") else "rejected"
+                return [Fill(o.trade_id, status, None, 0.0, result["order_id"], latency_ms,
+                             result["error"] or "kein Fill-Preis", client_id, account) for o in group]
+            filled = result["filled_usd"] if result["status"] in ("filled", "partial") else 0.0
+            crossed = min(buys, sells)
+            # Minderheitsseite wird komplett intern gekreuzt, die Mehrheit bekommt Kreuzung + Börsen-Fill
+            ratio = {BUY: 1.0, SELL: 1.0}
+            if buys > sells:
+                ratio[BUY] = (crossed + filled) / buys
+            elif sells > buys:
+                ratio[SELL] = (crossed + filled) / sells
+            out = []
+            for o in group:
+                r = ratio[o.side]
+                status = "filled" if r >= FULL else "partial" if r > 0 else "rejected"
+                out.append(Fill(o.trade_id, status, fill_price if r > 0 else None, round(o.amount_usd * r, 2),
+                                result["order_id"], latency_ms, result["error"] if status != "filled" else None,
+                                client_id, account))
+            return out
+        return allocate
+
+    def _run_job(self, account, batch, allocate, start):
+        results = self._place(account, batch) if batch else []
+        latency_ms = (time.monotonic() - start) * 1000
+        if allocate:
+            return allocate(results, latency_ms)
+        return [Fill(o.trade_id, r["status"], r["price"], r["filled_usd"], r["order_id"], latency_ms, r["error"],
+                     str(o.trade_id), account)
+                for o, r in zip(batch, results)]
+
+    def _place(self, account, batch):
+        attempt = 0
+        while True:
+            self.limiter.wait(account)
+            with self._lock:
+                self.requests += 1
+            try:
+                return self.adapter.place(batch)
+            except RateLimited as e:
+                with self._lock:
+                    self.rate_limited += 1
+                if attempt >= self.max_retries or e.retry_after > MAX_RETRY_AFTER:
+                    return self._rejected(batch, str(e))
+                self.limiter.pause(account, e.retry_after)
+                attempt += 1
+            except OutcomeUnknown as e:
+                with self._lock:
+                    self.unknown += 1
+                log.warning("Ausgang der Orders für %s offen: %s", account, e)
+                return self._resolve(account, batch, str(e))
+            except Exception as e:
+                # Ausgang unklar bzw. Venue-Fehler → nicht blind wiederholen (keine Doppel-Orders)
+                with self._lock:
+                    self.errors += 1
+                log.warning("Orders für %s fehlgeschlagen: %s", account, e)
+                return self._rejected(batch, str(e))
+
+    def _resolve(self, account, batch, error):
+        """Nach offenem Ausgang per client_id nachfragen; nicht Gefundenes bleibt "unknown"."""
+        try:
+            found = self.adapter.lookup(account, [str(o.trade_id) for o in batch])
+        except Exception as e:
+            log.warning("Lookup für %s fehlgeschlagen: %s", account, e)
+            found = {}
+        with self._lock:
+            self.looked_up += len(found)
+        return [found.get(str(o.trade_id)) or
+                {"status": "unknown", "price": None, "filled_usd": 0.0, "order_id": None, "error": error}
+                for o in batch]
+
+    @staticmethod
+    def _rejected(batch, error):
+        return [{"status": "rejected", "price": None, "filled_usd": 0.0, "order_id": None, "error": error}
+                for _ in batch]
+
+
+class Reconciler:
+    """
+    Klärt Trades mit Status "unknown" per lookup an der Börse. Gefundene Orders
+    werden wie bei der Ausführung zugeteilt; wer nach grace Sekunden nicht
+    auffindbar ist, hat die Börse nie erreicht und gilt als abgelehnt.
+    """
+
+    def __init__(self, db, engine, interval=RECONCILE_INTERVAL, grace=UNKNOWN_GRACE, batch=100):
+        self.db = db
+        self.engine = engine
+        self.interval = interval
+        self.grace = grace
+        self.batch = batch
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name="exchange-reconcile", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self):
+        """Ein Durchlauf über bis zu batch offene Orders. Gibt die Anzahl geklärter Trades zurück."""
+        rows = self.db.query("""
+            SELECT t.id, t.account, t.client_id, t.amount_usd, t.latency_ms, t.executed_at,
+                   s.symbol, s.direction, s.leverage
+            FROM trades t JOIN signals s ON s.id = t.signal_id
+            WHERE t.status = 'unknown'
+              AND t.client_id IN (SELECT DISTINCT client_id FROM trades WHERE status = 'unknown' LIMIT ?)
+        """, (self.batch,))
+        groups = {}
+        for r in rows:
+            groups.setdefault((r["account"], r["client_id"]), []).append(r)
+        by_account = {}
+        for account, client_id in groups:
+            by_account.setdefault(account, []).append(client_id)
+
+        cutoff = (datetime.utcnow() - timedelta(seconds=self.grace)).strftime("%Y-%m-%d %H:%M:%S")
+        fills = {}
+        for account, client_ids in by_account.items():
+            try:
+                found = self.engine.adapter.lookup(account, client_ids)
+            except Exception as e:
+                log.warning("Reconcile für %s fehlgeschlagen: %s", account, e)
+                continue
+            for client_id in client_ids:
+                group = groups[(account, client_id)]
+                result = found.get(client_id)
+                if result is None:
+                    if max(r["executed_at"] for r in group) > cutoff:
+                        continue  # evtl. noch unterwegs
+                    result = {"status": "rejected", "price": None, "filled_usd": 0.0, "order_id": None,
+                              "error": "Order hat die Börse nie erreicht"}
+                for fill in self._allocate(account, client_id, group, result):
+                    fills[fill.trade_id] = fill
+        if fills:
+            record_fills(self.db, fills)
+            log.info("%d offene Trades geklärt", len(fills))
+        return len(fills)
+
+    def _allocate(self, account, client_id, group, result):
+        latency_ms = group[0]["latency_ms"]
+        if len(group) == 1 and client_id == str(group[0]["id"]):
+            r = group[0]
+            return [Fill(r["id"], result["status"], result["price"], result["filled_usd"], result["order_id"],
+                         latency_ms, result["error"], client_id, account)]
+        # Netto-Order: Trades wie bei der Ausführung anteilig zuteilen
+        # (Seite aus signals.direction – alle Orders eines Signals haben dieselbe, siehe run_signal)
+        orders = [Order(r["id"], account, r["symbol"], side_for(r["direction"]), r["amount_usd"], r["leverage"])
+                  for r in group]
+        buys = sum(o.amount_usd for o in orders if o.side == BUY)
+        sells = sum(o.amount_usd for o in orders if o.side == SELL)
+        allocate = ExecutionEngine._allocator(orders, buys, sells, client_id=client_id, account=account)
+        return allocate([result], latency_ms)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                log.exception("Reconcile offener Orders fehlgeschlagen")
+
+
+def record_fills(db, fills):
+    """Schreibt Status, Fill-Preis und Latenz an die Trades (ein Batch über den Writer)."""
+    executed_at = now()
+    db.write_many("""
+        UPDATE trades SET status = ?, fill_price = ?, filled_usd = ?, order_id = ?, latency_ms = ?,
+            error = ?, executed_at = ?, client_id = ?, account = ?
+        WHERE id = ?
+    """, [(f.status, f.price, f.filled_usd, f.order_id, f.latency_ms, f.error, executed_at, f.client_id, f.account,
+           f.trade_id)
+          for f in fills.values()])
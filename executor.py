@@ -0,0 +1,192 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+# =======================
+# UPDATE EXECUTOR
+# =======================
+#
+# ChatExecutor: Updates werden pro Chat strikt nacheinander, verschiedene
+# Chats parallel auf einem festen Thread-Pool verarbeitet. Ein Chat mit
+# vielen wartenden Updates kommt nach jedem Update wieder hinten an die
+# Reihe, damit er die anderen nicht aushungert.
+#
+# BoundedPool: separater, kleiner Pool für lange Jobs (Fan-out, Massen-
+# Inserts, Exporte; Deposit-Claims bekommen im Bot einen eigenen). Die
+# Warteschlange ist begrenzt; ist sie voll, wird der Job abgelehnt
+# (Overloaded) statt die Menü-Callbacks zu blockieren.
+
+log = logging.getLogger(__name__)
+
+HANDLER_WORKERS = 16
+MAX_PENDING_PER_CHAT = 20
+HEAVY_WORKERS = 4
+HEAVY_QUEUE = 32
+
+
+class Overloaded(Exception):
+    pass
+
+
+class ChatExecutor:
+
+    def __init__(self, workers=HANDLER_WORKERS, max_pending_per_chat=MAX_PENDING_PER_CHAT):
+        self.max_pending_per_chat = max_pending_per_chat
+        self._chats = {}  # chat_id -> deque[(fn, args)]; Eintrag existiert, solange der Chat dran ist
+        self._ready = queue.Queue()
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.shed = 0
+        self.busy = 0
+        self._threads = [threading.Thread(target=self._worker, name=f"chat-{i}", daemon=True)
+                         for i in range(workers)]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, chat_id, fn, *args):
+        """Reiht fn(*args) für chat_id ein. False = zu viele wartende Updates für diesen Chat."""
+        with self._lock:
+            pending = self._chats.get(chat_id)
+            schedule = pending is None
+            if schedule:
+                pending = self._chats[chat_id] = deque()
+            elif len(pending) >= self.max_pending_per_chat:
+                self.shed += 1
+                return False
+            pending.append((fn, args))
+        if schedule:
+            self._ready.put(chat_id)
+        return True
+
+    def stop(self):
+        for _ in self._threads:
+            self._ready.put(None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "chats": len(self._chats),
+                "pending": sum(len(q) for q in self._chats.values()),
+                "busy": self.busy,
+                "executed": self.executed,
+                "shed": self.shed,
+            }
+
+    def _worker(self):
+        while True:
+            chat_id = self._ready.get()
+            if chat_id is None:
+                return
+            with self._lock:
+                fn, args = self._chats[chat_id].popleft()
+                self.busy += 1
+            try:
+                fn(*args)
+            except Exception:
+                log.exception("Update für Chat %s fehlgeschlagen", chat_id)
+            with self._lock:
+                self.busy -= 1
+                self.executed += 1
+                more = bool(self._chats[chat_id])
+                if not more:
+                    del self._chats[chat_id]
+            if more:
+                self._ready.put(chat_id)
+
+
+class BoundedPool:
+
+    def __init__(self, workers=HEAVY_WORKERS, max_queue=HEAVY_QUEUE, name="heavy"):
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+        self.busy = 0
+        self.max_s = 0.0
+        self._threads = [threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+                         for i in range(workers)]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, fn, *args, **kwargs):
+        """Gibt ein Future zurück oder wirft Overloaded, wenn die Warteschlange voll ist."""
+        future = Future()
+        try:
+            self._queue.put_nowait((future, fn, args, kwargs))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise Overloaded(f"{self._queue.maxsize} Jobs warten bereits")
+        return future
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "busy": self.busy,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "max_s": self.max_s,
+            }
+
+    def _worker(self):
+        while True:
+            future, fn, args, kwargs = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            with self._lock:
+                self.busy += 1
+            start = time.monotonic()
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                log.exception("Hintergrund-Job %s fehlgeschlagen", getattr(fn, "__name__", fn))
+                future.set_exception(e)
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self.busy -= 1
+                self.completed += 1
+                self.max_s = max(self.max_s, elapsed)
+
+
+def chat_key(update):
+    """Chat-ID eines telebot.types.Update (Callbacks: Chat der Nachricht mit dem Button)."""
+    for field in ("message", "edited_message", "channel_post", "edited_channel_post"):
+        msg = getattr(update, field, None)
+        if msg is not None:
+            return msg.chat.id
+    call = update.callback_query
+    if call is not None:
+        return call.message.chat.id if call.message else call.from_user.id
+    for field in ("inline_query", "chosen_inline_result", "shipping_query", "pre_checkout_query",
+                  "my_chat_member", "chat_member", "chat_join_request"):
+        obj = getattr(update, field, None)
+        if obj is not None and getattr(obj, "from_user", None) is not None:
+            return obj.from_user.id
+    return 0
+
+
+def attach(bot, chats):
+    """
+    Leitet bot.process_new_updates über den ChatExecutor. Die Handler laufen
+    dann synchron im Executor-Thread des Chats (bot.threaded = False).
+    Gilt für Polling, Webhook und Worker-Modus gleichermaßen.
+    """
+    process = bot.process_new_updates
+    bot.threaded = False
+
+    def process_new_updates(updates):
+        if not updates:
+            return
+        # update_id sofort fortschreiben, sonst liefert getUpdates dieselben Updates erneut
+        bot.last_update_id = max(bot.last_update_id, max(u.update_id for u in updates))
+        for update in updates:
+            if not chats.submit(chat_key(update), process, [update]):
+                log.warning("Update %s verworfen: Chat %s hat zu viele offene Updates",
+                            update.update_id, chat_key(update))
+
+    bot.process_new_updates = process_new_updates
+    return bot
@@ -0,0 +1,248 @@
+import argparse
+import csv
+import gzip
+import io
+import json
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# =======================
+# EXPORTS
+# =======================
+#
+# Streamt Tabellen als CSV oder JSONL (optional gzip) für die Buchhaltung:
+# - Zeilen kommen seitenweise per Keyset-Query (id > letzte ID, LIMIT) über
+#   die Lese-Connection; jede Seite ist ein eigener kurzer Lesezugriff, es
+#   liegt nie das ganze Ergebnis im Speicher und während langsamer Uploads
+#   hält kein offener Read-Snapshot den WAL-Checkpoint auf
+# - Filter nach Zeitraum (created_at) und User (telegram_id)
+# - für Telegram wird in Teil-Dateien unter dem Upload-Limit geschnitten,
+#   jede Teil-Datei liegt nur als Temp-Datei auf der Platte
+#
+#     python exports.py deposits --since 2026-01-01 --until 2026-02-01 --gzip -o deposits.csv.gz
+#     python exports.py trades --user 123456 --format jsonl
+
+DB_PATH = "auto_entry_bot.db"
+
+# Tabelle -> Spalte mit users.id (None = kein User-Filter möglich)
+TABLES = {
+    "deposits": "user_id",
+    "withdrawals": "user_id",
+    "trades": "user_id",
+    "signals": None,
+    "users": "id",
+    "ledger_entries": "user_id",
+}
+FORMATS = ("csv", "jsonl")
+FETCH_SIZE = 1000
+CHUNK_BYTES = 45 * 1024 * 1024  # Bot-API erlaubt 50 MB pro Dokument
+
+
+class ExportError(ValueError):
+    pass
+
+
+def parse_day(value, end=False):
+    """'2026-01-31' → '2026-01-31 00:00:00' (bzw. Folgetag bei end=True, exklusiv)."""
+    try:
+        day = datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise ExportError(f"Ungültiges Datum: {value} (erwartet JJJJ-MM-TT)")
+    if end:
+        day += timedelta(days=1)
+    return day.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def select(table, since=None, until=None, telegram_id=None, after=None):
+    """
+    SQL + Parameter für den Export. since/until als created_at-Strings, until
+    exklusiv; after = nur Zeilen mit größerer id (Keyset-Paging).
+    """
+    if table not in TABLES:
+        raise ExportError(f"Unbekannte Tabelle: {table}")
+    where, params = [], []
+    if after is not None:
+        where.append("id > ?")
+        params.append(after)
+    if since:
+        where.append("created_at >= ?")
+        params.append(since)
+    if until:
+        where.append("created_at < ?")
+        params.append(until)
+    if telegram_id is not None:
+        user_column = TABLES[table]
+        if user_column is None:
+            raise ExportError(f"{table} hat keinen User-Bezug")
+        where.append(f"{user_column} IN (SELECT id FROM users WHERE telegram_id = ?)")
+        params.append(telegram_id)
+    sql = f"SELECT * FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return sql + " ORDER BY id", tuple(params)
+
+
+def table_columns(db, table):
+    return [r["name"] for r in db.query(f"PRAGMA table_info({table})")]
+
+
+def lines(db, table, fmt="csv", since=None, until=None, telegram_id=None, size=FETCH_SIZE):
+    """Generator über die kodierten Zeilen (bytes), bei CSV zuerst der Header."""
+    if fmt not in FORMATS:
+        raise ExportError(f"Unbekanntes Format: {fmt}")
+    columns = table_columns(db, table)
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf, lineterminator="\n")
+
+        def encode(values):
+            buf.seek(0)
+            buf.truncate()
+            writer.writerow(values)
+            return buf.getvalue().encode()
+
+        yield encode(columns)
+    else:
+        def encode(values):
+            return (json.dumps(dict(zip(columns, values)), ensure_ascii=False) + "\n").encode()
+
+    after = 0
+    while True:
+        sql, params = select(table, since, until, telegram_id, after)
+        rows = db.query(sql + " LIMIT ?", params + (size,))
+        for row in rows:
+            yield encode(tuple(row))
+        if len(rows) < size:
+            return
+        after = rows[-1]["id"]
+
+
+def write(db, table, out, fmt="csv", compress=False, **filters):
+    """Schreibt den ganzen Export in den Binär-Stream out. Gibt die Zeilenzahl zurück."""
+    stream = gzip.GzipFile(fileobj=out, mode="wb") if compress else out
+    count = -1 if fmt == "csv" else 0  # Header zählt nicht
+    try:
+        for line in lines(db, table, fmt, **filters):
+            stream.write(line)
+            count += 1
+    finally:
+        if compress:
+            stream.close()  # schreibt den gzip-Trailer, out bleibt offen
+    return count
+
+
+def filename(table, fmt, compress, part=None, **filters):
+    name = table
+    if filters.get("telegram_id") is not None:
+        name += f"_user{filters['telegram_id']}"
+    if filters.get("since") or filters.get("until"):
+        name += f"_{(filters.get('since') or 'start')[:10]}_{(filters.get('until') or 'now')[:10]}"
+    if part is not None:
+        name += f"_part{part:03d}"
+    return f"{name}.{fmt}" + (".gz" if compress else "")
+
+
+def parts(db, table, fmt="csv", compress=False, chunk_bytes=CHUNK_BYTES, **filters):
+    """
+    Generator über Teil-Dateien (name, file, rows) mit je höchstens ~chunk_bytes.
+    file steht auf Position 0 und wird geschlossen, sobald der nächste Teil
+    angefordert wird. Bei CSV beginnt jeder Teil mit dem Header.
+    """
+    source = lines(db, table, fmt, **filters)
+    header = next(source) if fmt == "csv" else b""
+    index = 0
+    pending = next(source, None)
+    while pending is not None or index == 0:
+        index += 1
+        tmp = tempfile.TemporaryFile()
+        stream = gzip.GzipFile(fileobj=tmp, mode="wb") if compress else tmp
+        stream.write(header)
+        rows = 0
+        while pending is not None:
+            stream.write(pending)
+            rows += 1
+            pending = next(source, None)
+            # gzip puffert intern, die Dateigröße hinkt leicht hinterher → Reserve im Limit
+            if tmp.tell() >= chunk_bytes:
+                break
+        if compress:
+            stream.close()
+        tmp.seek(0)
+        last = pending is None
+        name = filename(table, fmt, compress, None if index == 1 and last else index, **filters)
+        try:
+            yield name, tmp, rows
+        finally:
+            tmp.close()
+
+
+def parse_request(text):
+    """
+    Admin-Eingabe "TABELLE [VON] [BIS] [user=TELEGRAM_ID] [jsonl] [gz]" →
+    (table, fmt, compress, filters).
+    """
+    words = text.split()
+    if not words:
+        raise ExportError("Keine Tabelle angegeben")
+    table, fmt, compress, days = words[0].lower(), "csv", False, []
+    filters = {}
+    for word in words[1:]:
+        lower = word.lower()
+        if lower in FORMATS:
+            fmt = lower
+        elif lower in ("gz", "gzip"):
+            compress = True
+        elif lower.startswith("user="):
+            try:
+                filters["telegram_id"] = int(lower[5:])
+            except ValueError:
+                raise ExportError(f"Ungültige Telegram-ID: {word[5:]}")
+        else:
+            days.append(word)
+    if len(days) > 2:
+        raise ExportError("Höchstens zwei Daten (VON BIS)")
+    if days:
+        filters["since"] = parse_day(days[0])
+    if len(days) == 2:
+        filters["until"] = parse_day(days[1], end=True)
+    select(table, **filters)  # Tabelle und User-Filter früh prüfen
+    return table, fmt, compress, filters
+
+
+def main():
+    import db as dbmod
+
+    parser = argparse.ArgumentParser(description="Export aus auto_entry_bot.db")
+    parser.add_argument("table", choices=sorted(TABLES))
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--since", help="ab Tag JJJJ-MM-TT")
+    parser.add_argument("--until", help="bis einschließlich Tag JJJJ-MM-TT")
+    parser.add_argument("--user", type=int, help="nur dieser User (telegram_id)")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("-o", "--out", default="-", help="Zieldatei (Default: stdout)")
+    args = parser.parse_args()
+
+    filters = {"telegram_id": args.user}
+    try:
+        if args.since:
+            filters["since"] = parse_day(args.since)
+        if args.until:
+            filters["until"] = parse_day(args.until, end=True)
+        select(args.table, **filters)
+    except ExportError as e:
+        parser.error(str(e))
+
+    database = dbmod.Database(args.db)
+    out = sys.stdout.buffer if args.out == "-" else open(args.out, "wb")
+    try:
+        count = write(database, args.table, out, args.format, args.gzip, **filters)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    print(f"{count} Zeilen aus {args.table} exportiert", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+# =======================
+# LEASES (LEADER ELECTION)
+# =======================
+#
+# Hintergrund-Jobs (Indexer, Listener, Outbox, Snapshots) dürfen nur in
+# EINEM Prozess laufen, auch wenn mehrere Bot-Prozesse dieselbe DB nutzen.
+# Wer die Lease in der Tabelle leases hält (und regelmäßig verlängert),
+# ist Leader. Fällt er aus, übernimmt ein anderer nach Ablauf der TTL.
+
+log = logging.getLogger(__name__)
+
+TTL = 30
+
+
+def owner_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def acquire(db, name, owner, ttl=TTL):
+    """Holt oder verlängert die Lease. True = owner hält sie jetzt."""
+    now = time.time()
+    res = db.write("""
+        INSERT INTO leases (name, owner, expires_at) VALUES (:name, :owner, :expires)
+        ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+        WHERE leases.owner = excluded.owner OR leases.expires_at < :now
+    """, {"name": name, "owner": owner, "expires": now + ttl, "now": now})
+    return res.rowcount == 1
+
+
+def release(db, name, owner):
+    db.write("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+
+class LeaderElector:
+    """
+    Bewirbt sich periodisch um die Lease name.
+    on_elected() wird beim Gewinnen aufgerufen, on_lost() wenn eine
+    Verlängerung scheitert (z.B. weil der Prozess zu lange hing).
+    """
+
+    def __init__(self, db, name, on_elected, on_lost, ttl=TTL):
+        self.db = db
+        self.name = name
+        self.owner = owner_id()
+        self.on_elected = on_elected
+        self.on_lost = on_lost
+        self.ttl = ttl
+        self.leader = False
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name=f"lease-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self.leader:
+            release(self.db, self.name, self.owner)
+            self.leader = False
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                held = acquire(self.db, self.name, self.owner, self.ttl)
+            except Exception:
+                log.exception("Lease %s konnte nicht erneuert werden", self.name)
+                held = False
+            if held and not self.leader:
+                self.leader = True
+                log.info("Lease %s übernommen (%s)", self.name, self.owner)
+                self.on_elected()
+            elif self.leader and not held:
+                self.leader = False
+                self.lost.set()
+                log.error("Lease %s verloren (%s)", self.name, self.owner)
+                self.on_lost()
+                return
+            self._stop.wait(self.ttl / 3)
@@ -0,0 +1,199 @@
+import logging
+import threading
+from datetime import datetime
+
+# =======================
+# LEDGER
+# =======================
+#
+# Jede Balance-Änderung ist eine Buchung in ledger_entries (append-only,
+# Beträge in Micro-USD als INTEGER). users.balance_micro ist der
+# materialisierte Saldo und wird in derselben Transaktion per SQL
+# fortgeschrieben → O(1)-Reads, keine verlorenen Updates.
+# users.balance_usd wird als REAL-Spiegel für bestehende Reads mitgeführt.
+#
+# Snapshots halten den Saldo pro User zu einer Buchungs-ID fest. Historie
+# und Abgleich brauchen damit nur die Buchungen seit dem letzten Snapshot:
+# snapshot() liest höchstens SNAPSHOT_BATCH Buchungen per Range über den
+# Primärschlüssel, reconcile() prüft nur die dabei berührten User, in
+# Batches auf einer Lese-Connection (der Writer wartet nicht darauf).
+#
+# Alle Funktionen mit conn laufen innerhalb einer Transaktion
+# (db.transaction), z.B. db.transaction(lambda c: post(c, uid, -5_000_000, "withdrawal")).
+
+log = logging.getLogger(__name__)
+
+MICRO = 1_000_000
+SNAPSHOT_INTERVAL = 3600
+SNAPSHOT_BATCH = 50_000   # Buchungen pro Snapshot-Transaktion im Writer
+RECONCILE_BATCH = 1000    # User pro Abgleich-Query
+
+
+class InsufficientFunds(Exception):
+    pass
+
+
+def now():
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def to_micro(amount_usd):
+    return int(round(amount_usd * MICRO))
+
+
+def to_usd(micro):
+    return micro / MICRO
+
+
+def post(conn, user_id, amount_micro, kind, ref=None, allow_negative=False):
+    """
+    Bucht amount_micro (positiv = Gutschrift) und gibt den neuen Saldo in Micro-USD zurück.
+    Belastungen schlagen mit InsufficientFunds fehl, wenn der Saldo nicht reicht.
+    """
+    row = conn.execute("""
+        UPDATE users
+        SET balance_micro = balance_micro + :amount,
+            balance_usd = (balance_micro + :amount) / 1000000.0
+        WHERE id = :uid AND (:allow OR :amount >= 0 OR balance_micro + :amount >= 0)
+        RETURNING balance_micro
+    """, {"amount": amount_micro, "uid": user_id, "allow": int(allow_negative)}).fetchone()
+    if row is None:
+        if conn.execute("SELECT 1 FROM users WHERE id = ?", (user_id,)).fetchone() is None:
+            raise KeyError(f"User {user_id} existiert nicht")
+        raise InsufficientFunds(f"User {user_id}: Saldo reicht nicht für {to_usd(-amount_micro):.2f} USD")
+    # UNIQUE(kind, ref) → dieselbe Referenz wird nie doppelt gebucht (IntegrityError)
+    conn.execute("""
+        INSERT INTO ledger_entries (user_id, amount_micro, kind, ref, created_at)
+        VALUES (?,?,?,?,?)
+    """, (user_id, amount_micro, kind, ref, now()))
+    return row[0]
+
+
+def set_balance(conn, user_id, target_micro, kind="adjustment", ref=None):
+    """Setzt den Saldo auf target_micro, gebucht wird nur die Differenz."""
+    row = conn.execute("SELECT balance_micro FROM users WHERE id = ?", (user_id,)).fetchone()
+    if row is None:
+        raise KeyError(f"User {user_id} existiert nicht")
+    delta = target_micro - row[0]
+    if delta == 0:
+        return target_micro
+    return post(conn, user_id, delta, kind, ref, allow_negative=True)
+
+
+def snapshot(conn, max_entries=SNAPSHOT_BATCH):
+    """
+    Schreibt Snapshots für alle User mit neuen Buchungen seit dem letzten Lauf,
+    aber aus höchstens max_entries Buchungen. Gibt die Anzahl Snapshots zurück;
+    ist noch mehr offen, einfach erneut aufrufen (0 = fertig).
+    """
+    since = conn.execute("SELECT COALESCE(MAX(entry_id), 0) FROM ledger_snapshots").fetchone()[0]
+    # Range über den Primärschlüssel: since < id <= ID der max_entries-ten neuen Buchung
+    until = conn.execute("""
+        SELECT COALESCE(
+            (SELECT id FROM ledger_entries WHERE id > :since ORDER BY id LIMIT 1 OFFSET :n),
+            (SELECT MAX(id) FROM ledger_entries))
+    """, {"since": since, "n": max_entries - 1}).fetchone()[0]
+    if until is None or until <= since:
+        return 0
+    # NOT INDEXED: rowid-Range statt Scan über idx_ledger_user
+    cur = conn.execute("""
+        INSERT INTO ledger_snapshots (user_id, entry_id, balance_micro, created_at)
+        WITH touched AS (
+            SELECT user_id, MAX(id) AS entry_id, SUM(amount_micro) AS amount
+            FROM ledger_entries NOT INDEXED
+            WHERE id > ? AND id <= ?
+            GROUP BY user_id
+        )
+        SELECT t.user_id, t.entry_id,
+               COALESCE((SELECT s.balance_micro FROM ledger_snapshots s
+                         WHERE s.user_id = t.user_id
+                         ORDER BY s.entry_id DESC LIMIT 1), 0) + t.amount,
+               ?
+        FROM touched t
+    """, (since, until, now()))
+    return cur.rowcount
+
+
+def balance_at(conn, user_id, entry_id):
+    """Saldo eines Users direkt nach Buchung entry_id (letzter Snapshot + Rest)."""
+    snap = conn.execute("""
+        SELECT entry_id, balance_micro FROM ledger_snapshots
+        WHERE user_id = ? AND entry_id <= ?
+        ORDER BY entry_id DESC LIMIT 1
+    """, (user_id, entry_id)).fetchone()
+    base_id, base = (snap[0], snap[1]) if snap else (0, 0)
+    rest = conn.execute("""
+        SELECT COALESCE(SUM(amount_micro), 0) FROM ledger_entries
+        WHERE user_id = ? AND id > ? AND id <= ?
+    """, (user_id, base_id, entry_id)).fetchone()[0]
+    return base + rest
+
+
+def reconcile(db, after_snapshot_id, batch=RECONCILE_BATCH, limit=100):
+    """
+    Vergleicht users.balance_micro mit Snapshot + Buchungen danach, aber nur
+    für User mit Snapshots nach after_snapshot_id (= seit dem letzten Lauf
+    berührt). Läuft in Batches über db.query (Lese-Connection, nicht im Writer).
+    Gibt Abweichungen als Liste (user_id, materialisiert, aus Ledger) zurück.
+    """
+    mismatches = []
+    last_id = after_snapshot_id
+    while len(mismatches) < limit:
+        rows = db.query("""
+            SELECT s.id, u.id AS user_id, u.balance_micro,
+                   s.balance_micro + COALESCE((SELECT SUM(e.amount_micro) FROM ledger_entries e
+                                               WHERE e.user_id = s.user_id AND e.id > s.entry_id), 0) AS expected
+            FROM ledger_snapshots s
+            JOIN users u ON u.id = s.user_id
+            WHERE s.id > ?
+              -- nur der jeweils neueste Snapshot des Users zählt
+              AND NOT EXISTS (SELECT 1 FROM ledger_snapshots n WHERE n.user_id = s.user_id AND n.entry_id > s.entry_id)
+            ORDER BY s.id
+            LIMIT ?
+        """, (last_id, batch))
+        if not rows:
+            break
+        mismatches += [(r["user_id"], r["balance_micro"], r["expected"]) for r in rows
+                       if r["balance_micro"] != r["expected"]]
+        last_id = rows[-1]["id"]
+    return mismatches[:limit]
+
+
+class Snapshotter:
+    """Schreibt periodisch Snapshots und prüft dabei den Abgleich."""
+
+    def __init__(self, db, interval=SNAPSHOT_INTERVAL):
+        self.db = db
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name="ledger-snapshots", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self):
+        first = self.db.query_one("SELECT COALESCE(MAX(id), 0) AS id FROM ledger_snapshots")["id"]
+        written = 0
+        while True:
+            # jede Runde eine kurze, begrenzte Writer-Transaktion
+            n = self.db.transaction(snapshot)
+            written += n
+            if not n:
+                break
+        mismatches = reconcile(self.db, first)
+        for user_id, materialized, expected in mismatches:
+            log.error("Ledger-Abweichung bei User %s: Saldo %s, Ledger %s", user_id, materialized, expected)
+        return written, mismatches
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                log.exception("Ledger-Snapshot fehlgeschlagen")
@@ -0,0 +1,307 @@
+import bisect
+import collections
+import functools
+import logging
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# =======================
+# METRICS
+# =======================
+#
+# Kleine, threadsichere Prometheus-Registry ohne Abhängigkeiten.
+# - Counter / Histogram werden im Hot-Path direkt hochgezählt (ein Lock, bisect)
+# - Collector-Funktionen lesen beim Scrape vorhandene stats() aus (DB, RPC,
+#   Caches, Queues) → kein Zusatzaufwand pro Query
+# - /metrics liefert das Text-Format, /profile?seconds=N einen Sampling-
+#   Profiler-Lauf als "collapsed stacks" (für flamegraph.pl / speedscope)
+
+log = logging.getLogger(__name__)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROFILE_INTERVAL = 0.005
+PROFILE_MAX_SECONDS = 60
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values = collections.defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] += amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., +Inf, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(names, labels + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class _Timer:
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []  # fn() -> [(name, type, help, {labels}, value), ...]
+        self._lock = threading.Lock()
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def collector(self, fn):
+        """Registriert fn, das beim Scrape Samples liefert (auch als Dekorator)."""
+        with self._lock:
+            self._collectors.append(fn)
+        return fn
+
+    def expose(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        for metric in metrics:
+            lines.extend(metric.expose())
+        families = {}  # name -> [HELP, TYPE, samples...], Samples einer Metrik müssen zusammenstehen
+        for fn in collectors:
+            try:
+                samples = fn()
+            except Exception:
+                log.exception("Metrik-Collector %s fehlgeschlagen", getattr(fn, "__name__", fn))
+                continue
+            for name, kind, help, labels, value in samples:
+                family = families.get(name)
+                if family is None:
+                    family = families[name] = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                family.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {value}")
+        for family in families.values():
+            lines.extend(family)
+        return "\n".join(lines) + "\n"
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+
+class HandlerTimer:
+    """
+    Dekorator für Bot-Handler: Latenz und Fehler pro Handler und Zweig.
+    Der Handler meldet seinen Zweig per branch(...) (Callback-Daten, State);
+    Ziffern werden zusammengefasst (risk_10 → risk_N), neue Zweige über
+    max_branches hinaus landen unter "other".
+    """
+
+    def __init__(self, registry, max_branches=100):
+        self.seconds = registry.histogram("bot_handler_seconds", "Laufzeit der Update-Handler",
+                                          ("handler", "branch"))
+        self.errors = registry.counter("bot_handler_errors_total", "Exceptions in Update-Handlern",
+                                       ("handler", "branch"))
+        self.max_branches = max_branches
+        self._branches = set()
+        self._local = threading.local()
+
+    def branch(self, name):
+        name = re.sub(r"\d+", "N", str(name))[:40]
+        if name not in self._branches:
+            if len(self._branches) >= self.max_branches:
+                name = "other"
+            self._branches.add(name)
+        self._local.branch = name
+
+    def __call__(self, fn):
+        handler = fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            self._local.branch = "-"
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                self.errors.inc(handler, self._local.branch)
+                raise
+            finally:
+                self.seconds.observe(time.perf_counter() - start, handler, self._local.branch)
+
+        return wrapper
+
+
+def gauges(prefix, stats, help, **labels):
+    """Numerische Werte eines stats()-Dicts als Collector-Samples ({prefix}_{key})."""
+    return [(f"{prefix}_{key}", "gauge", help, labels, value) for key, value in stats.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)]
+
+
+# =======================
+# SAMPLING PROFILER
+# =======================
+
+def profile(seconds, interval=PROFILE_INTERVAL, ignore=()):
+    """
+    Tastet alle Threads alle interval Sekunden ab und gibt collapsed stacks
+    ("thread;modul:func;... count") zurück. Kostet nur während des Laufs.
+    """
+    me = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    stacks = collections.Counter()
+    end = time.monotonic() + min(seconds, PROFILE_MAX_SECONDS)
+    while time.monotonic() < end:
+        for ident, frame in sys._current_frames().items():
+            if ident == me or names.get(ident, "").startswith(ignore):
+                continue
+            parts = []
+            while frame is not None:
+                code = frame.f_code
+                parts.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}")
+                frame = frame.f_back
+            parts.append(names.get(ident, str(ident)))
+            stacks[";".join(reversed(parts))] += 1
+        time.sleep(interval)
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+
+# =======================
+# HTTP-ENDPOINT
+# =======================
+
+def serve(registry, host="127.0.0.1", port=9108, profiler=False):
+    """Startet /metrics (und optional /profile) im Hintergrund. Gibt den Server zurück."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/metrics":
+                return self._send(200, registry.expose(), "text/plain; version=0.0.4")
+            if url.path == "/profile" and profiler:
+                seconds = float(parse_qs(url.query).get("seconds", ["10"])[0])
+                return self._send(200, profile(seconds, ignore=("metrics-http",)), "text/plain")
+            self._send(404, "not found\n", "text/plain")
+
+        def _send(self, code, text, ctype):
+            data = text.encode()
+            self.send_response(code)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+
+    def run():
+        threading.current_thread().name = "metrics-http"
+        server.serve_forever()
+
+    threading.Thread(target=run, name="metrics-http", daemon=True).start()
+    return server
+
+
+# =======================
+# TELEGRAM-API
+# =======================
+
+def instrument_telegram(registry, request):
+    """
+    Umhüllt request(method, url, **kwargs) (den eigentlichen HTTP-Call des
+    Telegram-Transports) und misst Latenz pro Bot-API-Methode sowie das
+    Ergebnis nach HTTP-Status bzw. Exception.
+    """
+    latency = registry.histogram("telegram_api_seconds", "Latenz der Bot-API-Calls", ("method",))
+    results = registry.counter("telegram_api_requests_total", "Bot-API-Calls nach Ergebnis", ("method", "status"))
+
+    def sender(method, url, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        start = time.perf_counter()
+        try:
+            resp = request(method, url, **kwargs)
+        except Exception as e:
+            results.inc(api_method, type(e).__name__)
+            raise
+        finally:
+            latency.observe(time.perf_counter() - start, api_method)
+        results.inc(api_method, str(resp.status_code))
+        return resp
+
+    return sender
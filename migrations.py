@@ -0,0 +1,587 @@
+import argparse
+import sqlite3
+import time
+from datetime import datetime
+
+# =======================
+# SCHEMA MIGRATIONS
+# =======================
+#
+# Nummerierte Migrationen, der Stand steht in schema_version.
+# Jede Migration läuft in einer eigenen Transaktion; ein Schritt ist
+# entweder ein SQL-String oder eine Funktion step(conn).
+#
+# Bestehende auto_entry_bot.db upgraden:
+#     python migrations.py --db auto_entry_bot.db
+#     python migrations.py --status
+
+DB_PATH = "auto_entry_bot.db"
+
+
+def now():
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def columns(conn, table):
+    return [r[1] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+
+def add_column(table, column, decl):
+    """Schritt: Spalte nur anlegen, wenn sie noch fehlt (alte DBs ohne schema_version)."""
+    def step(conn):
+        if column not in columns(conn, table):
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+    return step
+
+
+def _dedupe_deposit_sigs(conn):
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_deposits_tx_sig'").fetchone():
+        return
+    # Doppelt gutgeschriebene tx_sigs aus der alten Logik markieren, erste bleibt gültig
+    conn.execute("""
+        UPDATE deposits SET status = 'duplicate'
+        WHERE tx_sig IS NOT NULL
+          AND id NOT IN (SELECT MIN(id) FROM deposits WHERE tx_sig IS NOT NULL GROUP BY tx_sig)
+    """)
+
+
+def _open_ledger(conn):
+    # bestehende REAL-Salden als Eröffnungsbuchung übernehmen
+    conn.execute("UPDATE users SET balance_micro = CAST(ROUND(COALESCE(balance_usd, 0) * 1000000) AS INTEGER)")
+    conn.execute("""
+        INSERT INTO ledger_entries (user_id, amount_micro, kind, ref, created_at)
+        SELECT id, balance_micro, 'opening', NULL, ? FROM users WHERE balance_micro != 0
+    """, (now(),))
+
+
+STATS_COUNTERS = ["users", "balance_micro", "auto_entry_users", "withdrawals_pending",
+                  "withdrawals_pending_usd", "deposits", "deposits_usd"]
+
+
+def _backfill_stats(conn):
+    # einmaliger Full-Scan, danach halten die Trigger die Zähler aktuell
+    conn.executemany("INSERT OR IGNORE INTO stats_totals (name, value) VALUES (?, 0)",
+                     [(name,) for name in STATS_COUNTERS])
+    totals = conn.execute("""
+        SELECT COUNT(*), COALESCE(SUM(balance_micro), 0), COALESCE(SUM(auto_entry IS 1), 0) FROM users
+    """).fetchone()
+    pending = conn.execute("""
+        SELECT COUNT(*), COALESCE(SUM(amount_usd), 0) FROM withdrawals WHERE status = 'pending'
+    """).fetchone()
+    deposits = conn.execute("""
+        SELECT COUNT(*), COALESCE(SUM(amount_usd), 0) FROM deposits WHERE status IS NOT 'duplicate'
+    """).fetchone()
+    conn.executemany("UPDATE stats_totals SET value = ? WHERE name = ?", [
+        (totals[0], "users"), (totals[1], "balance_micro"), (totals[2], "auto_entry_users"),
+        (pending[0], "withdrawals_pending"), (pending[1], "withdrawals_pending_usd"),
+        (deposits[0], "deposits"), (deposits[1], "deposits_usd"),
+    ])
+    conn.execute("""
+        INSERT INTO stats_daily (day, name, value)
+        SELECT substr(created_at, 1, 10), 'users', COUNT(*) FROM users
+        WHERE created_at IS NOT NULL GROUP BY 1
+    """)
+    conn.execute("""
+        INSERT INTO stats_daily (day, name, value)
+        SELECT substr(created_at, 1, 10), 'deposits', COUNT(*) FROM deposits
+        WHERE created_at IS NOT NULL AND status IS NOT 'duplicate' GROUP BY 1
+    """)
+    conn.execute("""
+        INSERT INTO stats_daily (day, name, value)
+        SELECT substr(created_at, 1, 10), 'deposits_usd', COALESCE(SUM(amount_usd), 0) FROM deposits
+        WHERE created_at IS NOT NULL AND status IS NOT 'duplicate' GROUP BY 1
+    """)
+
+
+def _rebuild_chain_transfers(conn):
+    # Primärschlüssel (tx_sig) → (tx_sig, asset): geht in SQLite nur über eine neue Tabelle
+    if "asset" in columns(conn, "chain_transfers"):
+        return
+    conn.execute("""
+        CREATE TABLE chain_transfers_new (
+            tx_sig TEXT NOT NULL,
+            asset TEXT NOT NULL DEFAULT 'SOL',
+            from_wallet TEXT,
+            to_wallet TEXT,
+            amount INTEGER,
+            decimals INTEGER,
+            slot INTEGER,
+            block_time INTEGER,
+            user_id INTEGER,
+            created_at TEXT,
+            PRIMARY KEY (tx_sig, asset),
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+    conn.execute("""
+        INSERT INTO chain_transfers_new
+            (tx_sig, asset, from_wallet, to_wallet, amount, decimals, slot, block_time, user_id, created_at)
+        SELECT tx_sig, 'SOL', from_wallet, to_wallet, lamports, 9, slot, block_time, user_id, created_at
+        FROM chain_transfers
+    """)
+    conn.execute("DROP TABLE chain_transfers")
+    conn.execute("ALTER TABLE chain_transfers_new RENAME TO chain_transfers")
+
+
+def _bump_daily(name, day, amount):
+    """SQL für Trigger: Tageszähler name um amount erhöhen."""
+    return f"""
+            INSERT INTO stats_daily (day, name, value) VALUES (COALESCE(substr({day}, 1, 10), date('now')), '{name}', {amount})
+            ON CONFLICT(day, name) DO UPDATE SET value = value + excluded.value;"""
+
+
+MIGRATIONS = [
+    (1, "Basis-Tabellen", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id INTEGER UNIQUE,
+            username TEXT,
+            sender_wallet TEXT,
+            balance_usd REAL DEFAULT 0,
+            auto_entry INTEGER DEFAULT 0,
+            risk_percent INTEGER DEFAULT 10,
+            created_at TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS deposits (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            from_wallet TEXT,
+            tx_sig TEXT,
+            amount_usd REAL,
+            status TEXT,
+            created_at TEXT,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS withdrawals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            amount_usd REAL,
+            target_wallet TEXT,
+            status TEXT,
+            created_at TEXT,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS signals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            symbol TEXT,
+            direction TEXT,
+            leverage TEXT,
+            raw_text TEXT,
+            created_at TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS trades (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            signal_id INTEGER,
+            amount_usd REAL,
+            risk_percent INTEGER,
+            created_at TEXT,
+            FOREIGN KEY(user_id) REFERENCES users(id),
+            FOREIGN KEY(signal_id) REFERENCES signals(id)
+        )
+        """,
+    ]),
+    (2, "Signal-Stats und Broadcast-Outbox", [
+        """
+        CREATE TABLE IF NOT EXISTS signal_stats (
+            signal_id INTEGER PRIMARY KEY,
+            users INTEGER,
+            entries INTEGER,
+            sent INTEGER,
+            failed INTEGER,
+            load_s REAL,
+            trades_s REAL,
+            send_s REAL,
+            last_user_s REAL,
+            created_at TEXT,
+            FOREIGN KEY(signal_id) REFERENCES signals(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_chat_id INTEGER,
+            payload TEXT,
+            status TEXT,
+            total INTEGER DEFAULT 0,
+            sent INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            progress_message_id INTEGER,
+            created_at TEXT,
+            finished_at TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            broadcast_id INTEGER,
+            recipient INTEGER,
+            payload TEXT,
+            status TEXT,
+            attempts INTEGER DEFAULT 0,
+            last_error TEXT,
+            created_at TEXT,
+            updated_at TEXT,
+            UNIQUE(broadcast_id, recipient),
+            FOREIGN KEY(broadcast_id) REFERENCES broadcasts(id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox(status, id)",
+    ]),
+    (3, "Deposit-Indexer", [
+        """
+        CREATE TABLE IF NOT EXISTS indexer_cursors (
+            address TEXT PRIMARY KEY,
+            until_sig TEXT,
+            before_sig TEXT,
+            head_sig TEXT,
+            updated_at TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS chain_transfers (
+            tx_sig TEXT PRIMARY KEY,
+            from_wallet TEXT,
+            to_wallet TEXT,
+            lamports INTEGER,
+            slot INTEGER,
+            block_time INTEGER,
+            user_id INTEGER,
+            created_at TEXT,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+        """,
+        # alte Deposits gelten als bereits gemeldet
+        add_column("deposits", "notified", "INTEGER DEFAULT 1"),
+        _dedupe_deposit_sigs,
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_deposits_tx_sig ON deposits(tx_sig) WHERE status != 'duplicate'",
+        "CREATE INDEX IF NOT EXISTS idx_users_sender_wallet ON users(sender_wallet)",
+        """
+        CREATE INDEX IF NOT EXISTS idx_chain_transfers_unassigned
+        ON chain_transfers(from_wallet) WHERE user_id IS NULL
+        """,
+    ]),
+    (4, "Indizes für die Hot-Paths", [
+        # Trades pro User / pro Signal, ein Trade pro User und Signal
+        "CREATE INDEX IF NOT EXISTS idx_trades_user ON trades(user_id, id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_trades_signal_user ON trades(signal_id, user_id)",
+        # nur offene Auszahlungen sind interessant → partieller Index bleibt klein
+        "CREATE INDEX IF NOT EXISTS idx_withdrawals_pending ON withdrawals(id) WHERE status = 'pending'",
+        "CREATE INDEX IF NOT EXISTS idx_withdrawals_user ON withdrawals(user_id, id)",
+        "CREATE INDEX IF NOT EXISTS idx_users_auto_entry ON users(id) WHERE auto_entry = 1",
+        # der Unique-Index auf tx_sig ist partiell und hilft normalen Lookups nicht
+        "CREATE INDEX IF NOT EXISTS idx_deposits_sig ON deposits(tx_sig)",
+        "CREATE INDEX IF NOT EXISTS idx_deposits_user ON deposits(user_id, id)",
+        "CREATE INDEX IF NOT EXISTS idx_deposits_unnotified ON deposits(user_id) WHERE notified = 0",
+        # Outbox: nur die noch offenen Zeilen indexieren
+        "DROP INDEX IF EXISTS idx_outbox_status",
+        "CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox(id) WHERE status = 'pending'",
+    ]),
+    (5, "Ledger mit Micro-USD-Salden", [
+        add_column("users", "balance_micro", "INTEGER NOT NULL DEFAULT 0"),
+        """
+        CREATE TABLE IF NOT EXISTS ledger_entries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            amount_micro INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            ref TEXT,
+            created_at TEXT,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_ledger_user ON ledger_entries(user_id, id)",
+        # eine Buchung pro Referenz (z.B. Deposit-Signatur, Withdrawal-ID)
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_ledger_ref ON ledger_entries(kind, ref) WHERE ref IS NOT NULL",
+        """
+        CREATE TABLE IF NOT EXISTS ledger_snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            entry_id INTEGER NOT NULL,
+            balance_micro INTEGER NOT NULL,
+            created_at TEXT,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_ledger_snapshots_user ON ledger_snapshots(user_id, entry_id)",
+        "CREATE INDEX IF NOT EXISTS idx_ledger_snapshots_entry ON ledger_snapshots(entry_id)",
+        # Append-only: Buchungen dürfen weder geändert noch gelöscht werden
+        """
+        CREATE TRIGGER IF NOT EXISTS ledger_entries_no_update
+        BEFORE UPDATE ON ledger_entries
+        BEGIN SELECT RAISE(ABORT, 'ledger_entries ist append-only'); END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS ledger_entries_no_delete
+        BEFORE DELETE ON ledger_entries
+        BEGIN SELECT RAISE(ABORT, 'ledger_entries ist append-only'); END
+        """,
+        _open_ledger,
+    ]),
+    (6, "Kurs pro Deposit", [
+        add_column("deposits", "price_usd", "REAL"),
+        add_column("deposits", "price_at", "TEXT"),
+    ]),
+    (7, "Conversation-States", [
+        """
+        CREATE TABLE IF NOT EXISTS conversation_states (
+            telegram_id INTEGER PRIMARY KEY,
+            state TEXT NOT NULL,
+            data TEXT,
+            expires_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_conversation_states_expires ON conversation_states(expires_at)",
+    ]),
+    (8, "Leases für Hintergrund-Jobs", [
+        """
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        """,
+    ]),
+    (9, "Admin-Übersicht: Such-Indizes und Summen-Tabellen", [
+        # Blättern nach Balance und Präfix-Suche nach Username (Keyset, ohne OFFSET)
+        "CREATE INDEX IF NOT EXISTS idx_users_balance ON users(balance_micro)",
+        "CREATE INDEX IF NOT EXISTS idx_users_username ON users(username COLLATE NOCASE)",
+        """
+        CREATE TABLE IF NOT EXISTS stats_totals (
+            name TEXT PRIMARY KEY,
+            value REAL NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS stats_daily (
+            day TEXT NOT NULL,
+            name TEXT NOT NULL,
+            value REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, name)
+        ) WITHOUT ROWID
+        """,
+        # Summen werden per Trigger in derselben Transaktion mitgeführt
+        """
+        CREATE TRIGGER IF NOT EXISTS users_stats_insert AFTER INSERT ON users BEGIN
+            UPDATE stats_totals SET value = value + CASE name
+                WHEN 'users' THEN 1
+                WHEN 'balance_micro' THEN NEW.balance_micro
+                ELSE NEW.auto_entry IS 1 END
+            WHERE name IN ('users', 'balance_micro', 'auto_entry_users');""" + _bump_daily("users", "NEW.created_at", 1) + """
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS users_stats_update AFTER UPDATE OF balance_micro, auto_entry ON users
+        WHEN NEW.balance_micro IS NOT OLD.balance_micro OR NEW.auto_entry IS NOT OLD.auto_entry BEGIN
+            UPDATE stats_totals SET value = value + CASE name
+                WHEN 'balance_micro' THEN NEW.balance_micro - OLD.balance_micro
+                ELSE (NEW.auto_entry IS 1) - (OLD.auto_entry IS 1) END
+            WHERE name IN ('balance_micro', 'auto_entry_users');
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS users_stats_delete AFTER DELETE ON users BEGIN
+            UPDATE stats_totals SET value = value - CASE name
+                WHEN 'users' THEN 1
+                WHEN 'balance_micro' THEN OLD.balance_micro
+                ELSE OLD.auto_entry IS 1 END
+            WHERE name IN ('users', 'balance_micro', 'auto_entry_users');
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS withdrawals_stats_insert AFTER INSERT ON withdrawals
+        WHEN NEW.status = 'pending' BEGIN
+            UPDATE stats_totals SET value = value + CASE name WHEN 'withdrawals_pending' THEN 1 ELSE COALESCE(NEW.amount_usd, 0) END
+            WHERE name IN ('withdrawals_pending', 'withdrawals_pending_usd');
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS withdrawals_stats_update AFTER UPDATE OF status, amount_usd ON withdrawals
+        WHEN OLD.status = 'pending' OR NEW.status = 'pending' BEGIN
+            UPDATE stats_totals SET value = value + CASE name
+                WHEN 'withdrawals_pending' THEN (NEW.status IS 'pending') - (OLD.status IS 'pending')
+                ELSE (CASE WHEN NEW.status IS 'pending' THEN COALESCE(NEW.amount_usd, 0) ELSE 0 END)
+                   - (CASE WHEN OLD.status IS 'pending' THEN COALESCE(OLD.amount_usd, 0) ELSE 0 END) END
+            WHERE name IN ('withdrawals_pending', 'withdrawals_pending_usd');
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS withdrawals_stats_delete AFTER DELETE ON withdrawals
+        WHEN OLD.status = 'pending' BEGIN
+            UPDATE stats_totals SET value = value - CASE name WHEN 'withdrawals_pending' THEN 1 ELSE COALESCE(OLD.amount_usd, 0) END
+            WHERE name IN ('withdrawals_pending', 'withdrawals_pending_usd');
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS deposits_stats_insert AFTER INSERT ON deposits
+        WHEN NEW.status IS NOT 'duplicate' BEGIN
+            UPDATE stats_totals SET value = value + CASE name WHEN 'deposits' THEN 1 ELSE COALESCE(NEW.amount_usd, 0) END
+            WHERE name IN ('deposits', 'deposits_usd');""" + _bump_daily("deposits", "NEW.created_at", 1)
+          + _bump_daily("deposits_usd", "NEW.created_at", "COALESCE(NEW.amount_usd, 0)") + """
+        END
+        """,
+        _backfill_stats,
+    ]),
+    (10, "Auszahlungen on-chain in Batches", [
+        # eine Zeile pro Solana-Transaktion mit mehreren Überweisungen;
+        # raw_tx wird vor dem Senden gespeichert → nach einem Crash wird exakt
+        # dieselbe (signierte) Transaktion erneut gesendet statt einer neuen
+        """
+        CREATE TABLE IF NOT EXISTS payout_batches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tx_sig TEXT NOT NULL UNIQUE,
+            raw_tx TEXT NOT NULL,
+            last_valid_height INTEGER NOT NULL,
+            transfers INTEGER NOT NULL,
+            lamports INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            error TEXT,
+            created_at TEXT,
+            sent_at TEXT,
+            finished_at TEXT
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_payout_batches_open ON payout_batches(id) "
+        "WHERE status IN ('processing', 'sent')",
+        add_column("withdrawals", "batch_id", "INTEGER REFERENCES payout_batches(id)"),
+        add_column("withdrawals", "lamports", "INTEGER"),
+        add_column("withdrawals", "price_usd", "REAL"),
+        add_column("withdrawals", "tx_sig", "TEXT"),
+        add_column("withdrawals", "attempts", "INTEGER NOT NULL DEFAULT 0"),
+        add_column("withdrawals", "error", "TEXT"),
+        add_column("withdrawals", "paid_at", "TEXT"),
+        "CREATE INDEX IF NOT EXISTS idx_withdrawals_pending ON withdrawals(id) WHERE status = 'pending'",
+        "CREATE INDEX IF NOT EXISTS idx_withdrawals_batch ON withdrawals(batch_id) WHERE batch_id IS NOT NULL",
+    ]),
+    (11, "Order-Ausführung pro Trade", [
+        # status: NULL (nur erfasst, keine Börse), filled, partial, rejected
+        add_column("trades", "status", "TEXT"),
+        add_column("trades", "fill_price", "REAL"),
+        add_column("trades", "filled_usd", "REAL"),
+        add_column("trades", "order_id", "TEXT"),
+        add_column("trades", "latency_ms", "REAL"),
+        add_column("trades", "error", "TEXT"),
+        add_column("trades", "executed_at", "TEXT"),
+        add_column("signal_stats", "filled", "INTEGER"),
+        add_column("signal_stats", "rejected", "INTEGER"),
+        add_column("signal_stats", "fill_s", "REAL"),
+    ]),
+    (12, "Einzahlungen in mehreren Assets (SOL + SPL-Token)", [
+        _rebuild_chain_transfers,
+        """
+        CREATE INDEX IF NOT EXISTS idx_chain_transfers_unassigned
+        ON chain_transfers(from_wallet) WHERE user_id IS NULL
+        """,
+        # amount in der kleinsten Einheit (Lamports bzw. Token-Basiseinheiten)
+        add_column("deposits", "asset", "TEXT NOT NULL DEFAULT 'SOL'"),
+        add_column("deposits", "amount", "INTEGER"),
+        add_column("deposits", "decimals", "INTEGER"),
+        """
+        UPDATE deposits SET
+            amount = (SELECT t.amount FROM chain_transfers t WHERE t.tx_sig = deposits.tx_sig AND t.asset = 'SOL'),
+            decimals = 9
+        WHERE tx_sig IS NOT NULL AND amount IS NULL
+        """,
+        # eine Signatur kann mehrere Assets enthalten → eindeutig pro (tx_sig, asset)
+        "DROP INDEX IF EXISTS idx_deposits_tx_sig",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_deposits_tx_sig_asset ON deposits(tx_sig, asset) "
+        "WHERE status != 'duplicate'",
+    ]),
+    (13, "Orders mit offenem Ausgang (unknown)", [
+        # status zusätzlich: unknown = Timeout/Abbruch nach dem Senden, execution.Reconciler
+        # klärt per client_id (bei Netto-Orders die gemeinsame Order der Gruppe)
+        add_column("trades", "client_id", "TEXT"),
+        add_column("trades", "account", "TEXT"),
+        "CREATE INDEX IF NOT EXISTS idx_trades_unknown ON trades(client_id) WHERE status = 'unknown'",
+        add_column("signal_stats", "unknown", "INTEGER"),
+    ]),
+    (14, "Fehlgeschlagene Ausführungs-Chunks pro Signal", [
+        add_column("signal_stats", "failed_chunks", "INTEGER"),
+    ]),
+]
+
+LATEST = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT,
+            applied_at TEXT
+        )
+    """)
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def migrate(conn, target=None, verbose=False):
+    """
+    Bringt die DB auf target (Default: neueste Version).
+    conn muss im Autocommit-Modus sein (isolation_level=None).
+    Gibt die Liste der angewendeten Versionen zurück.
+    """
+    target = LATEST if target is None else target
+    applied = []
+    for version, name, steps in MIGRATIONS:
+        if version > target:
+            break
+        # BEGIN IMMEDIATE + erneutes Prüfen: mehrere Prozesse dürfen gleichzeitig starten
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if current_version(conn) >= version:
+                conn.execute("ROLLBACK")
+                continue
+            start = time.monotonic()
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute("INSERT INTO schema_version (version, name, applied_at) VALUES (?,?,?)",
+                         (version, name, now()))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        applied.append(version)
+        if verbose:
+            print(f"  {version:>3}  {name}  ({time.monotonic() - start:.2f}s)")
+    if applied:
+        conn.execute("PRAGMA optimize")
+    return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Schema-Migrationen für auto_entry_bot.db")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--to", type=int, default=None, help="Zielversion (Default: neueste)")
+    parser.add_argument("--status", action="store_true", help="nur aktuellen Stand anzeigen")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    try:
+        version = current_version(conn)
+        print(f"{args.db}: Version {version} (neueste: {LATEST})")
+        if args.status:
+            for v, name, _ in MIGRATIONS:
+                print(f"  {v:>3}  {'✓' if v <= version else ' '}  {name}")
+            return
+        applied = migrate(conn, args.to, verbose=True)
+        print(f"{len(applied)} Migration(en) angewendet, jetzt Version {current_version(conn)}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+# =======================
+# OUTBOX / BROADCAST DISPATCHER
+# =======================
+#
+# Persistente Warteschlange (Tabelle outbox) + Hintergrund-Dispatcher.
+# Status pro Zeile: pending -> sending -> sent | failed
+# Zeilen, die bei einem Crash noch auf "sending" standen, werden beim Start
+# auf "unknown" gesetzt und NICHT erneut verschickt (lieber einmal zu wenig
+# als doppelt). Dasselbe gilt, wenn eine Runde des Dispatchers mit einem
+# Fehler abbricht: der Thread läuft mit Backoff weiter, die geclaimten Zeilen
+# werden wie nach einem Crash behandelt.
+# Bei 429 wird eine Zeile höchstens MAX_RATE_LIMITED Mal sofort wiederholt,
+# danach geht sie zurück auf "pending" (ohne den Versuch zu zählen).
+
+log = logging.getLogger(__name__)
+
+MAX_RATE = 25.0          # Nachrichten/Sekunde, Telegram erlaubt ca. 30/s global
+MIN_RATE = 2.0
+WORKERS = 4
+CLAIM_BATCH = 100
+MAX_ATTEMPTS = 3
+MAX_RATE_LIMITED = 3     # 429-Wiederholungen pro Zeile und Runde
+ERROR_BACKOFF = 1.0      # Sekunden nach einer fehlgeschlagenen Runde, verdoppelt bis MAX_ERROR_BACKOFF
+MAX_ERROR_BACKOFF = 60.0
+PROGRESS_INTERVAL = 3.0  # Sekunden zwischen Fortschritts-Updates an den Admin
+
+
+def now():
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def retry_after(exc):
+    """Liefert retry_after (Sekunden) bei einem 429 von Telegram, sonst None."""
+    if getattr(exc, "error_code", None) != 429:
+        return None
+    params = (getattr(exc, "result_json", None) or {}).get("parameters") or {}
+    return params.get("retry_after", 1)
+
+
+def is_permanent(exc):
+    # 400 (chat not found) / 403 (Bot blockiert) → erneut versuchen bringt nichts
+    return getattr(exc, "error_code", None) in (400, 403)
+
+
+def enqueue_broadcast(db, admin_chat_id, text, parse_mode="Markdown"):
+    """Legt einen Broadcast an alle User an. Gibt (broadcast_id, total) zurück."""
+    payload = json.dumps({"text": text, "parse_mode": parse_mode})
+
+    def enqueue(conn):
+        cur = conn.execute("""
+            INSERT INTO broadcasts (admin_chat_id, payload, status, total, sent, failed, created_at)
+            VALUES (?,?,?,0,0,0,?)
+        """, (admin_chat_id, payload, "queued", now()))
+        broadcast_id = cur.lastrowid
+        # Payload liegt einmal in broadcasts, nicht 100k-fach in outbox
+        cur = conn.execute("""
+            INSERT OR IGNORE INTO outbox (broadcast_id, recipient, status, attempts, created_at)
+            SELECT ?, telegram_id, 'pending', 0, ? FROM users
+        """, (broadcast_id, now()))
+        total = cur.rowcount
+        conn.execute("UPDATE broadcasts SET total = ? WHERE id = ?", (total, broadcast_id))
+        return broadcast_id, total
+
+    return db.transaction(enqueue)
+
+
+def set_progress_message(db, broadcast_id, message_id):
+    db.write("UPDATE broadcasts SET progress_message_id = ? WHERE id = ?", (message_id, broadcast_id))
+
+
+class Pacer:
+    """Globales Sende-Tempo mit adaptiver Drosselung bei 429."""
+
+    def __init__(self, rate=MAX_RATE):
+        self.max_rate = rate
+        self.rate = rate
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            t = max(self._next, time.monotonic())
+            self._next = t + 1.0 / self.rate
+        delay = t - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def backoff(self, seconds):
+        with self._lock:
+            self.rate = max(MIN_RATE, self.rate * 0.7)
+            self._next = max(self._next, time.monotonic() + seconds)
+
+    def recover(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate * 1.02)
+
+
+class OutboxDispatcher:
+    """
+    Leert die outbox im Hintergrund.
+
+    db      -> db.Database
+    send    -> send(chat_id, text, parse_mode=...) für die eigentlichen Nachrichten
+    notify  -> notify(chat_id, text) für Admin-Reports
+    edit    -> edit(chat_id, message_id, text) für Live-Fortschritt
+    """
+
+    def __init__(self, db, send, notify, edit, rate=MAX_RATE, workers=WORKERS):
+        self.db = db
+        self.send = send
+        self.notify = notify
+        self.edit = edit
+        self.pacer = Pacer(rate)
+        self.workers = workers
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._payloads = {}
+        self._last_progress = {}
+        self.errors = 0             # abgebrochene Runden
+        self.report_failures = 0    # fehlgeschlagene Fortschritts-/Abschluss-Nachrichten an Admins
+
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name="outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self):
+        self._wake.set()
+
+    def stats(self):
+        return {"errors": self.errors, "report_failures": self.report_failures, "rate": self.pacer.rate}
+
+    # ---------- intern ----------
+
+    def _run(self):
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="outbox-send")
+        backoff = ERROR_BACKOFF
+        recovered = False
+        try:
+            while not self._stop.is_set():
+                try:
+                    if not recovered:
+                        self._recover()
+                        recovered = True
+                    idle = self._step(pool)
+                    backoff = ERROR_BACKOFF
+                except Exception:
+                    self.errors += 1
+                    log.exception("Outbox-Runde fehlgeschlagen, nächster Versuch in %.0fs", backoff)
+                    # geclaimte Zeilen beim nächsten Durchlauf wie nach einem Crash behandeln
+                    recovered = False
+                    if self._stop.wait(backoff):
+                        break
+                    backoff = min(MAX_ERROR_BACKOFF, backoff * 2)
+                    continue
+                if idle:
+                    self._wake.wait(timeout=5)
+                    self._wake.clear()
+        finally:
+            pool.shutdown(wait=True)
+
+    def _step(self, pool):
+        """Eine Runde: Zeilen claimen, senden, Status schreiben. True = nichts zu tun."""
+        rows = self._claim()
+        if not rows:
+            self._finish_broadcasts()
+            return True
+        futures = {}
+        try:
+            for r in rows:
+                futures[pool.submit(self._deliver, r, self._payload(r))] = r
+        finally:
+            # auch bei Fehlern erst alle laufenden Sends abwarten, bevor _recover() die Zeilen anfasst
+            # Status-Updates gehen gesammelt an den Writer, gewartet wird am Ende des Batches
+            records = [self._record(futures[fut], *fut.result()) for fut in as_completed(futures)]
+            for record in records:
+                record.result()
+        self._report_progress()
+        self._finish_broadcasts()
+        return False
+
+    def _recover(self):
+        # Alles was beim letzten Lauf "in der Luft" war, wird nicht nochmal gesendet
+        def recover(conn):
+            rows = conn.execute("""
+                SELECT broadcast_id, COUNT(*) AS n FROM outbox
+                WHERE status = 'sending' GROUP BY broadcast_id
+            """).fetchall()
+            conn.execute("UPDATE outbox SET status = 'unknown' WHERE status = 'sending'")
+            for r in rows:
+                if r["broadcast_id"] is not None:
+                    conn.execute("UPDATE broadcasts SET failed = failed + ? WHERE id = ?",
+                                 (r["n"], r["broadcast_id"]))
+
+        self.db.transaction(recover)
+
+    def _claim(self):
+        def claim(conn):
+            rows = conn.execute("""
+                SELECT id, broadcast_id, recipient, payload, attempts FROM outbox
+                WHERE status = 'pending'
+                ORDER BY id
+                LIMIT ?
+            """, (CLAIM_BATCH,)).fetchall()
+            if rows:
+                conn.executemany("UPDATE outbox SET status = 'sending', updated_at = ? WHERE id = ?",
+                                 [(now(), r["id"]) for r in rows])
+                for bid in {r["broadcast_id"] for r in rows if r["broadcast_id"] is not None}:
+                    conn.execute("UPDATE broadcasts SET status = 'running' WHERE id = ? AND status = 'queued'",
+                                 (bid,))
+            return rows
+
+        # wait=True: "sending" ist dauerhaft gespeichert, bevor irgendetwas rausgeht
+        return self.db.transaction(claim)
+
+    def _payload(self, row):
+        """Payload der Zeile bzw. ihres Broadcasts; None, wenn der Broadcast nicht mehr existiert."""
+        if row["payload"]:
+            return json.loads(row["payload"])
+        bid = row["broadcast_id"]
+        if bid not in self._payloads:
+            b = self.db.query_one("SELECT payload FROM broadcasts WHERE id = ?", (bid,))
+            if b is None:
+                return None
+            self._payloads[bid] = json.loads(b["payload"])
+        return self._payloads[bid]
+
+    def _deliver(self, row, payload):
+        if payload is None:
+            return "failed", "Broadcast gelöscht"
+        limited = 0
+        while True:
+            self.pacer.wait()
+            try:
+                self.send(row["recipient"], payload["text"], parse_mode=payload.get("parse_mode"))
+                self.pacer.recover()
+                return "sent", None
+            except Exception as e:
+                wait = retry_after(e)
+                if wait is not None:
+                    # 429 heißt: nicht zugestellt → gefahrlos erneut versuchen, aber den Worker
+                    # nicht unbegrenzt blockieren; danach kommt die Zeile in einer späteren Runde dran
+                    self.pacer.backoff(wait)
+                    limited += 1
+                    if limited > MAX_RATE_LIMITED:
+                        return "requeue", str(e)[:200]
+                    continue
+                if is_permanent(e) or row["attempts"] + 1 >= MAX_ATTEMPTS:
+                    return "failed", str(e)[:200]
+                return "pending", str(e)[:200]
+
+    def _record(self, row, status, error):
+        # requeue = wegen 429 nicht zugestellt → wieder pending, zählt nicht als Versuch
+        attempted = 0 if status == "requeue" else 1
+        status = "pending" if status == "requeue" else status
+
+        def record(conn):
+            conn.execute("""
+                UPDATE outbox SET status = ?, attempts = attempts + ?, last_error = ?, updated_at = ?
+                WHERE id = ?
+            """, (status, attempted, error, now(), row["id"]))
+            if row["broadcast_id"] is not None and status in ("sent", "failed"):
+                col = "sent" if status == "sent" else "failed"
+                conn.execute(f"UPDATE broadcasts SET {col} = {col} + 1 WHERE id = ?", (row["broadcast_id"],))
+
+        return self.db.transaction(record, wait=False)
+
+    def _report_progress(self, force=False):
+        rows = self.db.query("""
+            SELECT id, admin_chat_id, progress_message_id, total, sent, failed FROM broadcasts
+            WHERE status = 'running'
+        """)
+        for b in rows:
+            last = self._last_progress.get(b["id"], 0)
+            if not force and time.monotonic() - last < PROGRESS_INTERVAL:
+                continue
+            self._last_progress[b["id"]] = time.monotonic()
+            if not b["progress_message_id"]:
+                continue
+            try:
+                self.edit(b["admin_chat_id"], b["progress_message_id"],
+                          f"📣 Broadcast #{b['id']} läuft...\n\n"
+                          f"{b['sent'] + b['failed']}/{b['total']} verarbeitet "
+                          f"({b['sent']} gesendet, {b['failed']} fehlgeschlagen)")
+            except Exception:
+                self.report_failures += 1
+                log.warning("Fortschritt für Broadcast #%s nicht aktualisiert", b["id"], exc_info=True)
+
+    def _finish_broadcasts(self):
+        # Zähler statt Scan über outbox: fertig, wenn jede Zeile gesendet oder fehlgeschlagen ist
+        rows = self.db.query("""
+            SELECT * FROM broadcasts
+            WHERE status IN ('queued', 'running') AND sent + failed >= total
+        """)
+        for b in rows:
+            self.db.write("UPDATE broadcasts SET status = 'done', finished_at = ? WHERE id = ?",
+                          (now(), b["id"]))
+            self._payloads.pop(b["id"], None)
+            self._last_progress.pop(b["id"], None)
+            text = (
+                f"✅ Broadcast #{b['id']} abgeschlossen.\n\n"
+                f"Empfänger: {b['total']}\n"
+                f"Gesendet: {b['sent']}\n"
+                f"Fehlgeschlagen: {b['failed']}\n"
+                f"Start: {b['created_at']} UTC"
+            )
+            if b["progress_message_id"]:
+                try:
+                    self.edit(b["admin_chat_id"], b["progress_message_id"], text)
+                except Exception:
+                    self.report_failures += 1
+                    log.warning("Fortschritt für Broadcast #%s nicht abgeschlossen", b["id"], exc_info=True)
+            # Abschluss-Report auch dann, wenn das Edit fehlschlägt
+            try:
+                self.notify(b["admin_chat_id"], text)
+            except Exception:
+                self.report_failures += 1
+                log.warning("Abschluss-Report für Broadcast #%s an %s fehlgeschlagen", b["id"],
+                            b["admin_chat_id"], exc_info=True)
@@ -0,0 +1,428 @@
+import base64
+import json
+import logging
+import threading
+from datetime import datetime
+
+from solders.hash import Hash
+from solders.keypair import Keypair
+from solders.message import Message
+from solders.pubkey import Pubkey
+from solders.system_program import TransferParams, transfer
+from solders.transaction import Transaction
+
+import ledger
+import solana_rpc
+
+# =======================
+# PAYOUT PROCESSOR
+# =======================
+#
+# Zahlt offene Auszahlungen (withdrawals.status = 'pending') aus der
+# Hot-Wallet aus. Viele Überweisungen teilen sich eine Transaktion (so viele,
+# wie in ein Paket passen) → eine Signatur, eine Fee, ein Round-Trip.
+#
+# Status pro Auszahlung: pending -> processing -> sent -> confirmed
+# - processing: Transaktion ist signiert und samt raw_tx in payout_batches
+#   gespeichert, *bevor* sie gesendet wird
+# - sent: RPC hat die Transaktion angenommen
+# - confirmed: getSignatureStatuses meldet confirmed/finalized ohne Fehler
+# Offene Batches werden bei jedem Lauf geprüft und bis zum Ablauf des
+# Blockhashs unverändert erneut gesendet (gleiche Signatur → nie doppelt).
+# Erst wenn die finalisierte Blockhöhe über lastValidBlockHeight liegt und
+# die Signatur unbekannt ist, gehen die Auszahlungen zurück auf pending.
+# Lehnt der Preflight einen Batch ab, wird er halbiert, bis die fehlerhafte
+# Überweisung isoliert ist; die scheitert nach MAX_ATTEMPTS endgültig und
+# wird dem User zurückgebucht.
+
+log = logging.getLogger(__name__)
+
+PACKET_SIZE = 1232          # max. Größe einer serialisierten Transaktion
+MAX_TRANSFERS = 20          # Überweisungen pro Transaktion (passt bei ≤ 1232 Bytes)
+CLAIM_BATCH = 200           # Auszahlungen pro Lauf
+INTERVAL = 10               # Sekunden zwischen zwei Läufen
+MAX_ATTEMPTS = 3            # abgelehnte Versuche, bis eine Auszahlung endgültig scheitert
+FEE_LAMPORTS = 5000         # pro Signatur
+BALANCE_RESERVE = 10_000_000  # 0.01 SOL bleiben immer in der Hot-Wallet
+LAMPORTS_PER_SOL = 1_000_000_000
+
+# Fehlercodes von sendTransaction, bei denen die Transaktion sicher nicht gesendet wurde
+PREFLIGHT_FAILED = -32002
+SIGNATURE_FAILED = -32003
+
+
+def now():
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def load_keypair(path):
+    """Keypair aus einer solana-keygen-Datei (JSON-Array mit 64 Bytes)."""
+    with open(path) as f:
+        return Keypair.from_bytes(bytes(json.load(f)))
+
+
+def parse_wallet(address):
+    try:
+        return Pubkey.from_string((address or "").strip())
+    except ValueError:
+        return None
+
+
+def build_transaction(keypair, transfers, blockhash):
+    """transfers = [(pubkey, lamports), ...] → signierte Transaktion mit einer Anweisung pro Überweisung."""
+    payer = keypair.pubkey()
+    instructions = [transfer(TransferParams(from_pubkey=payer, to_pubkey=to, lamports=lamports))
+                    for to, lamports in transfers]
+    recent = Hash.from_string(blockhash)
+    return Transaction([keypair], Message.new_with_blockhash(instructions, payer, recent), recent)
+
+
+def pack(keypair, items, blockhash, max_size=PACKET_SIZE, max_transfers=MAX_TRANSFERS):
+    """
+    Teilt items = [(withdrawal_id, pubkey, lamports), ...] gierig auf möglichst
+    wenige Transaktionen auf. Gibt [(items, Transaction), ...] zurück.
+    """
+    groups = []
+    current, tx = [], None
+    for item in items:
+        candidate = build_transaction(keypair, [(to, lamports) for _, to, lamports in current + [item]], blockhash)
+        if current and (len(current) >= max_transfers or len(bytes(candidate)) > max_size):
+            groups.append((current, tx))
+            current = [item]
+            tx = build_transaction(keypair, [(item[1], item[2])], blockhash)
+        else:
+            current.append(item)
+            tx = candidate
+    if current:
+        groups.append((current, tx))
+    return groups
+
+
+def is_rejected(exc):
+    """RpcError, bei dem die Transaktion nachweislich nicht ins Netz ging."""
+    return isinstance(exc, solana_rpc.RpcError) and exc.code in (PREFLIGHT_FAILED, SIGNATURE_FAILED)
+
+
+class PayoutProcessor:
+    """
+    db        -> db.Database
+    rpc       -> solana_rpc.SolanaRpcClient
+    keypair   -> solders Keypair der Hot-Wallet (zahlt Beträge und Fees)
+    prices    -> price_oracle.PriceOracle, USD → Lamports zum Zeitpunkt der Auszahlung
+    on_paid   -> on_paid(rows) nach Bestätigung (withdrawals + telegram_id)
+    on_failed -> on_failed(row, error) nach endgültigem Scheitern (Betrag ist zurückgebucht)
+    """
+
+    def __init__(self, db, rpc, keypair, prices, on_paid=None, on_failed=None, interval=INTERVAL,
+                 claim_batch=CLAIM_BATCH, max_transfers=MAX_TRANSFERS, max_attempts=MAX_ATTEMPTS):
+        self.db = db
+        self.rpc = rpc
+        self.keypair = keypair
+        self.address = str(keypair.pubkey())
+        self.prices = prices
+        self.on_paid = on_paid
+        self.on_failed = on_failed
+        self.interval = interval
+        self.claim_batch = claim_batch
+        self.max_transfers = max_transfers
+        self.max_attempts = max_attempts
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._run_lock = threading.Lock()
+        self._thread = None
+
+        self.transactions = 0
+        self.transfers = 0
+        self.confirmed = 0
+        self.expired = 0
+        self.rejected = 0
+        self.splits = 0
+        self.failed = 0
+        self.resent = 0
+        self.underfunded = 0
+
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name="payouts", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self):
+        self._wake.set()
+
+    def stats(self):
+        return {
+            "transactions": self.transactions,
+            "transfers": self.transfers,
+            "confirmed": self.confirmed,
+            "expired": self.expired,
+            "rejected": self.rejected,
+            "splits": self.splits,
+            "failed": self.failed,
+            "resent": self.resent,
+            "underfunded": self.underfunded,
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                log.exception("Auszahlungs-Lauf fehlgeschlagen")
+            self._wake.wait(timeout=self.interval)
+            self._wake.clear()
+
+    def run_once(self):
+        """Prüft offene Batches und zahlt neue Auszahlungen aus. Gibt die Zahl neuer Überweisungen zurück."""
+        with self._run_lock:
+            self.check_batches()
+            return self.pay_pending()
+
+    # ---------- offene Batches ----------
+
+    def check_batches(self):
+        batches = self.db.query("""
+            SELECT id, tx_sig, raw_tx, last_valid_height, status FROM payout_batches
+            WHERE status IN ('processing', 'sent') ORDER BY id
+        """)
+        if not batches:
+            return
+        # Höhe VOR den Status holen: war sie schon über lastValidBlockHeight und
+        # ist die Signatur danach unbekannt, kann die Transaktion nie mehr landen
+        height = self.rpc.get_block_height()
+        statuses = self.rpc.get_signature_statuses([b["tx_sig"] for b in batches])
+        for b in batches:
+            status = statuses.get(b["tx_sig"])
+            if status is not None and status.get("err") is not None:
+                self._batch_failed(b["id"], json.dumps(status["err"]))
+            elif status is not None and status.get("confirmationStatus") in ("confirmed", "finalized"):
+                self._batch_confirmed(b["id"])
+            elif status is None and height > b["last_valid_height"]:
+                self._batch_expired(b["id"])
+            else:
+                self._resend(b)
+
+    def _resend(self, batch):
+        try:
+            self.rpc.send_transaction(batch["raw_tx"], skip_preflight=True)
+        except Exception as e:
+            log.warning("Batch %s: erneutes Senden fehlgeschlagen: %s", batch["id"], e)
+            return
+        self.resent += 1
+        if batch["status"] == "processing":
+            self._mark_sent(batch["id"])
+
+    def _batch_confirmed(self, batch_id):
+        def confirm(conn):
+            conn.execute("UPDATE payout_batches SET status = 'confirmed', finished_at = ? WHERE id = ?",
+                         (now(), batch_id))
+            conn.execute("UPDATE withdrawals SET status = 'confirmed', paid_at = ? WHERE batch_id = ?",
+                         (now(), batch_id))
+            return conn.execute("""
+                SELECT w.id, w.user_id, w.amount_usd, w.lamports, w.target_wallet, w.tx_sig, u.telegram_id
+                FROM withdrawals w JOIN users u ON u.id = w.user_id
+                WHERE w.batch_id = ?
+            """, (batch_id,)).fetchall()
+
+        rows = self.db.transaction(confirm)
+        self.confirmed += len(rows)
+        if self.on_paid and rows:
+            try:
+                self.on_paid(rows)
+            except Exception:
+                log.exception("on_paid für Batch %s fehlgeschlagen", batch_id)
+
+    def _batch_expired(self, batch_id):
+        # nie gelandet → dieselben Auszahlungen gehen unverändert zurück in die Warteschlange
+        def expire(conn):
+            conn.execute("UPDATE payout_batches SET status = 'expired', finished_at = ? WHERE id = ?",
+                         (now(), batch_id))
+            conn.execute("""
+                UPDATE withdrawals SET status = 'pending', batch_id = NULL, tx_sig = NULL
+                WHERE batch_id = ? AND status IN ('processing', 'sent')
+            """, (batch_id,))
+
+        self.db.transaction(expire)
+        self.expired += 1
+        log.warning("Batch %s abgelaufen, Auszahlungen werden neu eingeplant", batch_id)
+
+    def _batch_failed(self, batch_id, error):
+        """Transaktion ist mit Fehler gelandet (Fee bezahlt, Überweisungen nicht)."""
+        # Batch-Status, Versuch zählen und ggf. Rückbuchung in EINER Transaktion: sonst bleibt
+        # bei einem Crash dazwischen ein failed-Batch mit Auszahlungen in processing liegen
+        def failed(conn):
+            conn.execute("UPDATE payout_batches SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                         (error, now(), batch_id))
+            ids = [r["id"] for r in conn.execute("SELECT id FROM withdrawals WHERE batch_id = ?", (batch_id,))]
+            return self._fail_rows(conn, self._count_attempt(conn, ids, error), error)
+
+        self._failed(self.db.transaction(failed), error)
+
+    def _mark_sent(self, batch_id):
+        def sent(conn):
+            conn.execute("UPDATE payout_batches SET status = 'sent', sent_at = ? WHERE id = ? AND status = 'processing'",
+                         (now(), batch_id))
+            conn.execute("UPDATE withdrawals SET status = 'sent' WHERE batch_id = ? AND status = 'processing'",
+                         (batch_id,))
+
+        self.db.transaction(sent)
+
+    # ---------- neue Auszahlungen ----------
+
+    def pay_pending(self):
+        rows = self.db.query("""
+            SELECT id, amount_usd, target_wallet FROM withdrawals
+            WHERE status = 'pending' ORDER BY id LIMIT ?
+        """, (self.claim_batch,))
+        if not rows:
+            return 0
+        price = self.prices.get("SOL").price
+        items = []
+        for r in rows:
+            to = parse_wallet(r["target_wallet"])
+            if to is None:
+                self._fail([r["id"]], "ungültige Wallet-Adresse")
+                continue
+            lamports = int(r["amount_usd"] / price * LAMPORTS_PER_SOL)
+            if lamports <= 0:
+                self._fail([r["id"]], "Betrag zu klein")
+                continue
+            items.append((r["id"], to, lamports))
+        items = self._fund(items)
+        if not items:
+            return 0
+        blockhash, last_valid = self.rpc.get_latest_blockhash()
+        for group, tx in pack(self.keypair, items, blockhash, max_transfers=self.max_transfers):
+            self._submit(group, tx, blockhash, last_valid, price)
+        return len(items)
+
+    def _fund(self, items):
+        """Nur so viele Auszahlungen, wie die Hot-Wallet samt Fees und Reserve decken kann."""
+        available = self.rpc.get_balance(self.address) - BALANCE_RESERVE
+        funded, needed = [], 0
+        for item in items:
+            # grob eine Fee pro Überweisung, die echte Zahl ist kleiner
+            needed += item[2] + FEE_LAMPORTS
+            if needed > available:
+                self.underfunded += 1
+                log.warning("Hot-Wallet %s reicht nur für %s von %s Auszahlungen", self.address,
+                            len(funded), len(items))
+                break
+            funded.append(item)
+        return funded
+
+    def _submit(self, group, tx, blockhash, last_valid, price):
+        """Speichert den signierten Batch (processing) und sendet ihn."""
+        sig = str(tx.signatures[0])
+        raw = base64.b64encode(bytes(tx)).decode()
+        lamports = sum(item[2] for item in group)
+
+        def store(conn):
+            batch_id = conn.execute("""
+                INSERT INTO payout_batches
+                    (tx_sig, raw_tx, last_valid_height, transfers, lamports, status, created_at)
+                VALUES (?,?,?,?,?,'processing',?)
+            """, (sig, raw, last_valid, len(group), lamports, now())).lastrowid
+            for wid, _, item_lamports in group:
+                cur = conn.execute("""
+                    UPDATE withdrawals SET status = 'processing', batch_id = ?, lamports = ?, price_usd = ?, tx_sig = ?
+                    WHERE id = ? AND status = 'pending'
+                """, (batch_id, item_lamports, price, sig, wid))
+                if cur.rowcount != 1:
+                    raise RuntimeError(f"Auszahlung {wid} ist nicht mehr offen")
+            return batch_id
+
+        batch_id = self.db.transaction(store)
+        try:
+            self.rpc.send_transaction(raw)
+        except Exception as e:
+            if not is_rejected(e):
+                # Ausgang unklar → bleibt processing, check_batches sendet erneut oder lässt ablaufen
+                log.warning("Batch %s: Senden unklar: %s", batch_id, e)
+                return
+            self._rejected(batch_id, group, blockhash, last_valid, price, e)
+            return
+        self.transactions += 1
+        self.transfers += len(group)
+        self._mark_sent(batch_id)
+
+    def _rejected(self, batch_id, group, blockhash, last_valid, price, exc):
+        """Preflight abgelehnt: nichts ist on-chain passiert → Batch verwerfen, halbieren oder aufgeben."""
+        self.rejected += 1
+        error = str(exc.error.get("message") if isinstance(exc.error, dict) else exc.error)
+
+        def release(conn):
+            conn.execute("UPDATE payout_batches SET status = 'rejected', error = ?, finished_at = ? WHERE id = ?",
+                         (error, now(), batch_id))
+            conn.execute("UPDATE withdrawals SET status = 'pending', batch_id = NULL, tx_sig = NULL WHERE batch_id = ?",
+                         (batch_id,))
+
+        self.db.transaction(release)
+        if "BlockhashNotFound" in error or "blockhash not found" in error.lower():
+            return  # nächster Lauf mit frischem Blockhash
+        if len(group) == 1:
+            self._retry_or_fail([group[0][0]], error)
+            return
+        self.splits += 1
+        half = len(group) // 2
+        for part in (group[:half], group[half:]):
+            tx = build_transaction(self.keypair, [(to, lamports) for _, to, lamports in part], blockhash)
+            self._submit(part, tx, blockhash, last_valid, price)
+
+    def _retry_or_fail(self, ids, error):
+        """Versuch zählen; wer MAX_ATTEMPTS erreicht, scheitert endgültig."""
+        def retry(conn):
+            return self._fail_rows(conn, self._count_attempt(conn, ids, error), error)
+
+        self._failed(self.db.transaction(retry), error)
+
+    def _fail(self, ids, error):
+        """Endgültig gescheitert: Status failed, Betrag wird dem User zurückgebucht."""
+        self._failed(self.db.transaction(lambda conn: self._fail_rows(conn, ids, error)), error)
+
+    def _count_attempt(self, conn, ids, error):
+        """Versuch zählen, zurück nach pending; gibt die IDs zurück, die MAX_ATTEMPTS erreicht haben."""
+        final = []
+        for wid in ids:
+            row = conn.execute("""
+                UPDATE withdrawals SET attempts = attempts + 1, error = ?,
+                    status = CASE WHEN attempts + 1 >= ? THEN status ELSE 'pending' END,
+                    batch_id = CASE WHEN attempts + 1 >= ? THEN batch_id END,
+                    tx_sig = CASE WHEN attempts + 1 >= ? THEN tx_sig END
+                WHERE id = ? RETURNING attempts
+            """, (error, self.max_attempts, self.max_attempts, self.max_attempts, wid)).fetchone()
+            if row and row[0] >= self.max_attempts:
+                final.append(wid)
+        return final
+
+    @staticmethod
+    def _fail_rows(conn, ids, error):
+        """Status failed + Rückbuchung (innerhalb der Transaktion). Gibt die betroffenen Zeilen zurück."""
+        rows = []
+        for wid in ids:
+            row = conn.execute("""
+                UPDATE withdrawals SET status = 'failed', error = ?
+                WHERE id = ? AND status NOT IN ('failed', 'confirmed')
+                RETURNING id, user_id, amount_usd, target_wallet
+            """, (error, wid)).fetchone()
+            if row is None:
+                continue
+            ledger.post(conn, row["user_id"], ledger.to_micro(row["amount_usd"]), "withdrawal_refund", str(wid))
+            user = conn.execute("SELECT telegram_id FROM users WHERE id = ?", (row["user_id"],)).fetchone()
+            rows.append(dict(row, telegram_id=user["telegram_id"] if user else None))
+        return rows
+
+    def _failed(self, rows, error):
+        """Nach dem Commit: zählen, loggen, User benachrichtigen."""
+        self.failed += len(rows)
+        for row in rows:
+            log.warning("Auszahlung %s endgültig fehlgeschlagen: %s", row["id"], error)
+            if self.on_failed:
+                try:
+                    self.on_failed(row, error)
+                except Exception:
+                    log.exception("on_failed für Auszahlung %s fehlgeschlagen", row["id"])
@@ -0,0 +1,189 @@
+import json
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+
+import requests
+
+# =======================
+# PRICE ORACLE
+# =======================
+#
+# Kurse (z.B. SOL/USD) für die Umrechnung von Einzahlungen.
+# - frisch (< ttl): direkt aus dem Cache
+# - stale (< max_age): sofort den alten Kurs liefern, Refresh im Hintergrund
+# - älter/leer: blockierend laden
+# Gleichzeitige Abfragen desselben Symbols teilen sich einen Request
+# (single-flight). Quellen werden der Reihe nach probiert.
+
+log = logging.getLogger(__name__)
+
+TTL = 30          # Sekunden, solange gilt ein Kurs als frisch
+MAX_AGE = 600     # bis hierhin wird ein alter Kurs noch ausgeliefert
+TIMEOUT = 5
+
+Quote = namedtuple("Quote", "symbol price fetched_at source")
+
+
+class PriceUnavailable(Exception):
+    pass
+
+
+class StaticPriceSource:
+    """Feste Kurse, z.B. {"USDC": 1.0}."""
+
+    name = "static"
+
+    def __init__(self, prices):
+        self.prices = dict(prices)
+
+    def fetch(self, symbol):
+        if symbol not in self.prices:
+            raise PriceUnavailable(f"{symbol}: kein statischer Kurs")
+        return float(self.prices[symbol])
+
+
+class FilePriceSource:
+    """Lokale JSON-Datei {"SOL": 187.4, ...}, wird bei jedem Fetch neu gelesen."""
+
+    name = "file"
+
+    def __init__(self, path):
+        self.path = path
+
+    def fetch(self, symbol):
+        with open(self.path) as f:
+            prices = json.load(f)
+        if symbol not in prices:
+            raise PriceUnavailable(f"{symbol}: nicht in {self.path}")
+        return float(prices[symbol])
+
+
+class HttpPriceSource:
+    """
+    JSON-Feed per HTTP GET. ids bildet Symbol → Pfad im JSON ab, z.B. für CoinGecko
+    /simple/price?ids=solana&vs_currencies=usd: {"SOL": ("solana", "usd")}.
+    """
+
+    name = "http"
+
+    def __init__(self, url, ids, timeout=TIMEOUT):
+        self.url = url
+        self.ids = ids
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def fetch(self, symbol):
+        path = self.ids.get(symbol)
+        if path is None:
+            raise PriceUnavailable(f"{symbol}: nicht konfiguriert")
+        resp = self.session.get(self.url, timeout=self.timeout)
+        resp.raise_for_status()
+        value = resp.json()
+        for key in path:
+            value = value[key]
+        return float(value)
+
+
+class PriceOracle:
+
+    def __init__(self, sources, ttl=TTL, max_age=MAX_AGE):
+        self.sources = list(sources)
+        self.ttl = ttl
+        self.max_age = max_age
+        self._quotes = {}    # symbol -> Quote
+        self._inflight = {}  # symbol -> Future
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.errors = 0
+
+    def get(self, symbol):
+        """Gibt einen Quote zurück; blockiert nur, wenn kein brauchbarer Kurs im Cache ist."""
+        with self._lock:
+            quote = self._quotes.get(symbol)
+            age = time.time() - quote.fetched_at if quote else None
+            if quote and age < self.ttl:
+                self.hits += 1
+                return quote
+            if quote and age < self.max_age:
+                self.stale_hits += 1
+                self._flight(symbol, background=True)
+                return quote
+            self.misses += 1
+            future, owner = self._flight(symbol)
+        if owner:
+            self._refresh(symbol, future)
+        return future.result()
+
+    def price(self, symbol):
+        return self.get(symbol).price
+
+    def prime(self, symbol, price, fetched_at=None):
+        """Setzt einen Kurs von außen (Startwert, Tests)."""
+        with self._lock:
+            self._quotes[symbol] = Quote(symbol, float(price), fetched_at or time.time(), "prime")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "fetches": self.fetches,
+                "errors": self.errors,
+                "quotes": {s: (q.price, time.time() - q.fetched_at) for s, q in self._quotes.items()},
+            }
+
+    # ---------- intern ----------
+
+    def _flight(self, symbol, background=False):
+        """Muss mit self._lock aufgerufen werden. Gibt (future, owner) zurück."""
+        future = self._inflight.get(symbol)
+        if future is not None:
+            return future, False
+        future = self._inflight[symbol] = Future()
+        if background:
+            threading.Thread(target=self._refresh, args=(symbol, future),
+                             name=f"price-{symbol}", daemon=True).start()
+            return future, False
+        return future, True
+
+    def _refresh(self, symbol, future):
+        try:
+            quote = self._fetch(symbol)
+        except Exception as e:
+            with self._lock:
+                self._inflight.pop(symbol, None)
+                stale = self._quotes.get(symbol)
+            # letzter Kurs ist besser als gar keiner, solange er nicht zu alt ist
+            if stale and time.time() - stale.fetched_at < self.max_age:
+                future.set_result(stale)
+            else:
+                future.set_exception(e)
+            return
+        with self._lock:
+            self._quotes[symbol] = quote
+            self._inflight.pop(symbol, None)
+        future.set_result(quote)
+
+    def _fetch(self, symbol):
+        errors = []
+        for source in self.sources:
+            with self._lock:
+                self.fetches += 1
+            try:
+                price = source.fetch(symbol)
+                if price <= 0:
+                    raise PriceUnavailable(f"{symbol}: ungültiger Kurs {price}")
+                return Quote(symbol, price, time.time(), source.name)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                log.warning("Kursquelle %s für %s fehlgeschlagen: %s", source.name, symbol, e)
+                errors.append(f"{source.name}: {e}")
+        raise PriceUnavailable(f"{symbol}: keine Quelle erreichbar ({'; '.join(errors)})")
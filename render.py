@@ -0,0 +1,124 @@
+import functools
+import threading
+from collections import OrderedDict
+
+from telebot.apihelper import ApiTelegramException
+from telebot.types import JsonSerializable
+
+# =======================
+# RENDER CACHE
+# =======================
+#
+# Keyboards gibt es nur in wenigen Varianten → einmal bauen und als fertiges
+# JSON aufheben (FrozenMarkup, @keyboard). Pro Nachricht merkt sich der
+# RenderCache, was zuletzt gerendert wurde (Hash aus Text, parse_mode und
+# Markup). Ein Edit mit identischem Inhalt wird gar nicht erst geschickt;
+# kommt trotzdem "message is not modified" zurück, gilt das als Erfolg.
+
+MAX_SIZE = 50_000
+
+
+class FrozenMarkup(JsonSerializable):
+    """Fertig serialisiertes reply_markup, telebot übernimmt to_json() direkt."""
+
+    __slots__ = ("json",)
+
+    def __init__(self, markup):
+        self.json = markup.to_json()
+
+    def to_json(self):
+        return self.json
+
+
+def keyboard(builder):
+    """Dekorator: builder(*variante) wird pro Variante nur einmal gebaut und serialisiert."""
+    cached = functools.lru_cache(maxsize=None)(lambda *args: FrozenMarkup(builder(*args)))
+    return functools.wraps(builder)(cached)
+
+
+def markup_json(markup):
+    return markup.to_json() if markup is not None else None
+
+
+def is_not_modified(exc):
+    return isinstance(exc, ApiTelegramException) and "message is not modified" in exc.description
+
+
+class RenderCache:
+
+    def __init__(self, bot, maxsize=MAX_SIZE):
+        self.bot = bot
+        self.maxsize = maxsize
+        self._screens = OrderedDict()  # (chat_id, message_id) -> (hash(text, parse_mode), hash(markup))
+        self._lock = threading.Lock()
+        self.edits = 0
+        self.skipped = 0
+        self.not_modified = 0
+
+    def remember(self, chat_id, message_id, text, parse_mode=None, reply_markup=None):
+        """Nach send_message aufrufen, damit spätere Edits verglichen werden können."""
+        self._store(chat_id, message_id, hash((text, parse_mode)), hash(markup_json(reply_markup)))
+
+    def edit_text(self, chat_id, message_id, text, parse_mode=None, reply_markup=None):
+        """edit_message_text, außer die Nachricht zeigt schon genau das. True = Call geschickt."""
+        content = hash((text, parse_mode))
+        markup = hash(markup_json(reply_markup))
+        if self._get(chat_id, message_id) == (content, markup):
+            return self._skip()
+        self._edit(self.bot.edit_message_text, chat_id=chat_id, message_id=message_id, text=text,
+                   parse_mode=parse_mode, reply_markup=reply_markup)
+        self._store(chat_id, message_id, content, markup)
+        return True
+
+    def edit_markup(self, chat_id, message_id, reply_markup=None):
+        """edit_message_reply_markup, außer das Keyboard ist schon dasselbe."""
+        markup = hash(markup_json(reply_markup))
+        current = self._get(chat_id, message_id)
+        if current is not None and current[1] == markup:
+            return self._skip()
+        self._edit(self.bot.edit_message_reply_markup, chat_id=chat_id, message_id=message_id,
+                   reply_markup=reply_markup)
+        self._store(chat_id, message_id, current[0] if current else None, markup)
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._screens), "edits": self.edits, "skipped": self.skipped,
+                    "not_modified": self.not_modified}
+
+    # ---------- intern ----------
+
+    def _edit(self, method, **kwargs):
+        with self._lock:
+            self.edits += 1
+        try:
+            method(**kwargs)
+        except ApiTelegramException as e:
+            if not is_not_modified(e):
+                self._forget(kwargs["chat_id"], kwargs["message_id"])
+                raise
+            with self._lock:
+                self.not_modified += 1
+
+    def _skip(self):
+        with self._lock:
+            self.skipped += 1
+        return False
+
+    def _get(self, chat_id, message_id):
+        with self._lock:
+            return self._screens.get((chat_id, message_id))
+
+    def _store(self, chat_id, message_id, content, markup):
+        if self.maxsize <= 0:
+            return
+        key = (chat_id, message_id)
+        with self._lock:
+            self._screens[key] = (content, markup)
+            self._screens.move_to_end(key)
+            while len(self._screens) > self.maxsize:
+                self._screens.popitem(last=False)
+
+    def _forget(self, chat_id, message_id):
+        with self._lock:
+            self._screens.pop((chat_id, message_id), None)
@@ -0,0 +1,237 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import execution
+
+# =======================
+# SIGNAL PIPELINE
+# =======================
+#
+# Ablauf pro Signal:
+# 1) Alle Trades des Signals landen in EINER Transaktion in der DB
+#    (INSERT ... SELECT, der Auto-Entry-Betrag wird direkt im SQL berechnet;
+#    INSERT OR IGNORE, ein erneuter Lauf bucht nichts doppelt).
+# 2) Danach Chunk für Chunk (Keyset über id), damit nie mehr als ein Chunk
+#    User im Speicher liegt: User samt gebuchtem Trade laden.
+# 3) Die Benachrichtigungen ohne Fill (kein Auto-Entry bzw. keine Börse)
+#    gehen sofort an einen begrenzten, parallelen Sender.
+# 4) Optional: die Auto-Entries des Chunks gehen im Hintergrund an die Börse
+#    (execution.ExecutionEngine, höchstens EXEC_INFLIGHT Chunks gleichzeitig),
+#    Fills werden an die Trades geschrieben; erst dann bekommen genau diese
+#    User ihre Nachricht. Alle anderen warten nie auf die Börse.
+# Am Ende gibt es einen Report mit Zeit bis zum letzten User und Stage-Timings
+# (über alle Chunks summiert). Scheitert die Ausführung eines Chunks, wird das
+# geloggt und gezählt (failed_chunks); Report und Stats gibt es trotzdem.
+
+log = logging.getLogger(__name__)
+
+USER_CHUNK_SIZE = 1000
+SEND_WORKERS = 16
+EXEC_INFLIGHT = 2   # Chunks gleichzeitig an der Börse
+
+
+def book_trades(conn, signal_id, created_at):
+    """Bucht die Auto-Entries aller User für ein Signal (in db.transaction). Gibt die Anzahl neuer Trades zurück."""
+    return conn.execute("""
+        INSERT OR IGNORE INTO trades (user_id, signal_id, amount_usd, risk_percent, created_at)
+        SELECT id, ?, ROUND(balance_usd * risk_percent / 100.0, 2), risk_percent, ?
+        FROM users
+        WHERE auto_entry = 1 AND ROUND(balance_usd * risk_percent / 100.0, 2) > 0
+    """, (signal_id, created_at)).rowcount
+
+
+def iter_user_chunks(db, signal_id, chunk_size=USER_CHUNK_SIZE):
+    """Streamt alle User chunkweise inkl. gebuchtem Trade (trade_id, entry_amount) des Signals."""
+    last_id = 0
+    while True:
+        rows = db.query("""
+            SELECT u.id, u.telegram_id, u.auto_entry, u.risk_percent,
+                   t.id AS trade_id, COALESCE(t.amount_usd, 0) AS entry_amount
+            FROM users u
+            LEFT JOIN trades t ON t.signal_id = ? AND t.user_id = u.id
+            WHERE u.id > ?
+            ORDER BY u.id
+            LIMIT ?
+        """, (signal_id, last_id, chunk_size))
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1]["id"]
+
+
+class BoundedSender:
+    """
+    Verschickt Nachrichten parallel über eine feste Anzahl Worker.
+    Die Anzahl wartender Jobs ist begrenzt, damit bei 100k Usern nicht
+    100k Futures gleichzeitig im Speicher liegen.
+    """
+
+    def __init__(self, send, max_workers=SEND_WORKERS, max_pending=None):
+        self.send = send
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fanout")
+        self._slots = threading.BoundedSemaphore(max_pending or max_workers * 4)
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.last_done = None
+
+    def submit(self, chat_id, text, **kwargs):
+        self._slots.acquire()
+        try:
+            future = self._pool.submit(self._deliver, chat_id, text, kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+
+    def _deliver(self, chat_id, text, kwargs):
+        try:
+            self.send(chat_id, text, **kwargs)
+            ok = True
+        except Exception:
+            ok = False
+        with self._lock:
+            if ok:
+                self.sent += 1
+                self.last_done = time.monotonic()
+            else:
+                self.failed += 1
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+
+def run_signal(db, signal_id, render, send, created_at,
+               max_workers=SEND_WORKERS, chunk_size=USER_CHUNK_SIZE,
+               engine=None, symbol=None, direction=None, leverage=None, account="main"):
+    """
+    Führt ein Signal komplett aus und gibt einen Report (dict) zurück.
+
+    render -> render(auto_entry, risk_percent, entry_amount, fill) -> Nachrichtentext,
+              fill ist der execution.Fill des Users (None ohne Börse/Entry)
+    send   -> send(chat_id, text, **kwargs)
+    engine -> execution.ExecutionEngine, None = Trades nur erfassen
+    """
+    t_start = time.monotonic()
+    side = execution.side_for(direction)
+    users = entries = 0
+    load_s = trades_s = send_s = 0.0
+    done = {"filled": 0, "rejected": 0, "unknown": 0, "fill_s": 0.0, "failed_chunks": 0}
+    lock = threading.Lock()
+
+    def submit(u, fill):
+        sender.submit(u["telegram_id"], render(u["auto_entry"], u["risk_percent"], u["entry_amount"], fill),
+                      parse_mode="Markdown")
+
+    def execute_chunk(chunk, trades):
+        # Auto-Entries an der Börse ausführen, Fills an die Trades schreiben, dann diese User benachrichtigen
+        t0 = time.monotonic()
+        orders = [execution.Order(u["trade_id"], account, symbol, side, u["entry_amount"], leverage) for u in trades]
+        try:
+            by_trade = engine.execute(orders)
+            execution.record_fills(db, by_trade)
+        except Exception:
+            log.exception("Auto-Entries für Signal %s (User %s–%s) fehlgeschlagen",
+                          signal_id, chunk[0]["id"], chunk[-1]["id"])
+            with lock:
+                done["failed_chunks"] += 1
+                done["fill_s"] += time.monotonic() - t0
+            return
+        fills = {u["id"]: by_trade.get(u["trade_id"]) for u in trades}
+        with lock:
+            done["filled"] += sum(1 for f in fills.values() if f and f.status in ("filled", "partial"))
+            done["rejected"] += sum(1 for f in fills.values() if f is None or f.status == "rejected")
+            done["unknown"] += sum(1 for f in fills.values() if f and f.status == "unknown")
+            done["fill_s"] += time.monotonic() - t0
+        for u in trades:
+            submit(u, fills.get(u["id"]))
+
+    sender = BoundedSender(send, max_workers=max_workers)
+    pool = ThreadPoolExecutor(max_workers=EXEC_INFLIGHT, thread_name_prefix="signal-exec") if engine else None
+    inflight = threading.BoundedSemaphore(EXEC_INFLIGHT)
+    try:
+        # 1) alle Trades des Signals in einer Transaktion, bevor Börse und Versand starten
+        t0 = time.monotonic()
+        db.transaction(lambda conn: book_trades(conn, signal_id, created_at))
+        trades_s = time.monotonic() - t0
+
+        chunks = iter_user_chunks(db, signal_id, chunk_size)
+        while True:
+            # 2) nächsten Chunk samt gebuchten Trades laden
+            t0 = time.monotonic()
+            chunk = next(chunks, None)
+            load_s += time.monotonic() - t0
+            if chunk is None:
+                break
+            trades = [u for u in chunk if u["trade_id"] is not None]
+
+            # 3) alles, was nicht auf einen Fill wartet, sofort an den Sender
+            t0 = time.monotonic()
+            for u in chunk:
+                if pool is None or u["trade_id"] is None:
+                    submit(u, None)
+            send_s += time.monotonic() - t0
+            users += len(chunk)
+            entries += len(trades)
+
+            # 4) Auto-Entries im Hintergrund; begrenzt, damit nicht alle Chunks im Speicher warten
+            if pool is not None and trades:
+                inflight.acquire()
+                job = pool.submit(execute_chunk, chunk, trades)
+                job.add_done_callback(lambda _: inflight.release())
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True)
+        t0 = time.monotonic()
+        sender.close()
+        send_s += time.monotonic() - t0
+    t_sent = time.monotonic()
+
+    report = {
+        "signal_id": signal_id,
+        "users": users,
+        "entries": entries,
+        "sent": sender.sent,
+        "failed": sender.failed,
+        "load_s": load_s,
+        "trades_s": trades_s,
+        "filled": done["filled"],
+        "rejected": done["rejected"],
+        "unknown": done["unknown"],
+        "fill_s": done["fill_s"] if engine is not None else None,
+        "failed_chunks": done["failed_chunks"],
+        "send_s": send_s,
+        "last_user_s": (sender.last_done or t_sent) - t_start,
+    }
+
+    db.write("""
+        INSERT OR REPLACE INTO signal_stats
+            (signal_id, users, entries, sent, failed, load_s, trades_s, send_s, last_user_s,
+             filled, rejected, unknown, fill_s, failed_chunks, created_at)
+        VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+    """, (signal_id, report["users"], report["entries"], report["sent"], report["failed"],
+          report["load_s"], report["trades_s"], report["send_s"], report["last_user_s"],
+          report["filled"] if engine is not None else None, report["rejected"] if engine is not None else None,
+          report["unknown"] if engine is not None else None, report["fill_s"], report["failed_chunks"], created_at))
+    return report
+
+
+def format_report(report):
+    entries = f"Auto-Entries: {report['entries']}\n"
+    timings = f"Laden: {report['load_s']:.3f}s · Trades: {report['trades_s']:.3f}s · "
+    if report.get("fill_s") is not None:
+        entries = (f"Auto-Entries: {report['entries']} (ausgeführt {report['filled']}, "
+                   f"abgelehnt {report['rejected']}, offen {report['unknown']})\n")
+        timings += f"Börse: {report['fill_s']:.2f}s · "
+    if report.get("failed_chunks"):
+        entries += f"⚠️ Börsen-Ausführung für {report['failed_chunks']} Chunk(s) fehlgeschlagen (siehe Log)\n"
+    return (
+        f"📊 *Signal #{report['signal_id']} verteilt*\n\n"
+        f"User: {report['users']} (gesendet {report['sent']}, Fehler {report['failed']})\n"
+        + entries +
+        f"Zeit bis letzter User: {report['last_user_s']:.2f}s\n\n"
+        + timings +
+        f"Versand: {report['send_s']:.2f}s"
+    )
@@ -0,0 +1,228 @@
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# =======================
+# SOLANA JSON-RPC CLIENT
+# =======================
+#
+# - eine gemeinsame requests.Session mit Connection-Pool (Keep-Alive)
+# - JSON-RPC-Batches: viele getTransaction in einem HTTP-Request
+# - begrenzte Parallelität über einen festen Thread-Pool
+# - Retry/Backoff, 429 + Retry-After werden respektiert
+# - Failover über eine Liste von Endpoints
+# - Latenz-Zähler pro Methode (stats())
+
+TIMEOUT = 10
+POOL_SIZE = 16
+MAX_WORKERS = 4
+MAX_RETRIES = 3
+BATCH_SIZE = 25
+BACKOFF = 0.5
+MAX_BACKOFF = 10.0
+
+
+class RpcError(Exception):
+    def __init__(self, method, error):
+        self.method = method
+        self.code = error.get("code") if isinstance(error, dict) else None
+        self.error = error
+        super().__init__(f"{method}: {error}")
+
+
+class SolanaRpcClient:
+
+    def __init__(self, endpoints, timeout=TIMEOUT, pool_size=POOL_SIZE, max_workers=MAX_WORKERS,
+                 max_retries=MAX_RETRIES, batch_size=BATCH_SIZE, backoff=BACKOFF):
+        if isinstance(endpoints, str):
+            endpoints = [endpoints]
+        if not endpoints:
+            raise ValueError("mindestens ein RPC-Endpoint nötig")
+        self.endpoints = list(endpoints)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.batch_size = max(1, batch_size)
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.endpoints), pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Content-Type"] = "application/json"
+
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="solana-rpc")
+        self._current = 0  # Index des aktuell bevorzugten Endpoints
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    # ---------- öffentliche API ----------
+
+    def call(self, method, params=None):
+        req = self._request(method, params)
+        body = self._post(req, [method])
+        if "error" in body:
+            raise RpcError(method, body["error"])
+        return body.get("result")
+
+    def batch(self, calls, raise_errors=True):
+        """
+        calls = [(method, params), ...] → Ergebnisse in gleicher Reihenfolge.
+        Mit raise_errors=False steht bei Fehlern None im Ergebnis.
+        """
+        if not calls:
+            return []
+        reqs = [self._request(m, p) for m, p in calls]
+        body = self._post(reqs, [m for m, _ in calls])
+        if isinstance(body, dict):
+            # manche Server antworten auf Batches mit einem einzelnen Fehlerobjekt
+            raise RpcError("batch", body.get("error", body))
+        by_id = {item.get("id"): item for item in body}
+        results = []
+        for req in reqs:
+            item = by_id.get(req["id"], {})
+            if "error" in item or "result" not in item:
+                if raise_errors:
+                    raise RpcError(req["method"], item.get("error", "keine Antwort"))
+                results.append(None)
+            else:
+                results.append(item["result"])
+        return results
+
+    def batch_parallel(self, calls, raise_errors=True):
+        """Teilt calls in Batches auf und schickt diese parallel (begrenzt) ab."""
+        chunks = [calls[i:i + self.batch_size] for i in range(0, len(calls), self.batch_size)]
+        if len(chunks) <= 1:
+            return self.batch(calls, raise_errors=raise_errors)
+        results = []
+        for part in self._pool.map(lambda c: self.batch(c, raise_errors=raise_errors), chunks):
+            results.extend(part)
+        return results
+
+    def get_signatures_for_address(self, address, limit=1000, before=None, until=None):
+        opts = {"limit": limit}
+        if before:
+            opts["before"] = before
+        if until:
+            opts["until"] = until
+        return self.call("getSignaturesForAddress", [address, opts]) or []
+
+    def get_transactions(self, signatures):
+        """Lädt viele Transaktionen per Batch. Gibt {signature: tx_or_None} zurück."""
+        opts = {"encoding": "jsonParsed", "maxSupportedTransactionVersion": 0}
+        calls = [("getTransaction", [sig, opts]) for sig in signatures]
+        results = self.batch_parallel(calls, raise_errors=False)
+        return dict(zip(signatures, results))
+
+    def get_balance(self, address, commitment="confirmed"):
+        return self.call("getBalance", [address, {"commitment": commitment}])["value"]
+
+    def get_latest_blockhash(self, commitment="confirmed"):
+        """Gibt (blockhash, lastValidBlockHeight) zurück."""
+        value = self.call("getLatestBlockhash", [{"commitment": commitment}])["value"]
+        return value["blockhash"], value["lastValidBlockHeight"]
+
+    def get_block_height(self, commitment="finalized"):
+        return self.call("getBlockHeight", [{"commitment": commitment}])
+
+    def send_transaction(self, raw_b64, skip_preflight=False, commitment="confirmed"):
+        """Schickt eine signierte Transaktion (base64). Gibt die Signatur zurück."""
+        opts = {"encoding": "base64", "skipPreflight": skip_preflight, "preflightCommitment": commitment,
+                "maxRetries": 0}
+        return self.call("sendTransaction", [raw_b64, opts])
+
+    def get_signature_statuses(self, signatures):
+        """{signature: status_or_None}, auch für ältere Signaturen (searchTransactionHistory)."""
+        out = {}
+        for i in range(0, len(signatures), 256):  # Limit der Methode
+            chunk = signatures[i:i + 256]
+            result = self.call("getSignatureStatuses", [chunk, {"searchTransactionHistory": True}])
+            out.update(zip(chunk, result["value"]))
+        return out
+
+    def stats(self):
+        """Latenz-Zähler pro Methode (Kopie)."""
+        with self._lock:
+            out = {}
+            for method, s in self._stats.items():
+                out[method] = dict(s)
+                out[method]["avg_ms"] = s["total_ms"] / s["requests"] if s["requests"] else 0.0
+            return out
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+        self.session.close()
+
+    # ---------- intern ----------
+
+    def _request(self, method, params):
+        return {"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": params or []}
+
+    def _record(self, methods, elapsed_ms, ok):
+        with self._lock:
+            for method in set(methods):
+                s = self._stats.setdefault(method, {
+                    "requests": 0, "items": 0, "errors": 0, "retries": 0, "total_ms": 0.0, "max_ms": 0.0
+                })
+                s["requests"] += 1
+                s["items"] += methods.count(method)
+                s["total_ms"] += elapsed_ms
+                s["max_ms"] = max(s["max_ms"], elapsed_ms)
+                if not ok:
+                    s["errors"] += 1
+
+    def _count_retry(self, methods):
+        with self._lock:
+            for method in set(methods):
+                if method in self._stats:
+                    self._stats[method]["retries"] += 1
+
+    def _failover(self, index):
+        with self._lock:
+            if self._current == index:
+                self._current = (index + 1) % len(self.endpoints)
+
+    def _post(self, payload, methods):
+        attempts = self.max_retries * len(self.endpoints)
+        last_error = None
+        for attempt in range(attempts):
+            index = self._current
+            url = self.endpoints[index]
+            delay = min(MAX_BACKOFF, self.backoff * (2 ** (attempt // len(self.endpoints))))
+            start = time.monotonic()
+            try:
+                r = self.session.post(url, json=payload, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._record(methods, (time.monotonic() - start) * 1000, False)
+                last_error = e
+                self._failover(index)
+            else:
+                elapsed_ms = (time.monotonic() - start) * 1000
+                if r.status_code == 429:
+                    self._record(methods, elapsed_ms, False)
+                    last_error = requests.HTTPError(f"429 von {url}", response=r)
+                    retry_after = r.headers.get("Retry-After")
+                    if retry_after:
+                        try:
+                            delay = min(MAX_BACKOFF, float(retry_after))
+                        except ValueError:
+                            pass
+                    self._failover(index)
+                elif r.status_code >= 500:
+                    self._record(methods, elapsed_ms, False)
+                    last_error = requests.HTTPError(f"{r.status_code} von {url}", response=r)
+                    self._failover(index)
+                else:
+                    r.raise_for_status()
+                    self._record(methods, elapsed_ms, True)
+                    return r.json()
+            if attempt + 1 < attempts:
+                self._count_retry(methods)
+                # beim Wechsel auf einen anderen Endpoint nicht unnötig warten
+                if len(self.endpoints) == 1 or (attempt + 1) % len(self.endpoints) == 0:
+                    time.sleep(delay)
+        raise last_error
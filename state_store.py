@@ -0,0 +1,158 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+# =======================
+# CONVERSATION STATE STORE
+# =======================
+#
+# Ersetzt das globale user_states-dict. Ein State ist {"state": str, "data": dict}
+# und läuft nach ttl Sekunden ohne neuen set() ab (abgebrochene Flows).
+# - MemoryStateStore: im Prozess, TTL + LRU-Grenze, Speicher bleibt konstant
+# - SqliteStateStore: Tabelle conversation_states, übersteht Restarts und
+#   kann von mehreren Bot-Prozessen geteilt werden. set()/clear() warten
+#   nicht auf den Writer; bis zum Commit beantwortet get() aus einem kleinen
+#   Overlay der offenen Writes (die Updates eines Users laufen immer im
+#   selben Prozess, siehe workers.py). clear() ohne State schreibt gar nicht.
+# data muss JSON-serialisierbar sein.
+
+log = logging.getLogger(__name__)
+
+TTL = 3600
+MAX_SIZE = 100_000
+PURGE_INTERVAL = 300
+COUNT_INTERVAL = 60  # Sekunden, die stats()["size"] der SQLite-Variante gecacht bleibt
+
+
+class MemoryStateStore:
+
+    def __init__(self, ttl=TTL, maxsize=MAX_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # Reihenfolge = letzter set() → vorne liegen zugleich die ältesten und die zuerst ablaufenden
+        self._states = OrderedDict()  # telegram_id -> (expires_at, state, data)
+        self._lock = threading.Lock()
+        self.expired = 0
+        self.evicted = 0
+
+    def get(self, tg_id):
+        with self._lock:
+            entry = self._states.get(tg_id)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._states[tg_id]
+                self.expired += 1
+                return None
+            return {"state": entry[1], "data": dict(entry[2])}
+
+    def set(self, tg_id, state, data=None):
+        now = time.monotonic()
+        with self._lock:
+            self._states[tg_id] = (now + self.ttl, state, dict(data or {}))
+            self._states.move_to_end(tg_id)
+            self._trim(now)
+
+    def clear(self, tg_id):
+        with self._lock:
+            self._states.pop(tg_id, None)
+
+    def purge(self):
+        with self._lock:
+            self._trim(time.monotonic())
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._states), "expired": self.expired, "evicted": self.evicted}
+
+    def _trim(self, now):
+        while self._states:
+            tg_id, entry = next(iter(self._states.items()))
+            if entry[0] <= now:
+                self.expired += 1
+            elif len(self._states) > self.maxsize:
+                self.evicted += 1
+            else:
+                break
+            del self._states[tg_id]
+
+
+class SqliteStateStore:
+    """States in conversation_states (Migration 7), Ablaufzeit als Unix-Zeit."""
+
+    def __init__(self, db, ttl=TTL, purge_interval=PURGE_INTERVAL):
+        self.db = db
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+        self._pending = {}  # telegram_id -> (Future, State oder None) bis zum Commit
+        self._lock = threading.Lock()
+        self._size = 0
+        self._next_count = 0.0
+
+    def get(self, tg_id):
+        with self._lock:
+            entry = self._pending.get(tg_id)
+        if entry is not None:
+            value = entry[1]
+            return None if value is None else {"state": value["state"], "data": dict(value["data"])}
+        row = self.db.query_one("""
+            SELECT state, data FROM conversation_states
+            WHERE telegram_id = ? AND expires_at > ?
+        """, (tg_id, time.time()))
+        if row is None:
+            return None
+        return {"state": row["state"], "data": json.loads(row["data"] or "{}")}
+
+    def set(self, tg_id, state, data=None):
+        data = dict(data or {})
+        self._write(tg_id, {"state": state, "data": data}, """
+            INSERT OR REPLACE INTO conversation_states (telegram_id, state, data, expires_at)
+            VALUES (?,?,?,?)
+        """, (tg_id, state, json.dumps(data), time.time() + self.ttl))
+        self._maybe_purge()
+
+    def clear(self, tg_id):
+        # die meisten Menü-Callbacks räumen nur vorsorglich auf → ohne State kein Write
+        if self.get(tg_id) is None:
+            return
+        self._write(tg_id, None, "DELETE FROM conversation_states WHERE telegram_id = ?", (tg_id,))
+        self._size = max(0, self._size - 1)
+
+    def purge(self, wait=True):
+        return self.db.write("DELETE FROM conversation_states WHERE expires_at <= ?", (time.time(),), wait=wait)
+
+    def stats(self):
+        # ungefähr: COUNT höchstens alle COUNT_INTERVAL Sekunden, dazwischen nur clear() abgezogen
+        now = time.monotonic()
+        if now >= self._next_count:
+            self._next_count = now + COUNT_INTERVAL
+            row = self.db.query_one("SELECT COUNT(*) AS n FROM conversation_states WHERE expires_at > ?",
+                                    (time.time(),))
+            self._size = row["n"]
+        with self._lock:
+            pending = len(self._pending)
+        return {"size": self._size, "pending_writes": pending}
+
+    def _write(self, tg_id, value, sql, params):
+        future = self.db.write(sql, params, wait=False)
+        with self._lock:
+            self._pending[tg_id] = (future, value)
+        # läuft sofort, falls der Write schon fertig ist – der Eintrag steht dann bereits
+        future.add_done_callback(lambda f: self._settle(tg_id, f))
+
+    def _settle(self, tg_id, future):
+        with self._lock:
+            entry = self._pending.get(tg_id)
+            if entry is not None and entry[0] is future:
+                del self._pending[tg_id]
+        if future.exception() is not None:
+            log.warning("State für %s nicht gespeichert: %s", tg_id, future.exception())
+
+    def _maybe_purge(self):
+        now = time.monotonic()
+        if now >= self._next_purge:
+            self._next_purge = now + self.purge_interval
+            self.purge(wait=False)
@@ -0,0 +1,239 @@
+import contextlib
+import functools
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from telebot import apihelper
+
+# =======================
+# TELEGRAM TRANSPORT
+# =======================
+#
+# Alle Bot-API-Calls laufen über apihelper.CUSTOM_REQUEST_SENDER hier durch:
+# - eine gemeinsame Keep-Alive-Session mit Connection-Pool (statt einer
+#   Session pro Thread in telebot)
+# - Token-Buckets für Nachrichten: global (~30/s) und pro Chat (privat 1/s,
+#   Gruppen 20/min), jeweils mit kleinem Burst
+# - zwei Lanes: interaktive Antworten haben Vorrang, Bulk (Signal-Fan-out,
+#   Broadcasts) darf die letzten Tokens nicht verbrauchen
+# - 429: retry_after wird eingehalten (Chat pausiert, globales Tempo sinkt
+#   und erholt sich langsam wieder), der Call wird wiederholt statt verworfen
+
+log = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BULK = 1
+
+RATE = 30.0               # Nachrichten/s über alle Chats
+BURST = 30
+INTERACTIVE_RESERVE = 5   # so viele Tokens bleiben für interaktive Antworten frei
+CHAT_RATE = 1.0           # Nachrichten/s pro privatem Chat
+CHAT_BURST = 3
+GROUP_RATE = 20 / 60      # Nachrichten/s pro Gruppe
+GROUP_BURST = 5
+MIN_RATE = 1.0
+MAX_RETRIES = 3
+MAX_RETRY_AFTER = 30      # länger warten wir nicht, der 429 geht an den Aufrufer
+POOL_SIZE = 32
+CHAT_IDLE = 60            # Sekunden, nach denen ein Chat-Bucket vergessen wird
+
+
+def is_limited(api_method):
+    """Methoden, die gegen die Nachrichten-Limits zählen."""
+    return api_method.startswith(("send", "edit", "copyMessage", "forwardMessage"))
+
+
+def chat_key(chat_id):
+    """chat_id aus den Request-Parametern (int oder String, auch @channelname)."""
+    if isinstance(chat_id, str) and chat_id.lstrip("-").isdigit():
+        return int(chat_id)
+    return chat_id
+
+
+def retry_after(resp):
+    try:
+        return float(resp.json().get("parameters", {}).get("retry_after", 1))
+    except ValueError:
+        return 1.0
+
+
+class Transport:
+
+    def __init__(self, rate=RATE, burst=BURST, reserve=INTERACTIVE_RESERVE, chat_rate=CHAT_RATE,
+                 chat_burst=CHAT_BURST, group_rate=GROUP_RATE, group_burst=GROUP_BURST,
+                 max_retries=MAX_RETRIES, max_retry_after=MAX_RETRY_AFTER, pool_size=POOL_SIZE):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.reserve = min(reserve, burst - 1)
+        self.chat_limits = {False: (chat_rate, chat_burst), True: (group_rate, group_burst)}
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.request = self.session.request  # request(method, url, **kwargs), z.B. für Metriken umhüllbar
+
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._waiting = [0, 0]
+        self._chats = {}  # chat_id -> [tat, blocked_until] (GCRA)
+        self._next_prune = 0.0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+
+        self.requests = 0
+        self.throttled = 0
+        self.wait_s = 0.0
+        self.rate_limited = 0
+        self.retries = 0
+
+    def install(self):
+        apihelper.CUSTOM_REQUEST_SENDER = self
+        return self
+
+    def set_rate(self, rate):
+        """Globales Tempo ändern (z.B. Anteil pro Worker-Prozess)."""
+        with self._cond:
+            self.max_rate = self.rate = max(MIN_RATE, rate)
+
+    # ---------- Lanes ----------
+
+    def lane(self):
+        return getattr(self._local, "lane", INTERACTIVE)
+
+    @contextlib.contextmanager
+    def bulk(self):
+        """Alle Calls im Block laufen in der Bulk-Lane."""
+        previous = self.lane()
+        self._local.lane = BULK
+        try:
+            yield
+        finally:
+            self._local.lane = previous
+
+    def bulk_sender(self, fn):
+        """fn (z.B. bot.send_message) so umhüllen, dass es immer in der Bulk-Lane sendet."""
+        @functools.wraps(fn)
+        def send(*args, **kwargs):
+            with self.bulk():
+                return fn(*args, **kwargs)
+        return send
+
+    # ---------- Request ----------
+
+    def __call__(self, method, url, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        chat_id = chat_key((kwargs.get("params") or {}).get("chat_id"))
+        limited = is_limited(api_method)
+        lane = self.lane()
+        attempt = 0
+        while True:
+            if limited:
+                self._throttle(chat_id, lane)
+            with self._cond:
+                self.requests += 1
+            resp = self.request(method, url, **kwargs)
+            if resp.status_code != 429:
+                self._recover()
+                return resp
+            seconds = retry_after(resp)
+            self._backoff(chat_id if limited else None, seconds)
+            # Dateien sind nach dem ersten Versuch schon gelesen → nicht wiederholen
+            if attempt >= self.max_retries or seconds > self.max_retry_after or kwargs.get("files"):
+                log.warning("%s an %s: 429, retry_after=%ss, gebe auf", api_method, chat_id, seconds)
+                return resp
+            attempt += 1
+            with self._cond:
+                self.retries += 1
+            if not limited:
+                time.sleep(seconds)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "wait_s": self.wait_s,
+                "rate_limited": self.rate_limited,
+                "retries": self.retries,
+                "rate": self.rate,
+                "tokens": self._tokens,
+                "waiting_interactive": self._waiting[INTERACTIVE],
+                "waiting_bulk": self._waiting[BULK],
+                "chats": len(self._chats),
+            }
+
+    # ---------- intern ----------
+
+    def _throttle(self, chat_id, lane):
+        start = time.monotonic()
+        delay = self._reserve_chat(chat_id, start) if chat_id is not None else 0.0
+        if delay > 0:
+            time.sleep(delay)
+        self._acquire(lane)
+        waited = time.monotonic() - start
+        if waited > 0.001:
+            with self._cond:
+                self.throttled += 1
+                self.wait_s += waited
+
+    def _reserve_chat(self, chat_id, now):
+        """Reserviert den nächsten Slot des Chats, gibt die Wartezeit zurück."""
+        rate, burst = self.chat_limits[isinstance(chat_id, int) and chat_id < 0]
+        interval = 1.0 / rate
+        with self._cond:
+            if now >= self._next_prune:
+                self._next_prune = now + CHAT_IDLE
+                idle = now - CHAT_IDLE
+                self._chats = {c: s for c, s in self._chats.items() if max(s) > idle}
+            state = self._chats.get(chat_id)
+            if state is None:
+                state = self._chats[chat_id] = [now, 0.0]
+            tat, blocked_until = state
+            start = max(now, tat - (burst - 1) * interval, blocked_until)
+            state[0] = max(tat, start) + interval
+        return start - now
+
+    def _acquire(self, lane):
+        with self._cond:
+            self._waiting[lane] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    floor = 1 if lane == INTERACTIVE else 1 + self.reserve
+                    yield_to_interactive = lane == BULK and self._waiting[INTERACTIVE]
+                    if now >= self._blocked_until and self._tokens >= floor and not yield_to_interactive:
+                        self._tokens -= 1
+                        return
+                    wait = max(self._blocked_until - now, (floor - self._tokens) / self.rate, 0.001)
+                    if yield_to_interactive:
+                        wait = max(wait, 1.0 / self.rate)
+                    self._cond.wait(wait)
+            finally:
+                self._waiting[lane] -= 1
+                self._cond.notify_all()
+
+    def _backoff(self, chat_id, seconds):
+        now = time.monotonic()
+        with self._cond:
+            self.rate_limited += 1
+            self.rate = max(MIN_RATE, self.rate * 0.7)
+            if chat_id is None:
+                self._blocked_until = max(self._blocked_until, now + seconds)
+            else:
+                state = self._chats.setdefault(chat_id, [now, 0.0])
+                state[1] = max(state[1], now + seconds)
+
+    def _recover(self):
+        if self.rate < self.max_rate:
+            with self._cond:
+                self.rate = min(self.max_rate, self.rate * 1.02)
@@ -0,0 +1,168 @@
+import threading
+import time
+from collections import OrderedDict
+
+# =======================
+# THROTTLE / SINGLE-FLIGHT
+# =======================
+#
+# Schutz für teure Aktionen, die User beliebig oft antippen können
+# (z.B. "🔍 Deposit prüfen", das den Indexer und damit den RPC weckt):
+# - Throttle: Token-Bucket pro Schlüssel (meist telegram_id), begrenzte
+#   Anzahl Buckets (LRU), volle Buckets werden beim Aufräumen verworfen
+# - SingleFlight: gleichzeitige Aufrufe mit demselben Schlüssel teilen sich
+#   einen laufenden Aufruf und sein Ergebnis; danach bleibt das Ergebnis
+#   ttl Sekunden gecacht. Fehler werden weitergereicht, aber nie gecacht.
+
+MAX_KEYS = 100_000
+
+
+class Throttle:
+
+    def __init__(self, rate, burst=1, maxsize=MAX_KEYS):
+        self.rate = rate    # Tokens pro Sekunde
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()  # key -> (tokens, Zeitpunkt)
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.throttled = 0
+
+    def take(self, key):
+        """Verbraucht ein Token. 0.0 = erlaubt, sonst Sekunden bis zum nächsten Token."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+                self.allowed += 1
+            else:
+                wait = (1 - tokens) / self.rate
+                self.throttled += 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def refund(self, key):
+        """Gibt ein mit take() verbrauchtes Token zurück, z.B. wenn der Job gar nicht angenommen wurde."""
+        with self._lock:
+            entry = self._buckets.get(key)
+            if entry is not None:
+                tokens, last = entry
+                self._buckets[key] = (min(self.burst, tokens + 1), last)
+                self.allowed -= 1
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {"keys": len(self._buckets), "allowed": self.allowed, "throttled": self.throttled}
+
+
+class _Flight:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.finished_at = None
+
+
+class SingleFlight:
+
+    def __init__(self, ttl=0.0, maxsize=MAX_KEYS):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._flights = OrderedDict()  # key -> _Flight (laufend oder gecacht)
+        self._lock = threading.Lock()
+        self.calls = 0    # tatsächlich ausgeführt
+        self.joined = 0   # an einen laufenden Aufruf angehängt
+        self.cached = 0   # aus dem Ergebnis-Cache beantwortet
+
+    def do(self, key, fn, *args):
+        """
+        Führt fn(*args) für key höchstens einmal gleichzeitig aus.
+        Gibt (result, shared) zurück; shared = Ergebnis stammt von einem anderen Aufruf.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None and flight.done.is_set() and \
+                    (flight.error is not None or time.monotonic() - flight.finished_at >= self.ttl):
+                del self._flights[key]
+                flight = None
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self.calls += 1
+                owner = True
+            else:
+                self._flights.move_to_end(key)
+                owner = False
+                if flight.done.is_set():
+                    self.cached += 1
+                else:
+                    self.joined += 1
+            self._evict()
+
+        if not owner:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn(*args)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                flight.finished_at = time.monotonic()
+                flight.done.set()
+                if (flight.error is not None or self.ttl <= 0) and self._flights.get(key) is flight:
+                    del self._flights[key]
+        return flight.result, False
+
+    def covered(self, key):
+        """
+        True, wenn für key gerade ein Aufruf läuft oder ein frisches Ergebnis
+        vorliegt; der Aufrufer kann sich den Job dann sparen (zählt als eingespart).
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                return False
+            if not flight.done.is_set():
+                self.joined += 1
+                return True
+            if flight.error is None and time.monotonic() - flight.finished_at < self.ttl:
+                self.cached += 1
+                return True
+            return False
+
+    def forget(self, key):
+        """Gecachtes Ergebnis verwerfen (laufende Aufrufe bleiben unberührt)."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None and flight.done.is_set():
+                del self._flights[key]
+
+    def stats(self):
+        with self._lock:
+            inflight = sum(1 for f in self._flights.values() if not f.done.is_set())
+            return {"inflight": inflight, "calls": self.calls, "joined": self.joined, "cached": self.cached,
+                    "saved": self.joined + self.cached}
+
+    def _evict(self):
+        # nur fertige Einträge verdrängen, laufende Flights haben Wartende
+        while len(self._flights) > self.maxsize:
+            for key, flight in self._flights.items():
+                if flight.done.is_set():
+                    del self._flights[key]
+                    break
+            else:
+                return
@@ -0,0 +1,187 @@
+import json
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+
+# =======================
+# TRANSAKTIONS-CACHE
+# =======================
+#
+# Finalisierte Solana-Transaktionen ändern sich nie mehr, also werden sie
+# pro Signatur genau einmal geladen:
+# - Tier 1: In-Memory-LRU, begrenzt über die (geschätzte) Größe in Bytes
+# - Tier 2: SQLite-Tabelle mit zlib-komprimiertem Payload (übersteht Restarts)
+# Gespeichert wird nur die kompakte Form, die der Deposit-Parser braucht.
+# Einträge eines älteren Formats (FORMAT) gelten als Miss und werden neu geladen.
+
+MEMORY_BYTES = 32 * 1024 * 1024
+DISK_PATH = "tx_cache.db"
+FORMAT = 2  # 2: inkl. Token-Salden
+
+
+def compact_transaction(tx):
+    """
+    Reduziert ein jsonParsed-getTransaction-Ergebnis auf das, was die
+    Deposit-Erkennung braucht: Account-Keys, Pre-/Post-Balances, Token-
+    Salden, Fehler. Das Ergebnis hat die gleiche Struktur wie das Original
+    (nur kleiner), damit der Parser beides verarbeiten kann.
+    """
+    meta = tx.get("meta") or {}
+    account_keys = tx.get("transaction", {}).get("message", {}).get("accountKeys", [])
+    return {
+        "v": FORMAT,
+        "slot": tx.get("slot"),
+        "blockTime": tx.get("blockTime"),
+        "meta": {
+            "err": meta.get("err"),
+            "preBalances": meta.get("preBalances"),
+            "postBalances": meta.get("postBalances"),
+            "preTokenBalances": [_compact_token_balance(b) for b in meta.get("preTokenBalances") or ()],
+            "postTokenBalances": [_compact_token_balance(b) for b in meta.get("postTokenBalances") or ()],
+        },
+        "transaction": {"message": {
+            "accountKeys": [acc["pubkey"] if isinstance(acc, dict) else acc for acc in account_keys]
+        }},
+    }
+
+
+def _compact_token_balance(b):
+    amount = b.get("uiTokenAmount") or {}
+    return {"accountIndex": b.get("accountIndex"), "mint": b.get("mint"), "owner": b.get("owner"),
+            "uiTokenAmount": {"amount": amount.get("amount"), "decimals": amount.get("decimals")}}
+
+
+def encode(tx):
+    """Gibt (blob, rohgröße) zurück; die Rohgröße dient als Speicher-Schätzung."""
+    raw = json.dumps(tx, separators=(",", ":")).encode()
+    return zlib.compress(raw), len(raw)
+
+
+def decode(blob):
+    raw = zlib.decompress(blob)
+    return json.loads(raw), len(raw)
+
+
+class TransactionCache:
+
+    def __init__(self, path=DISK_PATH, max_bytes=MEMORY_BYTES):
+        self.max_bytes = max_bytes
+        self._lru = OrderedDict()  # sig -> (tx, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db_lock = threading.Lock()
+        with self._db_lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS tx_cache (
+                    signature TEXT PRIMARY KEY,
+                    payload BLOB
+                )
+            """)
+
+    # ---------- Memory ----------
+
+    def _remember(self, sig, tx, size):
+        with self._lock:
+            old = self._lru.pop(sig, None)
+            if old:
+                self._bytes -= old[1]
+            self._lru[sig] = (tx, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._lru) > 1:
+                _, (_, evicted) = self._lru.popitem(last=False)
+                self._bytes -= evicted
+
+    def _from_memory(self, sig):
+        with self._lock:
+            item = self._lru.get(sig)
+            if item is None:
+                return None
+            self._lru.move_to_end(sig)
+            return item[0]
+
+    # ---------- öffentliche API ----------
+
+    def get_many(self, signatures):
+        """Gibt {sig: tx} für alle bereits bekannten Signaturen zurück."""
+        found = {}
+        missing = []
+        for sig in signatures:
+            tx = self._from_memory(sig)
+            if tx is not None:
+                found[sig] = tx
+            else:
+                missing.append(sig)
+        memory_hits = len(found)
+
+        if missing:
+            marks = ",".join("?" * len(missing))
+            with self._db_lock:
+                rows = self._db.execute(
+                    f"SELECT signature, payload FROM tx_cache WHERE signature IN ({marks})", missing
+                ).fetchall()
+            for sig, blob in rows:
+                tx, size = decode(blob)
+                if tx.get("v") != FORMAT:
+                    continue
+                found[sig] = tx
+                self._remember(sig, tx, size)
+
+        with self._lock:
+            self.memory_hits += memory_hits
+            self.disk_hits += len(found) - memory_hits
+            self.misses += len(signatures) - len(found)
+        return found
+
+    def put_many(self, txs):
+        """
+        Speichert {sig: tx} in kompakter Form (nur finalisierte Transaktionen!).
+        Gibt die kompakten Transaktionen zurück.
+        """
+        rows = []
+        compact = {}
+        for sig, tx in txs.items():
+            if tx is None:
+                continue
+            tx = compact_transaction(tx)
+            blob, size = encode(tx)
+            rows.append((sig, blob))
+            compact[sig] = tx
+            self._remember(sig, tx, size)
+        if rows:
+            with self._db_lock, self._db:
+                self._db.executemany("INSERT OR REPLACE INTO tx_cache (signature, payload) VALUES (?,?)", rows)
+        return compact
+
+    def fetch(self, signatures, loader):
+        """
+        Liefert {sig: tx} und lädt nur fehlende Signaturen über loader(sigs)
+        (z.B. SolanaRpcClient.get_transactions) nach.
+        """
+        found = self.get_many(signatures)
+        missing = [s for s in signatures if s not in found]
+        if missing:
+            found.update(self.put_many(loader(missing)))
+        return {sig: found.get(sig) for sig in signatures}
+
+    def stats(self):
+        with self._lock:
+            total = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / total if total else 0.0,
+                "entries": len(self._lru),
+                "bytes": self._bytes,
+            }
+
+    def close(self):
+        with self._db_lock:
+            self._db.close()
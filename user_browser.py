@@ -0,0 +1,163 @@
+from datetime import datetime
+
+# =======================
+# ADMIN USER BROWSER
+# =======================
+#
+# Blättern und Suchen in der User-Tabelle ohne OFFSET und ohne Full-Scan:
+# - Keyset-Pagination, der Cursor ist immer eine users.id (passt in
+#   callback_data), der Sortierschlüssel wird per Index-Lookup nachgeholt
+# - Sortierung "new" (id), "balance" (idx_users_balance)
+# - Präfix-Suche nach Username (idx_users_username, NOCASE) oder nach
+#   telegram_id (Ziffern-Präfix = eine Handvoll disjunkter Bereiche)
+# - Übersicht aus stats_totals/stats_daily (Migration 9, per Trigger gepflegt)
+
+PAGE_SIZE = 10
+MAX_TELEGRAM_ID = 10 ** 16
+
+COLUMNS = "id, telegram_id, username, balance_micro, balance_usd, auto_entry"
+
+SORTS = {
+    # name: (ORDER BY vorwärts, Schlüssel-Spalten für den Keyset-Vergleich)
+    "new": ("id DESC", "id"),
+    "balance": ("balance_micro DESC, id DESC", "balance_micro, id"),
+}
+
+
+def browse(db, sort="new", after=None, before=None, limit=PAGE_SIZE):
+    """
+    Eine Seite in Sortierung sort. after/before = users.id der letzten bzw.
+    ersten Zeile der aktuellen Seite. Gibt (rows, has_prev, has_next) zurück.
+    """
+    order, key = SORTS[sort]
+    cursor = after or before
+    where, params = "", ()
+    if cursor:
+        # absteigend sortiert: "weiter" heißt kleinerer Schlüssel
+        op = "<" if after else ">"
+        where = f"WHERE ({key}) {op} (SELECT {key} FROM users WHERE id = ?)"
+        params = (cursor,)
+    if before:
+        order = order.replace("DESC", "ASC")
+    rows = db.query(f"SELECT {COLUMNS} FROM users {where} ORDER BY {order} LIMIT ?", params + (limit + 1,))
+    return _page(rows, limit, after, before)
+
+
+def search(db, query, after=None, before=None, limit=PAGE_SIZE):
+    """Präfix-Suche: nur Ziffern → telegram_id, sonst Username (ohne @, ohne Groß/klein)."""
+    query = query.strip().lstrip("@")
+    if not query:
+        return [], False, False
+    if query.isdigit():
+        return _search_telegram_id(db, query, after, before, limit)
+    return _search_username(db, query, after, before, limit)
+
+
+def summary(db):
+    """Kennzahlen aus den Summen-Tabellen (konstante Kosten, unabhängig von der User-Zahl)."""
+    totals = {r["name"]: r["value"] for r in db.query("SELECT name, value FROM stats_totals")}
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    daily = {r["name"]: r["value"] for r in db.query("SELECT name, value FROM stats_daily WHERE day = ?", (today,))}
+    return {
+        "users": int(totals.get("users", 0)),
+        "users_today": int(daily.get("users", 0)),
+        "auto_entry_users": int(totals.get("auto_entry_users", 0)),
+        "balance_usd": totals.get("balance_micro", 0) / 1_000_000,
+        "withdrawals_pending": int(totals.get("withdrawals_pending", 0)),
+        "withdrawals_pending_usd": totals.get("withdrawals_pending_usd", 0.0),
+        "deposits": int(totals.get("deposits", 0)),
+        "deposits_usd": totals.get("deposits_usd", 0.0),
+        "deposits_today": int(daily.get("deposits", 0)),
+        "deposits_today_usd": daily.get("deposits_usd", 0.0),
+    }
+
+
+# ---------- intern ----------
+
+def _page(rows, limit, after, before):
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if before:
+        rows.reverse()
+        return rows, more, True
+    return rows, bool(after), more
+
+
+def _search_username(db, prefix, after, before, limit):
+    # Präfix als Bereich [prefix, prefix mit erhöhtem letzten Zeichen) → Index-Range statt LIKE.
+    # NOCASE vergleicht ASCII kleingeschrieben, die Grenzen müssen es auch sein
+    # ("aZ" → ["az", "a{") statt ["aZ", "a[") – das wäre leer).
+    prefix = prefix.lower()
+    lo, hi = prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    cursor = after or before
+    if not cursor:
+        rows = db.query(f"""
+            SELECT {COLUMNS} FROM users
+            WHERE username >= ? COLLATE NOCASE AND username < ? COLLATE NOCASE
+            ORDER BY username COLLATE NOCASE, id LIMIT ?
+        """, (lo, hi, limit + 1))
+        return _page(rows, limit, None, None)
+    row = db.query_one("SELECT username FROM users WHERE id = ?", (cursor,))
+    if row is None:
+        return [], False, False
+    if after:
+        rows = db.query(f"""
+            SELECT {COLUMNS} FROM users
+            WHERE username >= ? COLLATE NOCASE AND username < ? COLLATE NOCASE
+              AND NOT (username = ? COLLATE NOCASE AND id <= ?)
+            ORDER BY username COLLATE NOCASE, id LIMIT ?
+        """, (max(lo, row["username"], key=str.lower), hi, row["username"], cursor, limit + 1))
+    else:
+        rows = db.query(f"""
+            SELECT {COLUMNS} FROM users
+            WHERE username >= ? COLLATE NOCASE AND username <= ? COLLATE NOCASE
+              AND NOT (username = ? COLLATE NOCASE AND id >= ?)
+            ORDER BY username COLLATE NOCASE DESC, id DESC LIMIT ?
+        """, (lo, row["username"], row["username"], cursor, limit + 1))
+    return _page(rows, limit, after, before)
+
+
+def _telegram_id_ranges(prefix):
+    """'12' → [12,13), [120,130), [1200,1300), ... – aufsteigend und disjunkt."""
+    if prefix.startswith("0"):
+        return []
+    lo, hi = int(prefix), int(prefix) + 1
+    ranges = []
+    while lo < MAX_TELEGRAM_ID:
+        ranges.append((lo, hi))
+        lo, hi = lo * 10, hi * 10
+    return ranges
+
+
+def _search_telegram_id(db, prefix, after, before, limit):
+    cursor = after or before
+    pivot = None
+    if cursor:
+        row = db.query_one("SELECT telegram_id FROM users WHERE id = ?", (cursor,))
+        if row is None:
+            return [], False, False
+        pivot = row["telegram_id"]
+    ranges = _telegram_id_ranges(prefix)
+    if before:
+        ranges.reverse()
+    rows = []
+    for lo, hi in ranges:
+        if before:
+            if pivot is not None and lo >= pivot:
+                continue
+            upper = min(hi, pivot) if pivot is not None else hi
+            rows += db.query(f"""
+                SELECT {COLUMNS} FROM users WHERE telegram_id >= ? AND telegram_id < ?
+                ORDER BY telegram_id DESC LIMIT ?
+            """, (lo, upper, limit + 1 - len(rows)))
+        else:
+            if pivot is not None and hi <= pivot + 1:
+                continue
+            lower = max(lo, pivot + 1) if pivot is not None else lo
+            rows += db.query(f"""
+                SELECT {COLUMNS} FROM users WHERE telegram_id >= ? AND telegram_id < ?
+                ORDER BY telegram_id LIMIT ?
+            """, (lower, hi, limit + 1 - len(rows)))
+        if len(rows) > limit:
+            break
+    return _page(rows, limit, after, before)
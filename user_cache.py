@@ -0,0 +1,119 @@
+import threading
+from collections import OrderedDict
+
+# =======================
+# USER CACHE
+# =======================
+#
+# Begrenzter LRU-Cache für User-Zeilen, Schlüssel ist telegram_id.
+# Die Helper in bot.py schreiben durch (erst DB, dann Cache), damit
+# Callbacks im Normalfall ganz ohne DB-Read auskommen.
+# Einträge sind dicts und werden nie in-place geändert (copy-on-write).
+#
+# Stale-Put: ein Miss liest die Zeile aus der DB, parallel invalidiert ein
+# anderer Thread denselben User – ohne Schutz würde put() danach die alte
+# Zeile wieder einsetzen. Darum holt sich der Leser vor dem DB-Read eine
+# Generation (generation()), invalidate() vermerkt pro User eine neuere,
+# und put(row, gen) verwirft die Zeile, wenn sie seit dem Miss invalidiert
+# wurde. Die Vermerke sind auf MAX_SIZE begrenzt; läuft die Tabelle über,
+# gilt pauschal alles vor diesem Zeitpunkt als veraltet.
+
+MAX_SIZE = 10000
+
+
+class UserCache:
+
+    def __init__(self, maxsize=MAX_SIZE):
+        self.maxsize = maxsize
+        self._rows = OrderedDict()  # telegram_id -> dict
+        self._tg_by_id = {}         # users.id -> telegram_id
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._invalidated = {}      # users.id -> Generation der letzten Invalidierung
+        self._floor = 0             # Puts mit älterer Generation werden verworfen
+        self.hits = 0
+        self.misses = 0
+        self.stale_puts = 0
+
+    def get(self, tg_id):
+        with self._lock:
+            row = self._rows.get(tg_id)
+            if row is None:
+                self.misses += 1
+                return None
+            self._rows.move_to_end(tg_id)
+            self.hits += 1
+            return row
+
+    def generation(self):
+        """Vor dem DB-Read eines Misses holen und an put() übergeben."""
+        with self._lock:
+            return self._generation
+
+    def put(self, row, generation=None):
+        """
+        Legt eine Zeile (sqlite3.Row oder dict) ab und gibt das gecachte dict zurück.
+        Wurde der User seit generation invalidiert, wird nur die Zeile zurückgegeben.
+        """
+        row = dict(row)
+        if self.maxsize <= 0:
+            return row
+        with self._lock:
+            if generation is not None and (generation < self._floor
+                                           or self._invalidated.get(row["id"], -1) >= generation):
+                self.stale_puts += 1
+                return row
+            tg_id = row["telegram_id"]
+            self._rows[tg_id] = row
+            self._rows.move_to_end(tg_id)
+            self._tg_by_id[row["id"]] = tg_id
+            while len(self._rows) > self.maxsize:
+                _, evicted = self._rows.popitem(last=False)
+                self._tg_by_id.pop(evicted["id"], None)
+        return row
+
+    def update(self, user_id, **fields):
+        """Write-through: aktualisiert eine gecachte Zeile (falls vorhanden)."""
+        with self._lock:
+            tg_id = self._tg_by_id.get(user_id)
+            row = self._rows.get(tg_id) if tg_id is not None else None
+            if row is None:
+                return
+            row = dict(row)
+            row.update(fields)
+            self._rows[tg_id] = row
+
+    def invalidate(self, user_id):
+        """Für Writes, deren Ergebnis wir nicht kennen (z.B. balance = balance + x)."""
+        with self._lock:
+            self._mark_invalidated(user_id)
+            tg_id = self._tg_by_id.pop(user_id, None)
+            if tg_id is not None:
+                self._rows.pop(tg_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+            self._tg_by_id.clear()
+            self._generation += 1
+            self._floor = self._generation
+            self._invalidated.clear()
+
+    def _mark_invalidated(self, user_id):
+        # nur unter self._lock aufrufen
+        if len(self._invalidated) >= max(self.maxsize, 1):
+            self._floor = self._generation + 1
+            self._invalidated.clear()
+        self._invalidated[user_id] = self._generation
+        self._generation += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._rows),
+                "stale_puts": self.stale_puts,
+            }
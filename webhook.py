@@ -0,0 +1,186 @@
+import hmac
+import json
+import logging
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telebot.types import Update
+
+# =======================
+# WEBHOOK SERVER
+# =======================
+#
+# Alternative zu bot.infinity_polling(): Telegram pusht Updates per HTTPS-POST.
+# - der Secret-Token-Header wird geprüft (setWebhook(secret_token=...))
+# - der Request wird sofort mit 200 bestätigt, das Update landet in einer
+#   begrenzten Queue; ein Intake-Thread übergibt es an bot.process_new_updates.
+#   Im Bot ist das per executor.attach der ChatExecutor: er reiht das Update
+#   pro Chat ein und kehrt sofort zurück, die Handler laufen in dessen
+#   Threads (pro Chat in Reihenfolge, Chats parallel). Mit sink gehen die
+#   Updates stattdessen an die Worker-Prozesse (workers.Cluster.dispatch).
+# - ist die Queue voll, antworten wir 503 → Telegram stellt später erneut zu
+#
+# TLS terminiert davor ein Reverse-Proxy (nginx/caddy), der auf host:port weiterleitet.
+
+log = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+QUEUE_SIZE = 10000
+MAX_BODY = 1024 * 1024
+MAX_BATCH = 100
+
+
+class WebhookServer:
+
+    def __init__(self, bot, secret_token, host="127.0.0.1", port=8443, path="/telegram",
+                 queue_size=QUEUE_SIZE, sink=None):
+        self.bot = bot
+        # sink(body) -> bool ersetzt die lokale Verarbeitung (z.B. Verteilung an Worker-Prozesse)
+        self.sink = sink
+        self.secret_token = secret_token
+        self.host = host
+        self.port = port
+        self.path = path
+        self.received = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.processed = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """Startet HTTP-Server und Intake-Thread im Hintergrund. Gibt die lokale URL zurück."""
+        if self._server:
+            return self.url
+        self._server = ThreadingHTTPServer((self.host, self.port), _make_handler(self))
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="webhook-http", daemon=True).start()
+        self._thread = threading.Thread(target=self._intake, name="webhook-intake", daemon=True)
+        self._thread.start()
+        return self.url
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}{self.path}"
+
+    def register(self, public_url, drop_pending_updates=True, max_connections=40):
+        """Meldet public_url bei Telegram an (ersetzt ein evtl. laufendes Polling)."""
+        self.bot.remove_webhook()
+        return self.bot.set_webhook(
+            url=public_url,
+            secret_token=self.secret_token,
+            drop_pending_updates=drop_pending_updates,
+            max_connections=max_connections,
+        )
+
+    def serve_forever(self):
+        self.start()
+        self._thread.join()
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+        self._queue.put(None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "received": self.received,
+                "rejected": self.rejected,
+                "dropped": self.dropped,
+                "processed": self.processed,
+                "queued": self._queue.qsize(),
+            }
+
+    # ---------- intern ----------
+
+    def accept(self, body):
+        """Vom HTTP-Handler aufgerufen; False = Queue voll."""
+        if self.sink is not None:
+            ok = self.sink(body)
+            with self._lock:
+                if ok:
+                    self.received += 1
+                else:
+                    self.dropped += 1
+            return ok
+        try:
+            self._queue.put_nowait(body)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.received += 1
+        return True
+
+    def _intake(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            # was schon wartet, gleich mitnehmen → ein process_new_updates pro Schub
+            batch = [item]
+            while len(batch) < MAX_BATCH:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            updates = []
+            for body in batch:
+                try:
+                    updates.append(Update.de_json(json.loads(body)))
+                except Exception:
+                    log.exception("Ungültiges Update verworfen")
+            try:
+                self.bot.process_new_updates(updates)
+            except Exception:
+                log.exception("Verarbeitung von %d Updates fehlgeschlagen", len(updates))
+            with self._lock:
+                self.processed += len(updates)
+
+
+def _make_handler(server):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            if self.path.split("?", 1)[0] != server.path:
+                return self._reply(404)
+            token = self.headers.get(SECRET_HEADER) or ""
+            if not hmac.compare_digest(token.encode(), server.secret_token.encode()):
+                with server._lock:
+                    server.rejected += 1
+                return self._reply(403)
+            length = int(self.headers.get("Content-Length") or 0)
+            if length <= 0 or length > MAX_BODY:
+                return self._reply(400)
+            body = self.rfile.read(length)
+            self._reply(200 if server.accept(body) else 503)
+
+        def do_GET(self):
+            self._reply(405)
+
+        def _reply(self, code):
+            if code != 200:
+                # Body evtl. ungelesen → Verbindung nicht wiederverwenden
+                self.close_connection = True
+            self.send_response(code)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    return Handler
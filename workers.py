@@ -0,0 +1,167 @@
+import json
+import logging
+import multiprocessing
+import queue
+import threading
+
+from telebot import apihelper
+from telebot.types import Update
+
+# =======================
+# MULTI-PROCESS WORKER MODE
+# =======================
+#
+# Ein Intake-Prozess nimmt Updates an (Polling oder Webhook) und verteilt
+# sie per telegram_id % workers auf Worker-Prozesse. Damit bleiben die
+# Updates eines Users in Reihenfolge, verschiedene User laufen parallel auf
+# mehreren Kernen. Innerhalb des Workers übernimmt der ChatExecutor des Bots
+# (executor.attach) die Parallelität: serve() reicht jedes Update nur an
+# bot.process_new_updates weiter, der Executor hält die Reihenfolge pro Chat
+# und lässt blockierende API-Calls verschiedener Chats überlappen.
+#
+# Gemeinsamer Zustand liegt in SQLite (States, Balances, Outbox). Über die
+# Control-Queue melden Worker dem Intake:
+#   ("wake", job)         → Hintergrund-Job im Leader-Prozess wecken
+#   ("invalidate", uid)   → gecachte User-Zeile in allen Workern verwerfen
+#
+# Worker werden per "spawn" gestartet (kein fork mit laufenden Threads),
+# target muss also eine importierbare Top-Level-Funktion sein.
+
+log = logging.getLogger(__name__)
+
+QUEUE_SIZE = 10000
+POLL_TIMEOUT = 20
+
+
+def user_key(update):
+    """telegram_id des auslösenden Users aus einem rohen Update (dict)."""
+    for key, value in update.items():
+        if key == "update_id" or not isinstance(value, dict):
+            continue
+        user = value.get("from") or value.get("user") or value.get("chat")
+        if user:
+            return user["id"]
+    return 0
+
+
+class Cluster:
+    """Intake-Seite: startet die Worker und verteilt Updates."""
+
+    def __init__(self, target, workers, args=(), queue_size=QUEUE_SIZE, on_wake=None):
+        ctx = multiprocessing.get_context("spawn")
+        self.workers = workers
+        self.inboxes = [ctx.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.control = ctx.Queue()
+        self.on_wake = on_wake  # on_wake(job) im Intake-Prozess
+        self.dispatched = 0
+        self.dropped = 0
+        self._procs = [
+            ctx.Process(target=target, args=(i, self.inboxes, self.control, *args),
+                        name=f"worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        self._control_thread = None
+
+    def start(self):
+        for p in self._procs:
+            p.start()
+        self._control_thread = threading.Thread(target=self._control_loop, name="cluster-control", daemon=True)
+        self._control_thread.start()
+
+    def stop(self, timeout=10):
+        for inbox in self.inboxes:
+            inbox.put(None)
+        for p in self._procs:
+            p.join(timeout)
+        self.control.put(None)
+
+    def alive(self):
+        return all(p.is_alive() for p in self._procs)
+
+    def dispatch(self, raw, block=True):
+        """raw: Update als JSON-String/bytes oder dict. False = Worker-Queue voll."""
+        if isinstance(raw, (bytes, bytearray)):
+            raw = raw.decode()
+        update = json.loads(raw) if isinstance(raw, str) else raw
+        text = raw if isinstance(raw, str) else json.dumps(raw)
+        key = user_key(update)
+        try:
+            self.inboxes[key % self.workers].put(("update", key, text), block=block)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.dispatched += 1
+        return True
+
+    def wake(self, job):
+        if self.on_wake:
+            self.on_wake(job)
+
+    def invalidate(self, user_id):
+        for inbox in self.inboxes:
+            inbox.put(("invalidate", user_id))
+
+    def poll(self, token, stop, skip_pending=True, timeout=POLL_TIMEOUT):
+        """Intake per getUpdates (roh, ohne Parsen), bis stop gesetzt ist."""
+        offset = None
+        if skip_pending:
+            last = apihelper.get_updates(token, offset=-1, timeout=5, long_polling_timeout=0)
+            offset = last[-1]["update_id"] + 1 if last else None
+        while not stop.is_set():
+            try:
+                updates = apihelper.get_updates(token, offset=offset, limit=100,
+                                                timeout=timeout + 5, long_polling_timeout=timeout)
+            except Exception:
+                log.exception("getUpdates fehlgeschlagen")
+                stop.wait(3)
+                continue
+            for update in updates:
+                self.dispatch(update)
+                offset = update["update_id"] + 1
+
+    def _control_loop(self):
+        while True:
+            msg = self.control.get()
+            if msg is None:
+                return
+            kind, value = msg
+            try:
+                if kind == "wake":
+                    self.wake(value)
+                elif kind == "invalidate":
+                    self.invalidate(value)
+            except Exception:
+                log.exception("Control-Nachricht %r fehlgeschlagen", msg)
+
+
+class WorkerLink:
+    """Worker-Seite der Control-Queue."""
+
+    def __init__(self, control):
+        self.control = control
+
+    def wake(self, job):
+        self.control.put(("wake", job))
+
+    def invalidate(self, user_id):
+        self.control.put(("invalidate", user_id))
+
+
+def serve(bot, index, inboxes, on_invalidate=None):
+    """
+    Hauptschleife eines Worker-Prozesses. Der Bot muss per executor.attach
+    an einen ChatExecutor gehängt sein, sonst laufen die Updates hier
+    nacheinander im Inbox-Thread.
+    """
+    inbox = inboxes[index]
+    while True:
+        item = inbox.get()
+        if item is None:
+            break
+        if item[0] == "update":
+            try:
+                bot.process_new_updates([Update.de_json(item[2])])
+            except Exception:
+                log.exception("Update in Worker %d fehlgeschlagen", index)
+        elif item[0] == "invalidate" and on_invalidate:
+            on_invalidate(item[1])